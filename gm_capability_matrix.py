@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スタッフ × シナリオのGM可否マトリクスを配列ベースの疎行列として構築・保存
+
+入力:
+  - gm_data.txt（parse_gm_data.parse_gm_data_file でパース。キーは名前）
+  - staff_scenario_assignments テーブル（--from-db。1組織分、キーはID・表示は名前）
+
+フラグビット:
+  - CAN_MAIN_GM    = 1
+  - CAN_SUB_GM     = 2
+  - IS_EXPERIENCED = 4
+
+シナリオ行（CSR）とスタッフ行（CSC）の両方向のインデックスを持つため、
+「シナリオXを担当できるスタッフ」「スタッフYが担当できるシナリオ」
+「シナリオ別の担当可能人数」をdictやlistの全走査なしで引ける。
+
+使用例:
+  python gm_capability_matrix.py build -o docs/data/gm-capability-matrix.bin
+  python gm_capability_matrix.py build --from-db --organization-id <組織ID>
+  python gm_capability_matrix.py who "グロリアメモリーズ"
+  python gm_capability_matrix.py covers "きゅう"
+  python gm_capability_matrix.py coverage
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CAN_MAIN_GM = 1
+CAN_SUB_GM = 2
+IS_EXPERIENCED = 4
+
+FLAG_NAMES = {
+    CAN_MAIN_GM: 'can_main_gm',
+    CAN_SUB_GM: 'can_sub_gm',
+    IS_EXPERIENCED: 'is_experienced',
+}
+
+DEFAULT_MATRIX_PATH = 'docs/data/gm-capability-matrix.bin'
+
+# ファイル形式: MAGIC | ヘッダー長(uint32 LE) | ヘッダーJSON | 配列データ
+_MAGIC = b'GMCAP001'
+
+
+def flags_from_row(row: Dict) -> int:
+    """staff_scenario_assignments の1行からフラグビットを作る"""
+    flags = 0
+    if row.get('can_main_gm'):
+        flags |= CAN_MAIN_GM
+    if row.get('can_sub_gm'):
+        flags |= CAN_SUB_GM
+    if row.get('is_experienced'):
+        flags |= IS_EXPERIENCED
+    return flags
+
+
+def _transpose(indptr: array, indices: array, data: array,
+               n_cols: int) -> Tuple[array, array, array]:
+    """CSR を CSC（= 転置のCSR）に変換"""
+    counts = [0] * (n_cols + 1)
+    for col in indices:
+        counts[col + 1] += 1
+    for i in range(n_cols):
+        counts[i + 1] += counts[i]
+
+    t_indptr = array('I', counts)
+    t_indices = array('I', bytes(4 * len(indices)))
+    t_data = array('B', bytes(len(data)))
+    cursor = list(counts[:-1])
+
+    for row in range(len(indptr) - 1):
+        for k in range(indptr[row], indptr[row + 1]):
+            col = indices[k]
+            pos = cursor[col]
+            t_indices[pos] = row
+            t_data[pos] = data[k]
+            cursor[col] += 1
+
+    return t_indptr, t_indices, t_data
+
+
+class CapabilityMatrix:
+    """
+    スタッフ × シナリオのGM可否を保持する疎行列
+
+    行 = シナリオ、列 = スタッフ。値はフラグビット（uint8）。
+    各行の列インデックスは昇順にソート済み。
+    scenarios / staff は行・列のキー（名前またはID）。scenario_labels /
+    staff_labels はキーごとの表示名で、省略時はキーそのもの。
+    """
+
+    def __init__(self, scenarios: List[str], staff: List[str],
+                 indptr: array, indices: array, data: array,
+                 t_indptr: Optional[array] = None,
+                 t_indices: Optional[array] = None,
+                 t_data: Optional[array] = None,
+                 scenario_labels: Optional[List[str]] = None,
+                 staff_labels: Optional[List[str]] = None):
+        self.scenarios = scenarios
+        self.staff = staff
+        self.scenario_labels = scenario_labels or list(scenarios)
+        self.staff_labels = staff_labels or list(staff)
+        self.scenario_index = {name: i for i, name in enumerate(scenarios)}
+        self.staff_index = {name: i for i, name in enumerate(staff)}
+
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+        if t_indptr is None:
+            t_indptr, t_indices, t_data = _transpose(indptr, indices, data, len(staff))
+        self.t_indptr = t_indptr
+        self.t_indices = t_indices
+        self.t_data = t_data
+
+    # ------------------------------------------------------------------
+    # 構築
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_triples(cls, triples: Iterable[Tuple[str, str, int]],
+                     scenario_labels: Optional[Dict[str, str]] = None,
+                     staff_labels: Optional[Dict[str, str]] = None) -> 'CapabilityMatrix':
+        """
+        (シナリオキー, スタッフキー, フラグ) の列から構築
+
+        同じ組み合わせが複数回出た場合はフラグをORで合成する。
+        scenario_labels / staff_labels（キー → 表示名）に無いキーはキーをそのまま表示する。
+        """
+        cells: Dict[Tuple[str, str], int] = {}
+        for scenario, staff, flags in triples:
+            if not scenario or not staff or not flags:
+                continue
+            key = (scenario, staff)
+            cells[key] = cells.get(key, 0) | flags
+
+        scenarios = sorted({s for s, _ in cells})
+        staff = sorted({p for _, p in cells})
+        scenario_index = {name: i for i, name in enumerate(scenarios)}
+        staff_index = {name: i for i, name in enumerate(staff)}
+
+        rows: List[List[Tuple[int, int]]] = [[] for _ in scenarios]
+        for (scenario, person), flags in cells.items():
+            rows[scenario_index[scenario]].append((staff_index[person], flags))
+
+        indptr = array('I', [0])
+        indices = array('I')
+        data = array('B')
+        for row in rows:
+            row.sort()
+            for col, flags in row:
+                indices.append(col)
+                data.append(flags)
+            indptr.append(len(indices))
+
+        scenario_labels = scenario_labels or {}
+        staff_labels = staff_labels or {}
+        return cls(scenarios, staff, indptr, indices, data,
+                   scenario_labels=[scenario_labels.get(k) or k for k in scenarios],
+                   staff_labels=[staff_labels.get(k) or k for k in staff])
+
+    @classmethod
+    def from_gm_data(cls, filepath: str = 'gm_data.txt') -> 'CapabilityMatrix':
+        """gm_data.txt（担当GM / 体験済み）から構築"""
+        from parse_gm_data import parse_gm_data_file
+
+        def triples():
+            for title, (main_gms, experienced) in parse_gm_data_file(filepath).items():
+                for name in main_gms:
+                    yield title, name, CAN_MAIN_GM
+                for name in experienced:
+                    yield title, name, IS_EXPERIENCED
+
+        return cls.from_triples(triples())
+
+    @classmethod
+    def from_assignments(cls, rows: Iterable[Dict],
+                         scenario_names: Optional[Dict[str, str]] = None,
+                         staff_names: Optional[Dict[str, str]] = None) -> 'CapabilityMatrix':
+        """
+        staff_scenario_assignments の行から構築
+
+        行・列のキーは scenario_id / staff_id のまま（同名の別シナリオ・別スタッフを
+        まとめない）。scenario_names / staff_names（ID → 名前）は表示名に使う。
+        """
+        return cls.from_triples(
+            ((row.get('scenario_id'), row.get('staff_id'), flags_from_row(row)) for row in rows),
+            scenario_labels=scenario_names,
+            staff_labels=staff_names,
+        )
+
+    # ------------------------------------------------------------------
+    # クエリ
+    # ------------------------------------------------------------------
+
+    def find_scenarios(self, name: str) -> List[str]:
+        """キーまたは表示名が name のシナリオのキー"""
+        if name in self.scenario_index:
+            return [name]
+        return [k for k, label in zip(self.scenarios, self.scenario_labels) if label == name]
+
+    def find_staff(self, name: str) -> List[str]:
+        """キーまたは表示名が name のスタッフのキー"""
+        if name in self.staff_index:
+            return [name]
+        return [k for k, label in zip(self.staff, self.staff_labels) if label == name]
+
+    def staff_for_scenario(self, scenario: str, mask: int = CAN_MAIN_GM | CAN_SUB_GM) -> List[str]:
+        """シナリオを担当できる（mask のいずれかのビットを持つ）スタッフ"""
+        row = self.scenario_index.get(scenario)
+        if row is None:
+            return []
+        return [
+            self.staff[self.indices[k]]
+            for k in range(self.indptr[row], self.indptr[row + 1])
+            if self.data[k] & mask
+        ]
+
+    def scenarios_for_staff(self, staff: str, mask: int = CAN_MAIN_GM | CAN_SUB_GM) -> List[str]:
+        """スタッフが担当できる（mask のいずれかのビットを持つ）シナリオ"""
+        col = self.staff_index.get(staff)
+        if col is None:
+            return []
+        return [
+            self.scenarios[self.t_indices[k]]
+            for k in range(self.t_indptr[col], self.t_indptr[col + 1])
+            if self.t_data[k] & mask
+        ]
+
+    def flags(self, scenario: str, staff: str) -> int:
+        """1セルのフラグを取得（二分探索）"""
+        row = self.scenario_index.get(scenario)
+        col = self.staff_index.get(staff)
+        if row is None or col is None:
+            return 0
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.indices[mid] < col:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.indptr[row + 1] and self.indices[lo] == col:
+            return self.data[lo]
+        return 0
+
+    def coverage_counts(self, mask: int = CAN_MAIN_GM | CAN_SUB_GM) -> Dict[str, int]:
+        """シナリオ別の担当可能スタッフ数"""
+        counts = {}
+        data = self.data
+        for row, title in enumerate(self.scenarios):
+            counts[title] = sum(
+                1 for k in range(self.indptr[row], self.indptr[row + 1]) if data[k] & mask
+            )
+        return counts
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    # ------------------------------------------------------------------
+    # シリアライズ
+    # ------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({
+            'scenarios': self.scenarios,
+            'staff': self.staff,
+            'scenario_labels': self.scenario_labels,
+            'staff_labels': self.staff_labels,
+            'nnz': self.nnz,
+        }, ensure_ascii=False).encode('utf-8')
+
+        parts = [_MAGIC, struct.pack('<I', len(header)), header]
+        for arr in (self.indptr, self.indices, self.t_indptr, self.t_indices):
+            a = array('I', arr)
+            if sys.byteorder != 'little':
+                a.byteswap()
+            parts.append(a.tobytes())
+        parts.append(self.data.tobytes())
+        parts.append(self.t_data.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, buf: bytes) -> 'CapabilityMatrix':
+        if buf[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('GM可否マトリクスのファイル形式が不正です')
+        offset = len(_MAGIC)
+        (header_len,) = struct.unpack_from('<I', buf, offset)
+        offset += 4
+        header = json.loads(buf[offset:offset + header_len].decode('utf-8'))
+        offset += header_len
+
+        n_scenarios = len(header['scenarios'])
+        n_staff = len(header['staff'])
+        nnz = header['nnz']
+
+        def take(typecode: str, count: int) -> array:
+            nonlocal offset
+            a = array(typecode)
+            size = a.itemsize * count
+            a.frombytes(buf[offset:offset + size])
+            if typecode == 'I' and sys.byteorder != 'little':
+                a.byteswap()
+            offset += size
+            return a
+
+        indptr = take('I', n_scenarios + 1)
+        indices = take('I', nnz)
+        t_indptr = take('I', n_staff + 1)
+        t_indices = take('I', nnz)
+        data = take('B', nnz)
+        t_data = take('B', nnz)
+
+        return cls(header['scenarios'], header['staff'], indptr, indices, data,
+                   t_indptr, t_indices, t_data,
+                   scenario_labels=header.get('scenario_labels'),
+                   staff_labels=header.get('staff_labels'))
+
+    def save(self, filepath: str = DEFAULT_MATRIX_PATH) -> None:
+        with open(filepath, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filepath: str = DEFAULT_MATRIX_PATH) -> 'CapabilityMatrix':
+        with open(filepath, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def fetch_assignments_from_db(organization_id: str) -> CapabilityMatrix:
+    """1組織の staff_scenario_assignments からマトリクスを構築"""
+    from supabase import create_client
+    from dotenv import load_dotenv
+
+    # キーセットページングは scripts/map_catalog_to_scenarios.py のものを使う
+    scripts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
+    if scripts_dir not in sys.path:
+        sys.path.append(scripts_dir)
+    from map_catalog_to_scenarios import fetch_table_paged
+
+    load_dotenv('.env.local')
+    load_dotenv()
+
+    supabase = create_client(
+        os.getenv("VITE_SUPABASE_URL"),
+        os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY")
+    )
+    org = {'organization_id': organization_id}
+
+    staff = fetch_table_paged(supabase, 'staff', 'id, name', 'id', filters=org)
+    rows = fetch_table_paged(
+        supabase, 'staff_scenario_assignments',
+        'staff_id, scenario_id, can_main_gm, can_sub_gm, is_experienced',
+        ('staff_id', 'scenario_id'), filters=org,
+    )
+    # scenario_masters は組織をまたいで共有されるマスタ
+    scenarios = fetch_table_paged(supabase, 'scenario_masters', 'id, title', 'id')
+
+    return CapabilityMatrix.from_assignments(
+        rows,
+        scenario_names={s['id']: s['title'] for s in scenarios},
+        staff_names={s['id']: s['name'] for s in staff},
+    )
+
+
+def describe_flags(flags: int) -> str:
+    return ', '.join(name for bit, name in FLAG_NAMES.items() if flags & bit) or '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='スタッフ × シナリオ GM可否マトリクス')
+    parser.add_argument('--matrix', default=DEFAULT_MATRIX_PATH, help='マトリクスファイルのパス')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='マトリクスを構築して保存')
+    build.add_argument('--gm-data', default='gm_data.txt')
+    build.add_argument('--from-db', action='store_true',
+                       help='staff_scenario_assignments から構築')
+    build.add_argument('--organization-id', default=None,
+                       help='--from-db で対象にする組織のID')
+    build.add_argument('-o', '--output', default=None)
+
+    who = sub.add_parser('who', help='シナリオを担当できるスタッフ')
+    who.add_argument('scenario')
+
+    covers = sub.add_parser('covers', help='スタッフが担当できるシナリオ')
+    covers.add_argument('staff')
+
+    sub.add_parser('coverage', help='シナリオ別の担当可能人数')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if args.from_db:
+            if not args.organization_id:
+                parser.error('--from-db には --organization-id が必要です')
+            print("staff_scenario_assignments を取得中...")
+            matrix = fetch_assignments_from_db(args.organization_id)
+        else:
+            print(f"{args.gm_data} をパース中...")
+            matrix = CapabilityMatrix.from_gm_data(args.gm_data)
+        output = args.output or args.matrix
+        matrix.save(output)
+        print(f"✅ シナリオ {len(matrix.scenarios)}件 × スタッフ {len(matrix.staff)}名"
+              f"（{matrix.nnz}セル）")
+        print(f"✅ {output} を作成しました")
+        return
+
+    matrix = CapabilityMatrix.load(args.matrix)
+
+    if args.command == 'who':
+        keys = matrix.find_scenarios(args.scenario)
+        if not keys:
+            print(f"❌ シナリオが見つかりません: {args.scenario}")
+            return
+        for key in keys:
+            row = matrix.scenario_index[key]
+            if len(keys) > 1:
+                print(f"{matrix.scenario_labels[row]} ({key})")
+            for k in range(matrix.indptr[row], matrix.indptr[row + 1]):
+                print(f"  {matrix.staff_labels[matrix.indices[k]]}: {describe_flags(matrix.data[k])}")
+
+    elif args.command == 'covers':
+        for person in matrix.find_staff(args.staff):
+            for key in matrix.scenarios_for_staff(person):
+                label = matrix.scenario_labels[matrix.scenario_index[key]]
+                print(f"  {label}: {describe_flags(matrix.flags(key, person))}")
+
+    elif args.command == 'coverage':
+        counts = matrix.coverage_counts()
+        labels = dict(zip(matrix.scenarios, matrix.scenario_labels))
+        for key, count in sorted(counts.items(), key=lambda x: (x[1], labels[x[0]])):
+            print(f"  {count:3d}名  {labels[key]}")
+
+
+if __name__ == '__main__':
+    main()
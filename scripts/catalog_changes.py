@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+カタログの変更フィード
+
+カタログを書き出すたびに、スナップショット（前回SQLを生成したときのカタログ）と
+項目ごとのハッシュで比べ、追加・削除・変更（変わった項目名つき）を変更フィードに
+書き出す。スクレイピングではスナップショットを進めないので、SQLを生成するまでに
+何度スクレイピングしても、その間の変更はすべてフィードに残る。
+
+generate_update_sql.py / generate_scenario_update_sql.py は --changes を付けると
+このフィードに載ったシナリオ・項目だけを更新し、SQLを書き出したあと
+advance_snapshot() でスナップショットをフィードの時点まで進める。
+
+スナップショットは項目ごとのハッシュだけを持つ（本文はカタログJSON側にある）。
+"""
+
+import argparse
+import hashlib
+import json
+from datetime import datetime
+
+CATALOG_JSON_PATH = "docs/data/queens-waltz-catalog.json"
+SNAPSHOT_PATH = "docs/data/queens-waltz-catalog.snapshot.json"
+CHANGE_FEED_PATH = "docs/data/queens-waltz-catalog.changes.json"
+
+SNAPSHOT_VERSION = 1
+
+
+def value_hash(value):
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def field_hashes(scenario):
+    """タイトル以外の項目ごとのハッシュ"""
+    return {field: value_hash(value) for field, value in scenario.items() if field != "title"}
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """前回のスナップショット（無い・形式が違う場合は None）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        print(f"  ⚠ スナップショットを読み込めないため、全件を追加として扱います: {path}")
+        return None
+    if data.get("version") != SNAPSHOT_VERSION:
+        return None
+    return data
+
+
+def build_snapshot(scenarios):
+    return {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "scenarios": {s["title"]: field_hashes(s) for s in scenarios if s.get("title")},
+    }
+
+
+def diff_catalog(previous, scenarios):
+    """
+    前回のスナップショットと今回のシナリオを比べて変更フィードを作る
+
+    Returns:
+        {"added": [シナリオ], "removed": [タイトル],
+         "modified": [{"title", "fields": [変わった項目], "scenario"}], "unchanged": 件数}
+    """
+    before = previous["scenarios"] if previous else {}
+    feed = {
+        "previous_at": previous["created_at"] if previous else None,
+        "generated_at": datetime.now().isoformat(),
+        "added": [],
+        "removed": [],
+        "modified": [],
+        "unchanged": 0,
+    }
+
+    seen = set()
+    for s in scenarios:
+        title = s.get("title")
+        if not title or title in seen:
+            continue
+        seen.add(title)
+
+        old = before.get(title)
+        if old is None:
+            feed["added"].append(s)
+            continue
+        new = field_hashes(s)
+        fields = sorted(f for f in old.keys() | new.keys() if old.get(f) != new.get(f))
+        if fields:
+            feed["modified"].append({"title": title, "fields": fields, "scenario": s})
+        else:
+            feed["unchanged"] += 1
+
+    feed["removed"] = [title for title in before if title not in seen]
+    return feed
+
+
+def summarize(feed):
+    return (f"追加 {len(feed['added'])} 件 / 変更 {len(feed['modified'])} 件 / "
+            f"削除 {len(feed['removed'])} 件 / 変化なし {feed['unchanged']} 件")
+
+
+def _write_json(path, data, **kwargs):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, **kwargs)
+
+
+def update_change_feed(scenarios, snapshot_path=SNAPSHOT_PATH, feed_path=CHANGE_FEED_PATH):
+    """
+    今回のカタログとスナップショットの差で変更フィードを書き出す
+
+    スナップショットはここでは進めない（advance_snapshot() で進める）。
+    フィードには今回のカタログのハッシュ（next_snapshot）も持たせる。
+    """
+    feed = diff_catalog(load_snapshot(snapshot_path), scenarios)
+    feed["next_snapshot"] = build_snapshot(scenarios)
+    _write_json(feed_path, feed)
+
+    print(f"📝 変更フィード: {summarize(feed)} → {feed_path}")
+    return feed
+
+
+def advance_snapshot(feed_path=CHANGE_FEED_PATH, snapshot_path=SNAPSHOT_PATH):
+    """
+    スナップショットを変更フィードの時点まで進め、フィードを空にする
+
+    フィードの変更をSQLにしたあとに呼ぶ（次のフィードにはそれ以降の変更だけが載る）。
+    """
+    with open(feed_path, "r", encoding="utf-8") as f:
+        feed = json.load(f)
+    snapshot = feed.get("next_snapshot")
+    if not snapshot:
+        print(f"  ⚠ 変更フィードにスナップショットが無いため進めません（カタログを取り直してください）: {feed_path}")
+        return False
+
+    _write_json(snapshot_path, snapshot, sort_keys=True)
+    _write_json(feed_path, {
+        "previous_at": snapshot["created_at"],
+        "generated_at": datetime.now().isoformat(),
+        "added": [],
+        "removed": [],
+        "modified": [],
+        "unchanged": len(snapshot["scenarios"]),
+        "next_snapshot": snapshot,
+    })
+    print(f"📝 スナップショットを進めました（{snapshot['created_at']} 時点）→ {snapshot_path}")
+    return True
+
+
+def load_changed_fields(path=CHANGE_FEED_PATH):
+    """
+    変更フィードから「タイトル → 変わった項目の集合」を作る
+
+    追加されたシナリオは None（全項目が対象）。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        feed = json.load(f)
+    changed = {s["title"]: None for s in feed.get("added", [])}
+    for m in feed.get("modified", []):
+        changed[m["title"]] = set(m["fields"])
+    print(f"変更フィード: {summarize(feed)}（{path}）")
+    return changed
+
+
+def fields_touched(changed, title, fields):
+    """
+    title のうち更新すべき項目を fields から選ぶ
+
+    changed が None（フィードを使わない）か、追加されたシナリオなら fields をそのまま返す。
+    フィードに載っていなければ空集合。
+    """
+    if changed is None:
+        return set(fields)
+    if title not in changed:
+        return set()
+    if changed[title] is None:
+        return set(fields)
+    return set(fields) & changed[title]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="カタログの変更フィードを作成")
+    parser.add_argument("--catalog", default=CATALOG_JSON_PATH, help=f"カタログJSON（既定 {CATALOG_JSON_PATH}）")
+    parser.add_argument("--advance", action="store_true",
+                        help="フィードを作らず、スナップショットを現在のフィードの時点まで進める")
+    args = parser.parse_args()
+
+    if args.advance:
+        advance_snapshot()
+        return
+
+    with open(args.catalog, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    scenarios = data.get("scenarios", []) if isinstance(data, dict) else data
+    update_change_feed(scenarios)
+
+
+if __name__ == "__main__":
+    main()
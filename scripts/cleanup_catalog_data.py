@@ -7,6 +7,9 @@ import json
 import re
 from datetime import datetime
 
+from catalog_changes import update_change_feed
+from staging_store import StagingStore
+
 
 def is_valid_scenario_title(title):
     """有効なシナリオタイトルかどうか判定"""
@@ -157,6 +160,13 @@ def save_to_json(scenarios, all_tags, filepath):
     print(f"保存完了: {filepath}")
 
 
+def save_to_staging(scenarios, json_path="docs/data/queens-waltz-catalog.json"):
+    """カタログをステージングDBに反映（変わったシナリオだけ書き込む。save_to_json の後に呼ぶ）"""
+    with StagingStore() as store:
+        written, removed = store.replace_catalog(scenarios, json_path=json_path)
+    print(f"✅ ステージングDB: 更新 {written} 件 / 削除 {removed} 件 → {store.path}")
+
+
 def main():
     print("=== カタログデータ クリーンアップ ===\n")
     
@@ -165,6 +175,8 @@ def main():
     if scenarios:
         save_to_markdown(scenarios, all_tags, "docs/data/queens-waltz-catalog.md")
         save_to_json(scenarios, all_tags, "docs/data/queens-waltz-catalog.json")
+        save_to_staging(scenarios)
+        update_change_feed(scenarios)
     else:
         print("シナリオが見つかりませんでした")
 
@@ -6,20 +6,20 @@
 import json
 from datetime import datetime
 
+from staging_store import REVIEW_THRESHOLD, StagingStore, similarity_bucket, use_store
+
+MAPPING = "masters"
+MAPPING_JSON_PATH = "docs/data/scenario-mapping-masters.json"
+
 
 def load_mapping_data():
-    """マッピングデータを読み込み"""
-    with open("docs/data/scenario-mapping-masters.json", "r", encoding="utf-8") as f:
+    """マッピングデータを読み込み（JSON）"""
+    with open(MAPPING_JSON_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def generate_report(data):
-    """Markdownレポートを生成"""
-    matched = data.get("matched", [])
-    unmatched_catalog = data.get("unmatched_catalog", [])
-    unmatched_db = data.get("unmatched_db", [])
-    stats = data.get("stats", {})
-    
+def render_header(stats, buckets):
+    """見出し・統計サマリー・マッチング精度の分布（buckets: 区分 → 件数）"""
     lines = []
     
     # ヘッダー
@@ -43,66 +43,78 @@ def generate_report(data):
     # マッチング精度の分布
     lines.append("## マッチング精度の分布")
     lines.append("")
-    
-    perfect_match = sum(1 for m in matched if m["similarity"] == 1.0)
-    high_match = sum(1 for m in matched if 0.9 <= m["similarity"] < 1.0)
-    medium_match = sum(1 for m in matched if 0.7 <= m["similarity"] < 0.9)
-    low_match = sum(1 for m in matched if m["similarity"] < 0.7)
-    
-    lines.append(f"- **完全一致（100%）**: {perfect_match}件")
-    lines.append(f"- **高精度マッチ（90-99%）**: {high_match}件")
-    lines.append(f"- **中精度マッチ（70-89%）**: {medium_match}件")
-    lines.append(f"- **低精度マッチ（50-69%）**: {low_match}件")
+    lines.append(f"- **完全一致（100%）**: {buckets.get('perfect', 0)}件")
+    lines.append(f"- **高精度マッチ（90-99%）**: {buckets.get('high', 0)}件")
+    lines.append(f"- **中精度マッチ（70-89%）**: {buckets.get('medium', 0)}件")
+    lines.append(f"- **低精度マッチ（50-69%）**: {buckets.get('low', 0)}件")
     lines.append("")
-    
-    # カタログのみのシナリオ（DB未登録）
-    if unmatched_catalog:
-        lines.append("## カタログのみ（DB未登録）")
-        lines.append("")
-        lines.append("以下のシナリオはカタログにあるがDBに登録されていません：")
-        lines.append("")
-        lines.append("| タイトル | 作者 | 人数 | 料金 | タグ |")
-        lines.append("|---------|------|------|------|------|")
-        for s in unmatched_catalog:
-            title = s.get("title", "")
-            author = s.get("author", "")
-            player = s.get("player_count", "")
-            price = s.get("price", "")
-            tags = ", ".join(s.get("tags", []))
-            lines.append(f"| {title} | {author} | {player} | {price} | {tags} |")
-        lines.append("")
-    
-    # DBのみのシナリオ（カタログ非公開）
-    if unmatched_db:
-        lines.append("## DBのみ（カタログ非公開）")
-        lines.append("")
-        lines.append("以下のシナリオはDBにあるがカタログには掲載されていません：")
-        lines.append("")
-        lines.append("| タイトル | 作者 |")
-        lines.append("|---------|------|")
-        for s in unmatched_db:
-            title = s.get("title", "")
-            author = s.get("author", "") or "不明"
-            lines.append(f"| {title} | {author} |")
-        lines.append("")
-    
-    # 低精度マッチ（要確認）
-    low_matches = [m for m in matched if m["similarity"] < 0.9]
-    if low_matches:
-        lines.append("## 要確認（低精度マッチ）")
-        lines.append("")
-        lines.append("以下のマッチは自動判定のため確認が必要です：")
-        lines.append("")
-        lines.append("| 類似度 | カタログ | DB |")
-        lines.append("|--------|----------|-----|")
-        for m in sorted(low_matches, key=lambda x: x["similarity"]):
-            sim = f"{m['similarity']:.0%}"
-            cat = m.get("catalog_title", "")
-            db = m.get("db_title", "")
-            lines.append(f"| {sim} | {cat} | {db} |")
-        lines.append("")
-    
-    # マッチ済みリスト（全件）
+    return "\n".join(lines)
+
+
+def render_unmatched_catalog(unmatched_catalog):
+    """カタログのみのシナリオ（DB未登録）"""
+    if not unmatched_catalog:
+        return ""
+    lines = []
+    lines.append("## カタログのみ（DB未登録）")
+    lines.append("")
+    lines.append("以下のシナリオはカタログにあるがDBに登録されていません：")
+    lines.append("")
+    lines.append("| タイトル | 作者 | 人数 | 料金 | タグ |")
+    lines.append("|---------|------|------|------|------|")
+    for s in unmatched_catalog:
+        title = s.get("title", "")
+        author = s.get("author", "")
+        player = s.get("player_count", "")
+        price = s.get("price", "")
+        tags = ", ".join(s.get("tags", []))
+        lines.append(f"| {title} | {author} | {player} | {price} | {tags} |")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def render_unmatched_db(unmatched_db):
+    """DBのみのシナリオ（カタログ非公開）"""
+    if not unmatched_db:
+        return ""
+    lines = []
+    lines.append("## DBのみ（カタログ非公開）")
+    lines.append("")
+    lines.append("以下のシナリオはDBにあるがカタログには掲載されていません：")
+    lines.append("")
+    lines.append("| タイトル | 作者 |")
+    lines.append("|---------|------|")
+    for s in unmatched_db:
+        title = s.get("title", "")
+        author = s.get("author", "") or "不明"
+        lines.append(f"| {title} | {author} |")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def render_low_matches(low_matches):
+    """低精度マッチ（要確認）。low_matches は類似度の昇順"""
+    if not low_matches:
+        return ""
+    lines = []
+    lines.append("## 要確認（低精度マッチ）")
+    lines.append("")
+    lines.append("以下のマッチは自動判定のため確認が必要です：")
+    lines.append("")
+    lines.append("| 類似度 | カタログ | DB |")
+    lines.append("|--------|----------|-----|")
+    for m in low_matches:
+        sim = f"{m['similarity']:.0%}"
+        cat = m.get("catalog_title", "")
+        db = m.get("db_title", "")
+        lines.append(f"| {sim} | {cat} | {db} |")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def render_matched(matched):
+    """マッチ済みリスト（全件）"""
+    lines = []
     lines.append("## マッチ済みリスト")
     lines.append("")
     lines.append("<details>")
@@ -119,15 +131,71 @@ def generate_report(data):
     lines.append("")
     lines.append("</details>")
     lines.append("")
-    
     return "\n".join(lines)
 
 
+def join_sections(sections):
+    return "\n".join(section for section in sections if section)
+
+
+def generate_report(data):
+    """Markdownレポートを生成（マッピング結果のJSONから）"""
+    matched = data.get("matched", [])
+    
+    buckets = {}
+    low_matches = []
+    for m in matched:
+        bucket = similarity_bucket(m["similarity"])
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        if m["similarity"] < REVIEW_THRESHOLD:
+            low_matches.append(m)
+    low_matches.sort(key=lambda x: x["similarity"])
+    
+    return join_sections([
+        render_header(data.get("stats", {}), buckets),
+        render_unmatched_catalog(data.get("unmatched_catalog", [])),
+        render_unmatched_db(data.get("unmatched_db", [])),
+        render_low_matches(low_matches),
+        render_matched(matched),
+    ])
+
+
+def generate_report_from_store(store, mapping=MAPPING):
+    """
+    Markdownレポートを生成（ステージングDBから）
+    
+    精度の分布はトリガーで保たれている件数から読み、各節は前回から内容に関わる行が
+    変わったものだけを描き直す。描き直す節もインデックスで必要な行だけを引く。
+    
+    Returns:
+        (レポート, 描き直した節の数)
+    """
+    renderers = [
+        ("unmatched_catalog", lambda: render_unmatched_catalog(store.unmatched_catalog(mapping))),
+        ("unmatched_db", lambda: render_unmatched_db(store.unmatched_db(mapping))),
+        ("low_matches", lambda: render_low_matches(store.matches(mapping, below=REVIEW_THRESHOLD))),
+        ("matched", lambda: render_matched(store.matches(mapping))),
+    ]
+    sections = [render_header(store.stats(mapping), store.counters(mapping))]
+    rendered = 0
+    for section, render in renderers:
+        body, fresh = store.report_section(mapping, section, render)
+        sections.append(body)
+        rendered += fresh
+    return join_sections(sections), rendered
+
+
 def main():
     print("マッピングレポートを生成中...")
     
-    data = load_mapping_data()
-    report = generate_report(data)
+    report = None
+    if StagingStore.exists():
+        with StagingStore() as store:
+            if store.has_mapping(MAPPING) and use_store(store, MAPPING_JSON_PATH):
+                report, rendered = generate_report_from_store(store, MAPPING)
+                print(f"ステージングDBから生成（描き直した節: {rendered}）")
+    if report is None:
+        report = generate_report(load_mapping_data())
     
     output_path = "docs/data/scenario-mapping-report.md"
     with open(output_path, "w", encoding="utf-8") as f:
@@ -3,19 +3,48 @@
 カタログデータからscenarios更新用SQLを生成
 """
 
-import json
+import argparse
+import re
 
-def generate_sql():
-    # カタログデータを読み込み
-    with open('docs/data/queens-waltz-catalog.json', 'r', encoding='utf-8') as f:
-        catalog = json.load(f)
+from catalog_changes import CHANGE_FEED_PATH, advance_snapshot, fields_touched, load_changed_fields
+from generate_update_sql import BATCH_SIZE, batched_update_sql
+from staging_store import load_catalog, load_internal
+
+# 更新に使うカタログの項目（変更フィードで絞るときの単位。player_count はパイプライン形式の人数）
+CATALOG_FIELDS = ("categories", "price", "players", "player_count", "duration")
+
+# --batch の VALUES の列（先頭はキー）と型
+BATCH_COLUMNS = [
+    ("title", "text"),
+    ("genre", "text[]"),
+    ("participation_fee", "integer"),
+    ("player_count_max", "integer"),
+    ("player_count_min", "integer"),
+    ("duration", "integer"),
+]
+
+
+def to_number(value):
+    """数値、または '4,500円' '7人' '2.5時間' のような表示を数値にする（取れなければ None）"""
+    if isinstance(value, (int, float)):
+        return value
+    match = re.search(r'\d+(?:\.\d+)?', (value or '').replace(',', ''))
+    if not match:
+        return None
+    number = float(match.group(0))
+    return int(number) if number.is_integer() else number
+
+
+def generate_sql(changes_path=None, batch=False, batch_size=BATCH_SIZE):
+    # カタログデータを読み込み（ステージングDB、無ければJSONの配列形式・{"scenarios": [...]} 形式）
+    catalog = load_catalog()
     
     print(f"カタログシナリオ数: {len(catalog)}")
+    changed = load_changed_fields(changes_path) if changes_path else None
     
     # 内部データも読み込み（追加情報用）
     try:
-        with open('docs/data/queens-waltz-scenarios-internal.json', 'r', encoding='utf-8') as f:
-            internal = json.load(f)
+        internal = load_internal()
         print(f"内部データシナリオ数: {len(internal)}")
     except:
         internal = []
@@ -40,24 +69,33 @@ def generate_sql():
     ]
     
     update_count = 0
+    batch_rows = []
     for s in catalog:
         title = s.get('title', '').replace("'", "''")  # SQLエスケープ
-        categories = s.get('categories', [])
-        price = s.get('price')
-        players = s.get('players')
-        duration = s.get('duration')
         
         if not title:
             continue
         
-        if categories:
-            # PostgreSQL配列形式に変換
-            genre_array = "ARRAY[" + ", ".join([f"'{c}'" for c in categories]) + "]"
-        else:
-            genre_array = "'{}'::text[]"
+        touched = fields_touched(changed, s.get('title'), CATALOG_FIELDS)
+        if not touched:
+            continue
+        
+        categories = s.get('categories', [])
+        price = to_number(s.get('price')) if 'price' in touched else None
+        players = to_number(s.get('players') or s.get('player_count')) if touched & {'players', 'player_count'} else None
+        duration = to_number(s.get('duration')) if 'duration' in touched else None
+        
+        set_clauses = []
         
-        # SET句を構築（genreは必須、他はオプション）
-        set_clauses = [f"genre = {genre_array}"]
+        # genre（変更フィードを使わないときは常に更新）
+        genre_array = None
+        if 'categories' in touched:
+            if categories:
+                # PostgreSQL配列形式に変換
+                genre_array = "ARRAY[" + ", ".join([f"'{c}'" for c in categories]) + "]"
+            else:
+                genre_array = "'{}'::text[]"
+            set_clauses.append(f"genre = {genre_array}")
         
         # 料金がある場合は追加
         if price:
@@ -70,7 +108,18 @@ def generate_sql():
         
         # 時間がある場合は追加（分単位に変換）
         if duration:
-            set_clauses.append(f"duration = {duration * 60}")
+            set_clauses.append(f"duration = {int(duration * 60)}")
+        
+        if not set_clauses:
+            continue
+        
+        if batch:
+            batch_rows.append((
+                f"'{title}'", genre_array, price or None, players or None, players or None,
+                int(duration * 60) if duration else None,
+            ))
+            update_count += 1
+            continue
         
         set_clause = ", ".join(set_clauses)
         
@@ -81,6 +130,24 @@ def generate_sql():
         sql_lines.append("")
         update_count += 1
     
+    if batch_rows:
+        # 1行ずつの版と同じく、タイトル一致または部分一致の行を更新する。
+        # 1つのシナリオに複数のカタログが当たる場合は、部分一致より完全一致、
+        # 同じ種類ならカタログの後のものを使う（部分一致の文を先に流す）
+        passes = [
+            ("部分一致", "t.title <> v.title AND t.title ILIKE '%' || v.title || '%'"),
+            ("完全一致", "t.title = v.title"),
+        ]
+        for label, match in passes:
+            statements = batched_update_sql(
+                "scenarios", BATCH_COLUMNS, batch_rows, match=match,
+                touch_updated_at=False, batch_size=batch_size,
+            )
+            sql_lines.append(f"-- scenarios（{label}）: {len(batch_rows)} 件（{len(statements)} 文）")
+            for statement in statements:
+                sql_lines.append(statement)
+                sql_lines.append("")
+    
     sql_lines.append("COMMIT;")
     sql_lines.append("")
     sql_lines.append(f"-- 合計 {update_count} シナリオの更新対象")
@@ -92,6 +159,8 @@ def generate_sql():
     
     print(f"SQL生成完了: {output_path}")
     print(f"更新対象シナリオ数: {update_count}")
+    if changes_path:
+        advance_snapshot(changes_path)
     
     # プレビュー表示
     print("\n=== SQLプレビュー (最初の5件) ===")
@@ -101,5 +170,14 @@ def generate_sql():
 
 
 if __name__ == "__main__":
-    generate_sql()
+    parser = argparse.ArgumentParser(description="カタログデータからscenarios更新用SQLを生成")
+    parser.add_argument("--changes", nargs="?", const=CHANGE_FEED_PATH, metavar="PATH",
+                        help=f"変更フィード（既定 {CHANGE_FEED_PATH}）に載ったシナリオ・項目だけを更新し、"
+                             "生成後にスナップショットを進める")
+    parser.add_argument("--batch", action="store_true",
+                        help="UPDATE ... FROM (VALUES ...) へまとめて出力")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"--batch の1文あたりの行数（既定 {BATCH_SIZE}）")
+    args = parser.parse_args()
+    generate_sql(args.changes, args.batch, args.batch_size)
 
@@ -4,10 +4,29 @@
 Supabase SQL Editorで実行可能
 """
 
-import json
+import argparse
 import re
 from datetime import datetime
 
+from catalog_changes import CHANGE_FEED_PATH, advance_snapshot, fields_touched, load_changed_fields
+from staging_store import load_mapping
+
+# 更新に使うカタログの項目（変更フィードで絞るときの単位）
+CATALOG_FIELDS = ("author", "player_count", "duration", "tags")
+
+# --batch で UPDATE ... FROM (VALUES ...) 1文にまとめる行数
+BATCH_SIZE = 200
+
+# --batch の VALUES の列（先頭はキー）と型
+BATCH_COLUMNS = [
+    ("id", "uuid"),
+    ("author", "text"),
+    ("player_count_min", "integer"),
+    ("player_count_max", "integer"),
+    ("duration", "integer"),
+    ("genre", "text[]"),
+]
+
 
 def parse_player_count(player_str):
     """人数文字列をパース"""
@@ -59,37 +78,127 @@ def genres_to_sql_array(genres):
     return "ARRAY[" + ", ".join(f"'{g}'" for g in escaped) + "]"
 
 
+def _typed(value, sql_type):
+    value = "NULL" if value is None else str(value)
+    return value if value.endswith(f"::{sql_type}") else f"{value}::{sql_type}"
+
+
+def _merge_by_key(rows):
+    """
+    先頭の列（キー）が同じ行を1行にまとめる
+
+    1行ずつの UPDATE を順に流したときと同じく、列ごとに後の行の NULL でない値が勝つ。
+    """
+    merged = {}
+    for row in rows:
+        old = merged.pop(row[0], None)
+        if old is not None:
+            row = tuple(new if new is not None else prev for new, prev in zip(row, old))
+        merged[row[0]] = row
+    return list(merged.values())
+
+
+def batched_update_sql(table, columns, rows, set_map=None, match=None,
+                       touch_updated_at=True, batch_size=BATCH_SIZE):
+    """
+    UPDATE table s SET ... FROM (VALUES ...) v WHERE ... を batch_size 行ずつ生成
+    
+    Args:
+        columns: VALUES の [(列名, 型)]。値はすべて型で明示キャストする（NULL だけの列も型が決まる）
+        rows: 各列の SQL リテラルのタプル（None は NULL）
+        set_map: {更新する列: VALUES の列}（既定は先頭のキー以外の同名の列）
+        match: 更新先の行 t と VALUES の行 v の結合条件。省略時は先頭の列を table の id として
+            更新する（同じ id の行はまとめる）
+    
+    値が NULL の列は COALESCE で元の値のままにする。
+    1つの更新先に複数の VALUES の行が当たると Postgres はそのどれを使うか決めないので、
+    match を指定したときは更新先の id ごとに後の行（rows の順）を1つだけ選ぶ。
+    """
+    names = [name for name, _ in columns]
+    set_map = set_map or {name: name for name in names[1:]}
+    set_lines = [f"  {target} = COALESCE(v.{source}, s.{target})" for target, source in set_map.items()]
+    if touch_updated_at:
+        set_lines.append("  updated_at = NOW()")
+    if match is None:
+        rows = _merge_by_key(rows)
+    
+    statements = []
+    for start in range(0, len(rows), batch_size):
+        values = ",\n".join(
+            "  (" + ", ".join(
+                ([str(start + i)] if match else [])
+                + [_typed(value, sql_type) for value, (_, sql_type) in zip(row, columns)]
+            ) + ")"
+            for i, row in enumerate(rows[start:start + batch_size])
+        )
+        if match is None:
+            source = f"(VALUES\n{values}\n) AS v({', '.join(names)})"
+            where = f"s.id = v.{names[0]}"
+        else:
+            source = (
+                f"(\n  SELECT DISTINCT ON (t.id) t.id AS target_id, v.*\n"
+                f"  FROM (VALUES\n{values}\n  ) AS v(ordinal, {', '.join(names)})\n"
+                f"  JOIN {table} t ON {match}\n"
+                f"  ORDER BY t.id, v.ordinal DESC\n"
+                f") AS v"
+            )
+            where = "s.id = v.target_id"
+        statements.append(
+            f"UPDATE {table} s SET\n" + ",\n".join(set_lines) + "\n"
+            f"FROM {source}\n"
+            f"WHERE {where};"
+        )
+    return statements
+
+
 def load_mapping_data():
-    """マッピングデータを読み込み"""
-    with open("docs/data/scenario-mapping-legacy.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+    """マッピングデータを読み込み（ステージングDBにあればそこから）"""
+    return load_mapping("legacy", "docs/data/scenario-mapping-legacy.json")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="カタログ情報でDBを更新するSQLを生成")
+    parser.add_argument("--changes", nargs="?", const=CHANGE_FEED_PATH, metavar="PATH",
+                        help=f"変更フィード（既定 {CHANGE_FEED_PATH}）に載ったシナリオ・項目だけを更新し、"
+                             "生成後にスナップショットを進める")
+    parser.add_argument("--batch", action="store_true",
+                        help="テーブルごとに UPDATE ... FROM (VALUES ...) へまとめて出力")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"--batch の1文あたりの行数（既定 {BATCH_SIZE}）")
+    args = parser.parse_args()
+    
     print("=== 更新SQL生成 ===\n")
     
     data = load_mapping_data()
     matched = data.get("matched", [])
+    changed = load_changed_fields(args.changes) if args.changes else None
     
     sql_lines = []
     sql_lines.append("-- カタログ情報でシナリオを更新")
     sql_lines.append(f"-- 生成日時: {datetime.now().isoformat()}")
     sql_lines.append("-- マッチしたシナリオ: {} 件".format(len(matched)))
+    if changed is not None:
+        sql_lines.append(f"-- 変更フィード: {args.changes}（変わったシナリオ・項目のみ）")
     sql_lines.append("")
     sql_lines.append("BEGIN;")
     sql_lines.append("")
     
     update_count = 0
+    batch_rows = []
     
     for m in matched:
         db_id = m.get("db_id")
         db_title = m.get("db_title")
         catalog_data = m.get("catalog_data", {})
         
-        author = catalog_data.get("author", "")
-        player_count = parse_player_count(catalog_data.get("player_count", ""))
-        duration = parse_duration_to_minutes(catalog_data.get("duration", ""))
-        tags = catalog_data.get("tags", [])
+        touched = fields_touched(changed, m.get("catalog_title"), CATALOG_FIELDS)
+        if not touched:
+            continue
+        
+        author = catalog_data.get("author", "") if "author" in touched else ""
+        player_count = parse_player_count(catalog_data.get("player_count", "")) if "player_count" in touched else None
+        duration = parse_duration_to_minutes(catalog_data.get("duration", "")) if "duration" in touched else None
+        tags = catalog_data.get("tags", []) if "tags" in touched else []
         genres = map_tags_to_genre(tags)
         
         # 更新するフィールドを構築
@@ -108,7 +217,18 @@ def main():
         if genres:
             set_clauses.append(f"genre = {genres_to_sql_array(genres)}")
         
-        if set_clauses:
+        if set_clauses and args.batch:
+            update_count += 1
+            has_author = author and author != "不明"
+            batch_rows.append((
+                escape_sql(db_id),
+                escape_sql(author) if has_author else None,
+                player_count or None,
+                player_count or None,
+                duration or None,
+                genres_to_sql_array(genres) if genres else None,
+            ))
+        elif set_clauses:
             update_count += 1
             sql_lines.append(f"-- {update_count}. {db_title}")
             sql_lines.append(f"UPDATE scenarios SET")
@@ -136,6 +256,18 @@ def main():
                 sql_lines.append(f"WHERE id = '{db_id}';")
                 sql_lines.append("")
     
+    if batch_rows:
+        # scenario_masters は duration を official_duration に入れる
+        master_set_map = {name: name for name, _ in BATCH_COLUMNS[1:]}
+        master_set_map["official_duration"] = master_set_map.pop("duration")
+        for table, set_map in (("scenarios", None), ("scenario_masters", master_set_map)):
+            statements = batched_update_sql(table, BATCH_COLUMNS, batch_rows, set_map,
+                                            batch_size=args.batch_size)
+            sql_lines.append(f"-- {table}: {len(batch_rows)} 件（{len(statements)} 文）")
+            for statement in statements:
+                sql_lines.append(statement)
+                sql_lines.append("")
+    
     sql_lines.append("COMMIT;")
     sql_lines.append("")
     sql_lines.append(f"-- 合計 {update_count} 件のシナリオを更新")
@@ -147,6 +279,8 @@ def main():
     
     print(f"✅ SQL生成完了: {output_path}")
     print(f"   更新対象: {update_count} 件")
+    if args.changes:
+        advance_snapshot(args.changes)
     print("")
     print("📋 Supabase SQL Editor で以下のファイルを実行してください:")
     print(f"   {output_path}")
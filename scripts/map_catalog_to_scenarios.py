@@ -6,11 +6,20 @@
 
 import os
 import json
+import hashlib
+import random
 import re
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from difflib import SequenceMatcher
+import heapq
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from scenario_readings import ReadingIndex, ReadingStore
+from staging_store import StagingStore, load_catalog
+
 # 環境変数の読み込み
 load_dotenv('.env.local')
 load_dotenv()
@@ -18,49 +27,64 @@ load_dotenv()
 # Supabaseクライアントの初期化
 def get_supabase_client():
     url = os.getenv("VITE_SUPABASE_URL")
-    key = os.getenv("VITE_SUPABASE_ANON_KEY")
+    # scenario_import_aliases は anon から読めないので SERVICE_ROLE_KEY を優先使用
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY")
     if not url or not key:
-        print("❌ エラー: VITE_SUPABASE_URL と VITE_SUPABASE_ANON_KEY を設定してください")
+        print("❌ エラー: VITE_SUPABASE_URL と SUPABASE_SERVICE_ROLE_KEY（または VITE_SUPABASE_ANON_KEY）を設定してください")
         return None
+    if not os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
+        print("⚠ ANON_KEY を使用（scenario_import_aliases は読み書きできません。--no-aliases で除外してください）")
     return create_client(url, key)
 
 
+# 英語→日本語の既知変換マップ
+EN_TO_JA = {
+    "lost": "ロスト",
+    "remembrance": "リメンブランス",
+    "sorcier": "ソルシエ",
+}
+
+_EN_TO_JA_PATTERNS = [
+    (re.compile(rf'\b{en}\b', flags=re.IGNORECASE), ja) for en, ja in EN_TO_JA.items()
+]
+
+# 全角を半角に変換
+_ZENKAKU_TABLE = str.maketrans({
+    'ａ': 'a', 'ｂ': 'b', 'ｃ': 'c', 'ｄ': 'd', 'ｅ': 'e',
+    'ｆ': 'f', 'ｇ': 'g', 'ｈ': 'h', 'ｉ': 'i', 'ｊ': 'j',
+    'ｋ': 'k', 'ｌ': 'l', 'ｍ': 'm', 'ｎ': 'n', 'ｏ': 'o',
+    'ｐ': 'p', 'ｑ': 'q', 'ｒ': 'r', 'ｓ': 's', 'ｔ': 't',
+    'ｕ': 'u', 'ｖ': 'v', 'ｗ': 'w', 'ｘ': 'x', 'ｙ': 'y',
+    'ｚ': 'z', '０': '0', '１': '1', '２': '2', '３': '3',
+    '４': '4', '５': '5', '６': '6', '７': '7', '８': '8',
+    '９': '9', '　': ' ', '～': '~', '−': '-', '：': ':',
+})
+
+_SYMBOL_RE = re.compile(r'[\s\-\_\.\,\!\?\'\"\`\~\:\;\/\\（）\(\)\[\]\{\}【】「」『』〈〉《》・]')
+_SPECIAL_CHAR_RE = re.compile(r'[☆★♡♥♪♫✨🎭🔍📕💀🎩📅🌀💥🇯🇵🗓️]')
+_CORE_TITLE_RE = re.compile(r'「(.+?)」')
+
+
 def normalize_title(title):
     """タイトルを正規化（マッチング用）"""
     if not title:
         return ""
     
-    # 英語→日本語の既知変換マップ
-    en_to_ja = {
-        "lost": "ロスト",
-        "remembrance": "リメンブランス",
-        "sorcier": "ソルシエ",
-    }
-    
     # 既知の英語タイトルを日本語に変換
-    for en, ja in en_to_ja.items():
-        title = re.sub(rf'\b{en}\b', ja, title, flags=re.IGNORECASE)
+    for pattern, ja in _EN_TO_JA_PATTERNS:
+        title = pattern.sub(ja, title)
     
     # 小文字化
     title = title.lower()
     
     # 全角を半角に変換
-    title = title.translate(str.maketrans({
-        'ａ': 'a', 'ｂ': 'b', 'ｃ': 'c', 'ｄ': 'd', 'ｅ': 'e',
-        'ｆ': 'f', 'ｇ': 'g', 'ｈ': 'h', 'ｉ': 'i', 'ｊ': 'j',
-        'ｋ': 'k', 'ｌ': 'l', 'ｍ': 'm', 'ｎ': 'n', 'ｏ': 'o',
-        'ｐ': 'p', 'ｑ': 'q', 'ｒ': 'r', 'ｓ': 's', 'ｔ': 't',
-        'ｕ': 'u', 'ｖ': 'v', 'ｗ': 'w', 'ｘ': 'x', 'ｙ': 'y',
-        'ｚ': 'z', '０': '0', '１': '1', '２': '2', '３': '3',
-        '４': '4', '５': '5', '６': '6', '７': '7', '８': '8',
-        '９': '9', '　': ' ', '～': '~', '−': '-', '：': ':',
-    }))
+    title = title.translate(_ZENKAKU_TABLE)
     
     # 空白、記号を除去
-    title = re.sub(r'[\s\-\_\.\,\!\?\'\"\`\~\:\;\/\\（）\(\)\[\]\{\}【】「」『』〈〉《》・]', '', title)
+    title = _SYMBOL_RE.sub('', title)
     
     # 特殊文字を除去
-    title = re.sub(r'[☆★♡♥♪♫✨🎭🔍📕💀🎩📅🌀💥🇯🇵🗓️]', '', title)
+    title = _SPECIAL_CHAR_RE.sub('', title)
     
     return title
 
@@ -84,8 +108,7 @@ def contains_match(a, b):
 def extract_core_title(title):
     """タイトルからコア部分を抽出（季節マーダー等の特殊処理）"""
     # 「季節のマーダーミステリー「xxx」」→ 「xxx」
-    import re
-    match = re.search(r'「(.+?)」', title)
+    match = _CORE_TITLE_RE.search(title)
     if match:
         return match.group(1)
     
@@ -96,43 +119,368 @@ def extract_core_title(title):
     return title
 
 
-def find_best_match(catalog_title, db_scenarios, threshold=0.6):
+# バイグラム候補のうち優先して本計算する件数
+DEFAULT_TOP_K = 10
+
+# DB取得のページサイズ（キーセットページング）
+DB_PAGE_SIZE = 1000
+
+# DBのシナリオ取得元: (名前, テーブル/ビュー, 取得カラム, キーセットのカラム)
+# organization_scenarios_with_master の id は scenario_master_id なので一意な org_scenario_id で送る
+DB_SOURCES = [
+    ("scenario_masters", "scenario_masters", "id, title, author", "id"),
+    ("scenarios", "scenarios", "id, title, author", "id"),
+    ("organization_scenarios", "organization_scenarios_with_master",
+     "id, org_scenario_id, organization_id, title, author", "org_scenario_id"),
+]
+DB_SOURCE_LABELS = ["マスタシナリオ", "レガシーシナリオ", "組織シナリオ"]
+
+# この類似度以上で、正規化しても DB タイトルと一致しないマッチをエイリアス候補にする
+# （候補は確認用ファイルに書き出すだけで、scenario_import_aliases には書き込まない）
+ALIAS_CANDIDATE_THRESHOLD = 0.7
+
+# エイリアス候補の確認用ファイル（{"カタログのタイトル": {"db_title", "similarity"}}）
+ALIAS_CANDIDATES_PATH = "docs/data/scenario-alias-candidates.json"
+
+# 手動で確認済みの対応（{"カタログのタイトル": "scenario_masters のタイトル"}）
+# 候補ファイルから正しいものをここへ移すと、--learn-aliases で登録される
+ALIAS_CONFIRMED_PATH = "docs/data/scenario-alias-confirmations.json"
+
+# エイリアスを upsert する1リクエストあたりの件数
+ALIAS_WRITE_BATCH = 500
+
+# TF-IDF スコアラーで一対一割り当てに使う候補数
+TFIDF_TOP_K = 5
+
+# 照合キャッシュ（DBテーブルごと）
+MATCH_CACHE_PATH = "docs/data/scenario-match-cache-{name}.json"
+
+
+def _bigrams(text):
+    """文字バイグラムの集合"""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _char_counts(text):
+    counts = {}
+    for ch in text:
+        counts[ch] = counts.get(ch, 0) + 1
+    return counts
+
+
+class ScenarioTitleIndex:
+    """
+    DBシナリオタイトルの前処理済みインデックス
+
+    - 正規化タイトル・コアタイトルを1回だけ計算
+    - 完全一致用のハッシュ（出現位置リスト）
+    - 候補絞り込み用の文字バイグラム転置インデックス
+    - SequenceMatcher の上限値（quick_ratio 相当）計算用の文字転置インデックス
+    """
+
+    def __init__(self, db_scenarios):
+        self.scenarios = list(db_scenarios)
+        self.norms = []
+        self.cores = []
+        self.norm_positions = {}
+        self.core_positions = {}
+        self.norm_bigrams = {}
+        self.core_bigrams = {}
+        self.norm_chars = {}
+        self.core_chars = {}
+
+        for i, scenario in enumerate(self.scenarios):
+            self.add(scenario, i)
+
+    def add(self, scenario, i=None):
+        """シナリオを1件インデックスに追加"""
+        if i is None:
+            i = len(self.scenarios)
+            self.scenarios.append(scenario)
+
+        title = scenario.get("title") or ""
+        norm = normalize_title(title)
+        core = normalize_title(extract_core_title(title))
+        self.norms.append(norm)
+        self.cores.append(core)
+        self.norm_positions.setdefault(norm, []).append(i)
+        self.core_positions.setdefault(core, []).append(i)
+
+        for text, postings in ((norm, self.norm_bigrams), (core, self.core_bigrams)):
+            for bigram in _bigrams(text):
+                postings.setdefault(bigram, []).append(i)
+
+        for text, postings in ((norm, self.norm_chars), (core, self.core_chars)):
+            for ch, count in _char_counts(text).items():
+                postings.setdefault(ch, []).append((i, count))
+
+    def __len__(self):
+        return len(self.scenarios)
+
+    @staticmethod
+    def _shared_chars(text, postings):
+        """text と各DBタイトルの文字多重集合の共通部分サイズ"""
+        shared = {}
+        for ch, count in _char_counts(text).items():
+            for i, db_count in postings.get(ch, ()):
+                shared[i] = shared.get(i, 0) + min(count, db_count)
+        return shared
+
+    @staticmethod
+    def _shared_bigrams(text, postings):
+        """text と各DBタイトルで共通する（異なり）バイグラム数"""
+        shared = {}
+        for bigram in _bigrams(text):
+            for i in postings.get(bigram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        return shared
+
+    def _contained(self, text, texts, postings):
+        """text を含む、または text に含まれるDBタイトル（両方3文字以上）"""
+        if len(text) < 3:
+            return set()
+        n_bigrams = len(_bigrams(text))
+        found = set()
+        for i, shared in self._shared_bigrams(text, postings).items():
+            other = texts[i]
+            if len(other) < 3:
+                continue
+            if shared == n_bigrams or shared == len(_bigrams(other)):
+                if text in other or other in text:
+                    found.add(i)
+        return found
+
+    def exact_matches(self, catalog_norm, catalog_core):
+        """完全一致（正規化 or コア）するDBシナリオの位置（昇順）"""
+        hits = set(self.norm_positions.get(catalog_norm, ()))
+        if len(catalog_core) >= 3:
+            hits.update(self.core_positions.get(catalog_core, ()))
+        return sorted(hits)
+
+    def exact_match(self, catalog_norm, catalog_core):
+        """完全一致（正規化 or コア）する最初のDBシナリオの位置"""
+        hits = []
+        if catalog_norm in self.norm_positions:
+            hits.append(self.norm_positions[catalog_norm][0])
+        if len(catalog_core) >= 3 and catalog_core in self.core_positions:
+            hits.append(self.core_positions[catalog_core][0])
+        return min(hits) if hits else None
+
+    def _contained_scores(self, catalog_norm, catalog_core):
+        """含有マッチのスコア（正規化タイトル → 0.9、コアタイトル → 0.95）"""
+        fixed = {}
+        for i in self._contained(catalog_core, self.cores, self.core_bigrams):
+            fixed[i] = 0.95
+        for i in self._contained(catalog_norm, self.norms, self.norm_bigrams):
+            fixed[i] = 0.9
+        return fixed
+
+    def _upper_bounds(self, catalog_norm, catalog_core):
+        """類似度の上限値（SequenceMatcher.quick_ratio と同じ式）"""
+        norms, cores = self.norms, self.cores
+        bounds = {}
+        cat_len = len(catalog_norm)
+        for i, shared in self._shared_chars(catalog_norm, self.norm_chars).items():
+            bounds[i] = 2.0 * shared / (cat_len + len(norms[i]))
+        core_len = len(catalog_core)
+        for i, shared in self._shared_chars(catalog_core, self.core_chars).items():
+            bound = 2.0 * shared / (core_len + len(cores[i]))
+            if bound > bounds.get(i, 0.0):
+                bounds[i] = bound
+        return bounds
+
+    def pair_score(self, catalog_norm, catalog_core, i):
+        """1組の類似度（find_best_match と同じ定義）"""
+        norm, core = self.norms[i], self.cores[i]
+        if catalog_norm == norm or (len(catalog_core) >= 3 and catalog_core == core):
+            return 1.0
+        if len(catalog_norm) >= 3 and len(norm) >= 3 and (catalog_norm in norm or norm in catalog_norm):
+            return 0.9
+        if len(catalog_core) >= 3 and len(core) >= 3 and (catalog_core in core or core in catalog_core):
+            return 0.95
+        return max(similarity_ratio(catalog_norm, norm), similarity_ratio(catalog_core, core))
+
+    def candidate_scores(self, catalog_norm, catalog_core, min_score):
+        """
+        類似度が min_score 以上の全候補を [(位置, 類似度), ...]（位置の昇順）で返す
+
+        上限値が min_score 未満のシナリオは本計算しない。
+        """
+        if not catalog_norm or not catalog_core:
+            candidates = range(len(self.scenarios))
+        else:
+            candidates = set(self.exact_matches(catalog_norm, catalog_core))
+            candidates.update(self._contained_scores(catalog_norm, catalog_core))
+            candidates.update(
+                i for i, bound in self._upper_bounds(catalog_norm, catalog_core).items()
+                if bound >= min_score
+            )
+        results = []
+        for i in sorted(candidates):
+            score = self.pair_score(catalog_norm, catalog_core, i)
+            if score >= min_score:
+                results.append((i, score))
+        return results
+
+    def scores(self, catalog_norm, catalog_core, top_k=DEFAULT_TOP_K):
+        """
+        全DBシナリオに対する find_best_match と同一のスコアのうち、
+        最良スコアの決定に必要な分だけを計算して (best_index, best_score) を返す
+
+        バイグラム共有数の多い上位 top_k 件をまず本計算し、
+        残りは文字多重集合から求めた類似度の上限値が現在の最良を
+        上回り得るものだけを本計算する（結果は全件走査と同一）。
+        """
+        norms, cores = self.norms, self.cores
+        fixed = self._contained_scores(catalog_norm, catalog_core)
+        bounds = self._upper_bounds(catalog_norm, catalog_core)
+
+        best_index = None
+        best_score = 0
+
+        def consider(i, score):
+            nonlocal best_index, best_score
+            # 元の線形走査と同じく、同点なら先に出現したシナリオを優先
+            if score > best_score or (score == best_score and best_index is not None and i < best_index):
+                best_index, best_score = i, score
+
+        def full_score(i):
+            return max(similarity_ratio(catalog_norm, norms[i]),
+                       similarity_ratio(catalog_core, cores[i]))
+
+        for i, score in fixed.items():
+            consider(i, score)
+
+        # バイグラム共有数の上位 top_k 件を本計算
+        shared = self._shared_bigrams(catalog_norm, self.norm_bigrams)
+        for i, count in self._shared_bigrams(catalog_core, self.core_bigrams).items():
+            if count > shared.get(i, 0):
+                shared[i] = count
+        blocked = sorted((i for i in shared if i not in fixed),
+                         key=lambda i: (-shared[i], i))[:top_k]
+        scored = set(fixed)
+        for i in blocked:
+            consider(i, full_score(i))
+            scored.add(i)
+
+        # 残りは上限値が最良を上回り得るものだけ本計算
+        remaining = sorted((i for i in bounds if i not in scored),
+                           key=lambda i: (-bounds[i], i))
+        for i in remaining:
+            bound = bounds[i]
+            if bound < best_score:
+                break
+            if bound == best_score and best_index is not None and i > best_index:
+                continue
+            consider(i, full_score(i))
+
+        return best_index, best_score
+
+
+def catalog_title_keys(catalog_title):
+    """カタログタイトルの (正規化タイトル, 正規化コアタイトル)"""
+    return normalize_title(catalog_title), normalize_title(extract_core_title(catalog_title))
+
+
+def best_candidate(catalog_title, index, top_k=DEFAULT_TOP_K):
+    """
+    閾値判定前の最良候補を返す
+    
+    Returns:
+        (DBシナリオのインデックス内位置 or None, 類似度)
+    """
+    catalog_norm, catalog_core = catalog_title_keys(catalog_title)
+    
+    # 完全一致（正規化タイトル or コアタイトル）
+    exact = index.exact_match(catalog_norm, catalog_core)
+    if exact is not None:
+        return exact, 1.0
+    
+    # 空文字同士は SequenceMatcher が 1.0 を返すため線形走査にフォールバック
+    if not catalog_norm or not catalog_core:
+        return _best_candidate_linear(catalog_title, index.scenarios)
+    
+    return index.scores(catalog_norm, catalog_core, top_k)
+
+
+def find_best_match(catalog_title, db_scenarios, threshold=0.6, top_k=DEFAULT_TOP_K):
     """
     カタログタイトルに最も近いDBシナリオを見つける
     
     Args:
         catalog_title: カタログのシナリオタイトル
         db_scenarios: DBシナリオのリスト [{"id": ..., "title": ...}, ...]
+                      または構築済みの ScenarioTitleIndex
         threshold: マッチと見なす最低類似度
+        top_k: バイグラム候補のうち優先して本計算する件数
     
     Returns:
         (best_match, similarity) or (None, 0)
     """
+    if isinstance(db_scenarios, ScenarioTitleIndex):
+        index = db_scenarios
+    else:
+        index = ScenarioTitleIndex(db_scenarios)
+    
+    position, score = best_candidate(catalog_title, index, top_k)
+    best_match = index.scenarios[position] if position is not None else None
+    
+    return _apply_match_threshold(normalize_title(catalog_title), best_match, score, threshold)
+
+
+def _apply_match_threshold(catalog_norm, best_match, best_score, threshold):
+    """低スコア時の長さチェックと閾値判定"""
+    # 低スコアの場合は誤マッチを防ぐ
+    if best_score < 0.7:
+        # タイトルの長さが大きく違う場合はマッチしない
+        if best_match:
+            cat_len = len(catalog_norm)
+            db_len = len(normalize_title(best_match.get("title", "")))
+            if abs(cat_len - db_len) > max(cat_len, db_len) * 0.5:
+                return None, 0
+    
+    if best_score >= threshold:
+        return best_match, best_score
+    
+    return None, 0
+
+
+def find_best_match_linear(catalog_title, db_scenarios, threshold=0.6):
+    """
+    全DBシナリオを線形走査する find_best_match（検証・ベンチマーク用の基準実装）
+    """
+    position, score = _best_candidate_linear(catalog_title, db_scenarios)
+    best_match = db_scenarios[position] if position is not None else None
+    return _apply_match_threshold(normalize_title(catalog_title), best_match, score, threshold)
+
+
+def _best_candidate_linear(catalog_title, db_scenarios):
+    """全DBシナリオを線形走査して閾値判定前の (位置, 類似度) を返す"""
     catalog_norm = normalize_title(catalog_title)
     catalog_core = normalize_title(extract_core_title(catalog_title))
     
     best_match = None
     best_score = 0
     
-    for scenario in db_scenarios:
-        db_title = scenario.get("title", "")
+    for i, scenario in enumerate(db_scenarios):
+        db_title = scenario.get("title") or ""
         db_norm = normalize_title(db_title)
         db_core = normalize_title(extract_core_title(db_title))
         
         # 完全一致
         if catalog_norm == db_norm:
-            return scenario, 1.0
+            return i, 1.0
         
         # コアタイトルの完全一致（季節シリーズ等）
         if catalog_core == db_core and len(catalog_core) >= 3:
-            return scenario, 1.0
+            return i, 1.0
         
         # 含有チェック（一方がもう一方を含む）
         if contains_match(catalog_title, db_title):
             score = 0.9  # 含有は高スコア
             if score > best_score:
                 best_score = score
-                best_match = scenario
+                best_match = i
             continue
         
         # コアタイトルの含有チェック
@@ -140,7 +488,7 @@ def find_best_match(catalog_title, db_scenarios, threshold=0.6):
             score = 0.95
             if score > best_score:
                 best_score = score
-                best_match = scenario
+                best_match = i
             continue
         
         # 類似度計算
@@ -152,76 +500,790 @@ def find_best_match(catalog_title, db_scenarios, threshold=0.6):
         
         if score > best_score:
             best_score = score
-            best_match = scenario
+            best_match = i
     
-    # 低スコアの場合は誤マッチを防ぐ
-    if best_score < 0.7:
-        # タイトルの長さが大きく違う場合はマッチしない
-        if best_match:
-            cat_len = len(normalize_title(catalog_title))
-            db_len = len(normalize_title(best_match.get("title", "")))
-            if abs(cat_len - db_len) > max(cat_len, db_len) * 0.5:
-                return None, 0
+    return best_match, best_score
+
+
+class MatchCache:
+    """
+    カタログ ↔ DB 照合結果の永続キャッシュ
     
-    if best_score >= threshold:
-        return best_match, best_score
+    キーは (正規化タイトル, 正規化コアタイトル)。照合結果はこの2つだけで決まるため、
+    表記が変わっても正規化後が同じタイトルは再計算しない。
+    DBタイトル集合のフィンガープリントが前回と同じならそのまま再利用し、
+    DB側でシナリオが追加された場合は追加分とだけ照合し直す。
+    削除・改題されたシナリオが最良候補だったエントリ、DBの並び順が
+    変わった場合は再計算する。
+    """
     
-    return None, 0
+    VERSION = 1
+    
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint = None
+        self.db = []
+        self.entries = {}
+        self.stats = {"reused": 0, "rescored_added": 0, "scored": 0}
+        
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.fingerprint = data.get("fingerprint")
+                self.db = [tuple(x) for x in data.get("db", [])]
+                self.entries = data.get("entries", {})
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, TypeError, ValueError):
+            print(f"  ⚠ キャッシュを読み込めないため作り直します: {path}")
+    
+    @staticmethod
+    def db_signature(db_scenarios):
+        return [(s.get("id"), s.get("title") or "") for s in db_scenarios]
+    
+    @staticmethod
+    def compute_fingerprint(db_signature):
+        payload = json.dumps(db_signature, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def key(catalog_title):
+        norm, core = catalog_title_keys(catalog_title)
+        return f"{norm}\t{core}"
+    
+    def _revalidate(self, index, signature):
+        """前回のエントリを現在のDBに合わせて更新し、使えないものは捨てる"""
+        if not self.entries or not self.db:
+            return {}
+        
+        old_set = set(self.db)
+        new_set = set(signature)
+        new_positions = {sig: i for i, sig in enumerate(signature)}
+        
+        # 残ったシナリオの相対順序が変わっていれば同点時の優先順位が変わるので全破棄
+        retained_old = [sig for sig in self.db if sig in new_set]
+        retained_new = [sig for sig in signature if sig in old_set]
+        if retained_old != retained_new or len(new_positions) != len(signature):
+            return {}
+        
+        added_positions = [i for i, sig in enumerate(signature) if sig not in old_set]
+        added_index = None
+        if added_positions:
+            added_index = ScenarioTitleIndex([index.scenarios[i] for i in added_positions])
+        
+        entries = {}
+        for key, entry in self.entries.items():
+            old_position = entry.get("position")
+            if old_position is None:
+                position = None
+            else:
+                if old_position >= len(self.db) or self.db[old_position] not in new_set:
+                    continue  # 最良候補が削除・改題された → 再計算
+                position = new_positions[self.db[old_position]]
+            score = entry.get("score", 0)
+            
+            if added_index is not None:
+                position, score = self._merge_added(
+                    entry["title"], position, score, index, added_index, added_positions
+                )
+                self.stats["rescored_added"] += 1
+            else:
+                self.stats["reused"] += 1
+            
+            entries[key] = {"title": entry["title"], "position": position, "score": score}
+        
+        return entries
+    
+    @staticmethod
+    def _merge_added(catalog_title, position, score, index, added_index, added_positions):
+        """既存の最良候補と追加シナリオ内の最良候補を、全件走査と同じ規則で比較"""
+        norm, core = catalog_title_keys(catalog_title)
+        added_position, added_score = best_candidate(catalog_title, added_index)
+        if added_position is None:
+            return position, score
+        added_position = added_positions[added_position]
+        
+        def is_exact(i):
+            return i is not None and (
+                index.norms[i] == norm or (len(core) >= 3 and index.cores[i] == core)
+            )
+        
+        # 完全一致は出現順で最初のものが優先
+        old_exact, new_exact = is_exact(position), is_exact(added_position)
+        if old_exact or new_exact:
+            if old_exact and (not new_exact or position < added_position):
+                return position, score
+            return added_position, added_score
+        
+        # 同点なら先に出現したシナリオを優先
+        if added_score > score or (added_score == score and position is not None
+                                   and added_position < position):
+            return added_position, added_score
+        return position, score
+    
+    def match_titles(self, titles, index, workers=1):
+        """
+        キャッシュを使って [(DB位置, 類似度), ...] を返す（match_titles と同じ形式）
+        """
+        signature = self.db_signature(index.scenarios)
+        fingerprint = self.compute_fingerprint(signature)
+        
+        if fingerprint == self.fingerprint:
+            entries = self.entries
+            self.stats["reused"] += len(entries)
+        else:
+            entries = self._revalidate(index, signature)
+        
+        keys = [self.key(t) for t in titles]
+        missing = {}
+        for key, title in zip(keys, titles):
+            if key not in entries and key not in missing:
+                missing[key] = title
+        
+        if missing:
+            results = match_titles(list(missing.values()), index, workers)
+            for (key, title), (position, score) in zip(missing.items(), results):
+                entries[key] = {"title": title, "position": position, "score": score}
+            self.stats["scored"] += len(missing)
+        
+        self.fingerprint = fingerprint
+        self.db = signature
+        self.entries = entries
+        self.save()
+        
+        return [(entries[k]["position"], entries[k]["score"]) for k in keys]
+    
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": self.VERSION,
+                "fingerprint": self.fingerprint,
+                "db": self.db,
+                "entries": self.entries,
+            }, f, ensure_ascii=False)
+    
+    def summary(self):
+        return (f"キャッシュ再利用 {self.stats['reused']} 件 / "
+                f"追加シナリオのみ再照合 {self.stats['rescored_added']} 件 / "
+                f"新規照合 {self.stats['scored']} 件")
+
+
+def _keyset_after(keys, last):
+    """キーセットの続き（keys の辞書順で last より後ろ）を表す PostgREST の or 条件"""
+    terms = []
+    for i, key in enumerate(keys):
+        equal = [f"{k}.eq.{v}" for k, v in zip(keys[:i], last[:i])]
+        term = f"{key}.gt.{last[i]}"
+        terms.append(f"and({','.join(equal + [term])})" if equal else term)
+    return ",".join(terms)
 
 
-def fetch_scenarios_from_db(supabase):
-    """DBからシナリオ情報を取得"""
+def fetch_table_paged(supabase, table, columns, key, page_size=DB_PAGE_SIZE, on_page=None, filters=None):
+    """
+    キーセットページングでテーブルの全行を取得
     
-    # scenario_masters テーブルから取得
-    print("scenario_masters を取得中...")
-    try:
-        result = supabase.table('scenario_masters').select('id, title, author').execute()
-        master_scenarios = result.data if result.data else []
-        print(f"  → {len(master_scenarios)} 件のマスタシナリオ")
-    except Exception as e:
-        print(f"  エラー: {e}")
-        master_scenarios = []
+    PostgREST の最大行数で黙って切り捨てられないよう、key の昇順に
+    page_size 件ずつ「key > 前ページの最後の値」で取得し、空ページで終了する。
+    複合主キーのテーブルは key に列名のタプルを渡す（辞書順で続きを取る）。
+    filters（列名 → 値）を渡すとその値の行だけを対象にする。
+    on_page が指定されていれば各ページを受け取った時点で呼び出す。
+    """
+    keys = (key,) if isinstance(key, str) else tuple(key)
+    rows = []
+    last = None
+    while True:
+        query = supabase.table(table).select(columns)
+        for column, value in (filters or {}).items():
+            query = query.eq(column, value)
+        for k in keys:
+            query = query.order(k)
+        query = query.limit(page_size)
+        if last is not None:
+            if len(keys) == 1:
+                query = query.gt(keys[0], last[0])
+            else:
+                query = query.or_(_keyset_after(keys, last))
+        page = query.execute().data or []
+        if not page:
+            break
+        rows.extend(page)
+        if on_page:
+            on_page(page)
+        last = tuple(page[-1][k] for k in keys)
+    return rows
+
+
+def fetch_scenarios_from_db(supabase, on_page=None):
+    """
+    DBからシナリオ情報を取得
     
-    # scenarios テーブルから取得（レガシー）
-    print("scenarios を取得中...")
-    try:
-        result = supabase.table('scenarios').select('id, title, author').execute()
-        legacy_scenarios = result.data if result.data else []
-        print(f"  → {len(legacy_scenarios)} 件のレガシーシナリオ")
-    except Exception as e:
-        print(f"  エラー: {e}")
-        legacy_scenarios = []
+    3つのソースを並行して取得する。on_page(ソース名, 行リスト) が指定されていれば
+    ページが届くたびに呼び出す（照合インデックスへの逐次投入用）。
     
-    # organization_scenarios を取得
-    print("organization_scenarios を取得中...")
+    Returns:
+        (master_scenarios, legacy_scenarios, org_scenarios)
+    """
+    def fetch(source):
+        name, table, columns, key = source
+        callback = (lambda page: on_page(name, page)) if on_page else None
+        return fetch_table_paged(supabase, table, columns, key, on_page=callback)
+    
+    print("scenario_masters / scenarios / organization_scenarios を並行取得中...")
+    results = []
+    with ThreadPoolExecutor(max_workers=len(DB_SOURCES)) as executor:
+        futures = [executor.submit(fetch, source) for source in DB_SOURCES]
+        for (name, _, _, _), future, label in zip(DB_SOURCES, futures, DB_SOURCE_LABELS):
+            try:
+                rows = future.result()
+                print(f"  → {len(rows)} 件の{label}")
+            except Exception as e:
+                print(f"  {name} エラー: {e}")
+                rows = []
+            results.append(rows)
+    
+    master_scenarios, legacy_scenarios, org_scenarios = results
+    return master_scenarios, legacy_scenarios, org_scenarios
+
+
+def fetch_aliases(supabase):
+    """scenario_import_aliases の全行（alias, canonical_name）。読めなければ None"""
     try:
-        result = supabase.table('organization_scenarios_with_master').select('*').execute()
-        org_scenarios = result.data if result.data else []
-        print(f"  → {len(org_scenarios)} 件の組織シナリオ")
+        rows = fetch_table_paged(supabase, "scenario_import_aliases", "alias, canonical_name", "alias")
+        print(f"  → {len(rows)} 件のエイリアス")
+        return rows
     except Exception as e:
-        print(f"  エラー: {e}")
-        org_scenarios = []
+        print(f"  ❌ scenario_import_aliases エラー: {e}")
+        return None
+
+
+class AliasIndex:
+    """
+    エイリアス → DBシナリオ位置のハッシュ
     
-    return master_scenarios, legacy_scenarios, org_scenarios
+    alias そのものと正規化後の alias の両方で引けるようにし、
+    canonical_name を DB タイトル（完全一致 → 正規化一致）で位置に解決しておく。
+    DB に無い canonical_name のエイリアスは無視する。
+    """
+    
+    def __init__(self, rows, index):
+        title_positions = {}
+        for i, scenario in enumerate(index.scenarios):
+            title_positions.setdefault(scenario.get("title") or "", i)
+        
+        self.canonical = {}
+        self.positions = {}
+        self.norm_positions = {}
+        for row in rows:
+            alias, canonical = row.get("alias") or "", row.get("canonical_name") or ""
+            self.canonical[alias] = canonical
+            position = title_positions.get(canonical)
+            if position is None:
+                positions = index.norm_positions.get(normalize_title(canonical))
+                position = positions[0] if positions else None
+            if position is None:
+                continue
+            self.positions.setdefault(alias, position)
+            norm = normalize_title(alias)
+            if norm:
+                self.norm_positions.setdefault(norm, position)
+    
+    def __len__(self):
+        return len(self.canonical)
+    
+    def lookup(self, title):
+        """エイリアスに一致すれば DBシナリオの位置、無ければ None"""
+        position = self.positions.get(title)
+        if position is None:
+            position = self.norm_positions.get(normalize_title(title))
+        return position
+
+
+def load_confirmed_aliases(path=ALIAS_CONFIRMED_PATH):
+    """手動で確認済みの {カタログタイトル: DBタイトル}（ファイルが無ければ空）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def alias_candidates(matched, existing, confirmed=None, threshold=ALIAS_CANDIDATE_THRESHOLD):
+    """
+    確認待ちのエイリアス候補 {カタログタイトル: {"db_title", "similarity"}}
+
+    類似度が threshold 以上で、正規化しても DB タイトルと一致しないマッチのうち、
+    既存のエイリアスにも確認済みの対応にも無いもの。
+    （正規化して一致するタイトルは照合で必ず見つかるので、エイリアスにしても意味がない）
+    """
+    confirmed = confirmed or {}
+    candidates = {}
+    for m in matched:
+        alias, canonical = m["catalog_title"], m["db_title"]
+        if (m["similarity"] >= threshold and alias and canonical
+                and normalize_title(alias) != normalize_title(canonical)
+                and alias not in existing and alias not in confirmed):
+            candidates.setdefault(alias, {"db_title": canonical, "similarity": round(m["similarity"], 3)})
+    return candidates
+
+
+def write_alias_candidates(candidates, path=ALIAS_CANDIDATES_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(candidates, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def learn_aliases(existing, confirmed):
+    """
+    新しく登録するエイリアス行（手動確認済みの対応のうち、まだ登録されていないもの）
+
+    確認済みの対応は既存の canonical_name も上書きする。
+    """
+    return [
+        {"alias": alias, "canonical_name": canonical}
+        for alias, canonical in confirmed.items()
+        if alias != canonical and existing.get(alias) != canonical
+    ]
+
+
+def write_aliases(supabase, rows, batch_size=ALIAS_WRITE_BATCH):
+    """エイリアスを alias をキーにまとめて upsert。書き込めた件数を返す"""
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        try:
+            supabase.table("scenario_import_aliases").upsert(batch, on_conflict="alias").execute()
+            written += len(batch)
+        except Exception as e:
+            print(f"  ❌ エイリアス書き込みエラー: {e}")
+            break
+    return written
 
 
 def load_catalog_data():
-    """カタログデータを読み込み"""
+    """カタログデータを読み込み（ステージングDBにあればそこから）"""
     catalog_path = "docs/data/queens-waltz-catalog.json"
     
     try:
-        with open(catalog_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data.get("scenarios", [])
+        return load_catalog(catalog_path)
     except FileNotFoundError:
         print(f"❌ カタログファイルが見つかりません: {catalog_path}")
         return []
 
 
-def map_scenarios(catalog_scenarios, db_scenarios, threshold=0.5):
+# ワーカープロセス内で共有する読み取り専用インデックス
+_worker_index = None
+
+
+def _init_match_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _match_chunk(args):
+    """ワーカー: タイトルのチャンクに func を適用した結果のリストを返す"""
+    func, titles, extra = args
+    return [func(title, _worker_index, *extra) for title in titles]
+
+
+def _map_titles(func, titles, index, workers, *extra):
+    """
+    func(title, index, *extra) を全タイトルに適用して入力順で返す
+    
+    workers > 1 の場合はタイトルを連続チャンクに分割してプロセスプールで処理する。
+    インデックスは各ワーカーの初期化時に1回だけ渡され、以後は読み取り専用で共有。
+    チャンクは入力順にマージされるため、結果は逐次実行と同一。
+    """
+    if workers <= 1 or len(titles) < workers * 2:
+        return [func(t, index, *extra) for t in titles]
+    
+    chunk_size = max(1, -(-len(titles) // (workers * 4)))
+    chunks = [(func, titles[i:i + chunk_size], extra) for i in range(0, len(titles), chunk_size)]
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_match_worker,
+                             initargs=(index,)) as executor:
+        for chunk_results in executor.map(_match_chunk, chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def match_titles(titles, index, workers=1):
+    """カタログタイトル群を照合して閾値判定前の [(DB位置, 類似度), ...] を入力順で返す"""
+    return _map_titles(best_candidate, titles, index, workers)
+
+
+def candidate_edges(catalog_title, index, threshold=0.5):
+    """
+    カタログタイトルとマッチし得る全DBシナリオを [(DB位置, 類似度), ...] で返す
+    
+    各組に find_best_match と同じ閾値判定（低スコア時の長さチェック含む）を適用する。
+    """
+    catalog_norm, catalog_core = catalog_title_keys(catalog_title)
+    edges = []
+    for position, score in index.candidate_scores(catalog_norm, catalog_core, threshold):
+        match, score = _apply_match_threshold(
+            catalog_norm, index.scenarios[position], score, threshold
+        )
+        if match is not None:
+            edges.append((position, score))
+    return edges
+
+
+# 一対一割り当てで使う整数重み（類似度 × SCORE_SCALE）
+SCORE_SCALE = 10000
+
+
+def max_weight_matching(n_left, n_right, edges):
+    """
+    二部グラフの最大重みマッチング（完全マッチングである必要はない）
+    
+    最小費用流の逐次最短路法（ヒープを使った Dijkstra + ポテンシャル）で解く。
+    辺費用を (最大重み + 1 - 重み) にずらして非負にし、増加路の費用が
+    ずらし幅以上（= 重みが増えない）になった時点で打ち切る。
+    
+    Args:
+        edges: [(左ノード, 右ノード, 正の整数重み), ...]
+    
+    Returns:
+        {左ノード: 右ノード}
+    """
+    if not edges:
+        return {}
+    
+    shift = max(w for _, _, w in edges) + 1
+    source, sink = n_left + n_right, n_left + n_right + 1
+    n_nodes = sink + 1
+    
+    graph = [[] for _ in range(n_nodes)]
+    to, cap, cost = [], [], []
+    
+    def add_edge(u, v, c):
+        graph[u].append(len(to))
+        to.append(v); cap.append(1); cost.append(c)
+        graph[v].append(len(to))
+        to.append(u); cap.append(0); cost.append(-c)
+    
+    for u in range(n_left):
+        add_edge(source, u, 0)
+    pair_edges = []
+    for u, v, w in sorted(edges):
+        pair_edges.append((len(to), u, v))
+        add_edge(u, n_left + v, shift - w)
+    for v in range(n_right):
+        add_edge(n_left + v, sink, 0)
+    
+    dual = [0] * n_nodes
+    inf = float("inf")
+    
+    while True:
+        dist = [inf] * n_nodes
+        prev_edge = [-1] * n_nodes
+        visited = [False] * n_nodes
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if visited[v]:
+                continue
+            visited[v] = True
+            if v == sink:
+                break
+            for e in graph[v]:
+                if not cap[e]:
+                    continue
+                u = to[e]
+                if visited[u]:
+                    continue
+                nd = d + cost[e] - dual[u] + dual[v]
+                if nd < dist[u]:
+                    dist[u] = nd
+                    prev_edge[u] = e
+                    heapq.heappush(heap, (nd, u))
+        
+        if not visited[sink]:
+            break
+        for v in range(n_nodes):
+            if visited[v]:
+                dual[v] -= dist[sink] - dist[v]
+        
+        path = []
+        v = sink
+        while v != source:
+            e = prev_edge[v]
+            path.append(e)
+            v = to[e ^ 1]
+        if sum(cost[e] for e in path) >= shift:
+            break  # これ以上増やしても重みの合計は増えない
+        for e in path:
+            cap[e] -= 1
+            cap[e ^ 1] += 1
+    
+    return {u: v for e, u, v in pair_edges if cap[e] == 0}
+
+
+def assign_one_to_one(edge_lists, keys=None):
+    """
+    カタログ ↔ DB の一対一割り当て（重み合計最大）
+    
+    連結成分ごとに max_weight_matching を解く。各成分内のノード番号は
+    keys（カタログ側）と DB位置で並べるため、カタログの並び順に依存しない。
+    
+    Args:
+        edge_lists: カタログ側ごとの [(DB位置, 類似度), ...]
+        keys: カタログ側の並べ替えキー（省略時は入力順）
+    
+    Returns:
+        {カタログ側の位置: (DB位置, 類似度)}
+    """
+    keys = keys if keys is not None else list(range(len(edge_lists)))
+    
+    # Union-Find で連結成分に分割（カタログ側 = i、DB側 = ~位置）
+    parent = {}
+    
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    
+    for i, edges in enumerate(edge_lists):
+        for position, _ in edges:
+            a, b = find(i), find(~position)
+            if a != b:
+                parent[a] = b
+    
+    components = {}
+    for i, edges in enumerate(edge_lists):
+        if edges:
+            components.setdefault(find(i), []).append(i)
+    
+    assignment = {}
+    for members in components.values():
+        members.sort(key=lambda i: (keys[i], i))
+        scores = {}
+        positions = sorted({p for i in members for p, _ in edge_lists[i]})
+        right_ids = {p: k for k, p in enumerate(positions)}
+        edges = []
+        for left, i in enumerate(members):
+            for position, score in edge_lists[i]:
+                scores[(i, position)] = score
+                edges.append((left, right_ids[position], round(score * SCORE_SCALE)))
+        
+        for left, right in max_weight_matching(len(members), len(positions), edges).items():
+            i, position = members[left], positions[right]
+            assignment[i] = (position, scores[(i, position)])
+    
+    return assignment
+
+
+def _require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        print("❌ エラー: TF-IDF スコアラーには numpy が必要です（pip install numpy）")
+        raise
+    return numpy
+
+
+def _char_ngrams(text, ngram_range):
+    """文字 n-gram の出現回数"""
+    counts = {}
+    lo, hi = ngram_range
+    for n in range(lo, hi + 1):
+        for i in range(len(text) - n + 1):
+            gram = text[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class TfidfTitleScorer:
+    """
+    文字 n-gram TF-IDF のコサイン類似度による代替スコアラー（NumPy）
+    
+    DB側の正規化タイトル・コアタイトルは、L2 正規化済みの TF-IDF を
+    n-gram → (DB位置, 重み) の転置リスト（CSC 形式の疎行列）で持つ。
+    カタログ側は1タイトルずつ、持っている n-gram の転置リストだけを
+    np.bincount で足し合わせて全DBシナリオとの類似度を求め、上位 k 件を取り出す。
+    メモリは n-gram の出現数に比例する（タイトル数 × 語彙数の密行列は作らない）。
+    類似度は正規化タイトルとコアタイトルの大きい方。完全一致は 1.0。
+    """
+    
+    def __init__(self, index, ngram_range=(1, 3)):
+        np = _require_numpy()
+        self.np = np
+        self.index = index
+        self.ngram_range = ngram_range
+        
+        db_norm_grams = [_char_ngrams(t, ngram_range) for t in index.norms]
+        db_core_grams = [_char_ngrams(t, ngram_range) for t in index.cores]
+        
+        # 語彙と IDF は DB 側の文書（正規化タイトル）から作る
+        df = {}
+        for grams in db_norm_grams + db_core_grams:
+            for gram in grams:
+                df[gram] = df.get(gram, 0) + 1
+        n_docs = 2 * len(index.norms)
+        self.vocab = {gram: i for i, gram in enumerate(sorted(df))}
+        self.idf = np.array(
+            [np.log((1 + n_docs) / (1 + df[g])) + 1 for g in sorted(df)], dtype=np.float32
+        )
+        # 語彙にない n-gram の IDF（ベクトルのノルム計算にだけ使う）
+        self.oov_idf = float(np.log(1 + n_docs) + 1)
+        
+        self.db_norm = self._postings([self._vectorize(g) for g in db_norm_grams])
+        self.db_core = self._postings([self._vectorize(g) for g in db_core_grams])
+    
+    def _vectorize(self, grams):
+        """n-gram 出現回数から L2 正規化済み TF-IDF の疎ベクトル（語彙の列 → 重み）を作る"""
+        weights = {}
+        oov = 0.0
+        for gram, count in grams.items():
+            col = self.vocab.get(gram)
+            if col is None:
+                oov += (count * self.oov_idf) ** 2
+            else:
+                weights[col] = count * float(self.idf[col])
+        norm = (sum(w * w for w in weights.values()) + oov) ** 0.5 or 1.0
+        return {col: w / norm for col, w in weights.items()}
+    
+    def _postings(self, vectors):
+        """疎ベクトルのリストを列ごとの転置リスト (indptr, 行, 重み) にする"""
+        np = self.np
+        cols = np.fromiter((c for v in vectors for c in v), dtype=np.int64)
+        rows = np.fromiter((r for r, v in enumerate(vectors) for _ in v), dtype=np.int64)
+        data = np.fromiter((w for v in vectors for w in v.values()), dtype=np.float32)
+        order = np.argsort(cols, kind="stable")
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(self.vocab)), out=indptr[1:])
+        return indptr, rows[order], data[order]
+    
+    def _similarities(self, vector, postings):
+        """疎ベクトルと DB 側の全行とのコサイン類似度"""
+        np = self.np
+        indptr, rows, data = postings
+        if not vector:
+            return np.zeros(len(self.index))
+        hit_rows = np.concatenate([rows[indptr[c]:indptr[c + 1]] for c in vector])
+        hit_weights = np.concatenate([data[indptr[c]:indptr[c + 1]] * w for c, w in vector.items()])
+        return np.bincount(hit_rows, weights=hit_weights, minlength=len(self.index))
+    
+    def top_k(self, titles, k=5):
+        """
+        各タイトルの上位 k 件を [[(DB位置, 類似度), ...], ...] で返す
+        
+        類似度の降順、同点は DB位置の昇順。
+        """
+        np = self.np
+        index = self.index
+        results = []
+        k = min(k, len(index))
+        if k == 0:
+            return [[] for _ in titles]
+        
+        for title in titles:
+            norm, core = catalog_title_keys(title)
+            sims = np.maximum(
+                self._similarities(self._vectorize(_char_ngrams(norm, self.ngram_range)), self.db_norm),
+                self._similarities(self._vectorize(_char_ngrams(core, self.ngram_range)), self.db_core),
+            )
+            np.clip(sims, 0.0, 1.0, out=sims)
+            for position in index.exact_matches(norm, core):
+                sims[position] = 1.0
+            
+            cols = np.argpartition(-sims, k - 1)[:k]
+            scores = sims[cols]
+            order = np.lexsort((cols, -scores))
+            results.append([
+                (int(cols[j]), float(scores[j])) for j in order if scores[j] > 0
+            ])
+        
+        return results
+
+
+def _reading_match(title, index, reading_index, threshold):
+    """読み（カタカナ・ローマ字）による照合。閾値判定済みの (match, similarity)"""
+    position, score = reading_index.best(title)
+    if position is None:
+        return None, 0
+    return _apply_match_threshold(normalize_title(title), index.scenarios[position], score, threshold)
+
+
+def _best_matches(titles, index, threshold, workers, cache, tfidf=None, reading_index=None):
+    """各カタログタイトルの最良候補（複数タイトルが同じDBシナリオを取り得る）"""
+    if tfidf is not None:
+        candidates = [top[0] if top else (None, 0) for top in tfidf.top_k(titles, 1)]
+    elif cache is not None:
+        candidates = cache.match_titles(titles, index, workers)
+    else:
+        candidates = match_titles(titles, index, workers)
+    
+    results = []
+    for title, (position, raw_score) in zip(titles, candidates):
+        raw_match = index.scenarios[position] if position is not None else None
+        result = _apply_match_threshold(normalize_title(title), raw_match, raw_score, threshold)
+        # 表記で一致しなかったものだけ読みで照合
+        if result[0] is None and reading_index is not None:
+            result = _reading_match(title, index, reading_index, threshold)
+        results.append(result)
+    return results
+
+
+def _optimal_matches(titles, index, threshold, workers, tfidf=None, reading_index=None,
+                     taken=frozenset()):
+    """重み合計が最大になる一対一割り当て（taken の DB位置は割り当て済みとして除外）"""
+    if tfidf is not None:
+        edge_lists = []
+        for title, top in zip(titles, tfidf.top_k(titles, TFIDF_TOP_K)):
+            norm = normalize_title(title)
+            edge_lists.append([
+                (position, score) for position, score in top
+                if _apply_match_threshold(norm, index.scenarios[position], score, threshold)[0]
+            ])
+    else:
+        edge_lists = _map_titles(candidate_edges, titles, index, workers, threshold)
+    
+    # 表記で候補が無いものだけ読みで照合した候補を加える
+    if reading_index is not None:
+        for title, edges in zip(titles, edge_lists):
+            if not edges:
+                position, score = reading_index.best(title)
+                if position is not None and _apply_match_threshold(
+                    normalize_title(title), index.scenarios[position], score, threshold
+                )[0]:
+                    edges.append((position, score))
+    if taken:
+        edge_lists = [[(p, w) for p, w in edges if p not in taken] for edges in edge_lists]
+    keys = [(*catalog_title_keys(t), t) for t in titles]
+    assignment = assign_one_to_one(edge_lists, keys)
+    
+    results = []
+    for i in range(len(titles)):
+        if i in assignment:
+            position, score = assignment[i]
+            results.append((index.scenarios[position], score))
+        else:
+            results.append((None, 0))
+    return results
+
+
+def map_scenarios(catalog_scenarios, db_scenarios, threshold=0.5, workers=1, cache=None,
+                  assignment="greedy", scorer="sequence", readings=None, index=None,
+                  aliases=None):
     """
     カタログとDBのシナリオをマッピング
     
+    Args:
+        workers: 照合に使うプロセス数（1なら逐次実行）
+        cache: MatchCache（指定時は未照合・変更分のみスコア計算。greedy のみ）
+        assignment: "greedy" = タイトルごとに最良候補（DBシナリオの重複あり）
+                    "optimal" = 一対一で類似度の合計が最大になる割り当て
+        scorer: "sequence" = SequenceMatcher ベース（既定）
+                "tfidf" = 文字 n-gram TF-IDF のコサイン類似度（NumPy、キャッシュ不使用）
+        readings: ReadingStore（指定時は表記で一致しないタイトルを読みで照合）
+        index: db_scenarios から構築済みの ScenarioTitleIndex（取得しながら構築した場合）
+        aliases: AliasIndex（一致したタイトルはファジー照合せず類似度 1.0 で確定）
+    
     Returns:
         (matched, unmatched_catalog, unmatched_db)
     """
@@ -229,11 +1291,40 @@ def map_scenarios(catalog_scenarios, db_scenarios, threshold=0.5):
     unmatched_catalog = []
     used_db_ids = set()
     
-    for cat_scenario in catalog_scenarios:
-        cat_title = cat_scenario.get("title", "")
-        
-        best_match, score = find_best_match(cat_title, db_scenarios, threshold)
-        
+    # DBタイトルの正規化・インデックス構築は1回だけ
+    if index is None:
+        index = ScenarioTitleIndex(db_scenarios)
+    
+    titles = [s.get("title", "") for s in catalog_scenarios]
+    
+    # エイリアスに一致するタイトルは先に確定させ、残りだけファジー照合
+    results = [None] * len(titles)
+    alias_positions = set()
+    if aliases is not None:
+        for n, title in enumerate(titles):
+            position = aliases.lookup(title)
+            if position is not None:
+                results[n] = (index.scenarios[position], 1.0)
+                alias_positions.add(position)
+    pending = [n for n, result in enumerate(results) if result is None]
+    pending_titles = [titles[n] for n in pending]
+    
+    tfidf = TfidfTitleScorer(index) if scorer == "tfidf" else None
+    reading_index = None
+    if readings is not None:
+        reading_index = ReadingIndex([s.get("title") or "" for s in index.scenarios], readings)
+    if assignment == "optimal":
+        # 一対一割り当てでは、エイリアスで確定した DBシナリオは他に割り当てない
+        fuzzy = _optimal_matches(pending_titles, index, threshold, workers, tfidf, reading_index,
+                                 frozenset(alias_positions))
+    else:
+        fuzzy = _best_matches(pending_titles, index, threshold, workers, cache, tfidf, reading_index)
+    for n, result in zip(pending, fuzzy):
+        results[n] = result
+    if readings is not None:
+        readings.save()
+    
+    for cat_scenario, cat_title, (best_match, score) in zip(catalog_scenarios, titles, results):
         if best_match:
             matched.append({
                 "catalog_title": cat_title,
@@ -253,35 +1344,222 @@ def map_scenarios(catalog_scenarios, db_scenarios, threshold=0.5):
     return matched, unmatched_catalog, unmatched_db
 
 
+def load_db_snapshot(mapping_path="docs/data/scenario-mapping-masters.json"):
+    """前回取得したDBシナリオ一覧（ステージングDB、無ければ前回のマッピング結果から復元。オフライン用）"""
+    if StagingStore.exists():
+        with StagingStore() as store:
+            scenarios = store.db_snapshot("scenario_masters")
+        if scenarios:
+            return scenarios
+    
+    with open(mapping_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    scenarios = {}
+    for m in data.get("matched", []):
+        scenarios.setdefault(m["db_id"], {
+            "id": m["db_id"], "title": m["db_title"], "author": m.get("db_author")
+        })
+    for s in data.get("unmatched_db", []):
+        scenarios.setdefault(s["id"], s)
+    return list(scenarios.values())
+
+
+def make_scaled_catalog(catalog_scenarios, scale, seed=0):
+    """ベンチマーク用に表記ゆれを加えてカタログを scale 倍に水増し"""
+    rng = random.Random(seed)
+    decorations = ["【新作】", "（再演）", "～完全版～", " 2nd", "・改", "【オンライン】"]
+    scaled = list(catalog_scenarios)
+    
+    for n in range(1, scale):
+        for s in catalog_scenarios:
+            title = s.get("title", "")
+            variant = rng.randrange(4)
+            if variant == 0:
+                title = title + rng.choice(decorations)
+            elif variant == 1 and len(title) > 4:
+                cut = rng.randrange(1, len(title) - 1)
+                title = title[:cut] + title[cut + 1:]
+            elif variant == 2:
+                title = rng.choice(decorations) + title
+            else:
+                title = f"{title}{n}"
+            scaled.append({**s, "title": title})
+    
+    return scaled
+
+
+def run_benchmark(scale=10, mapping_path="docs/data/scenario-mapping-masters.json", workers=1):
+    """線形走査とインデックス版の速度・結果一致を比較"""
+    db_scenarios = load_db_snapshot(mapping_path)
+    catalog = make_scaled_catalog(load_catalog_data(), scale)
+    titles = [s.get("title", "") for s in catalog]
+    
+    print(f"カタログ: {len(titles)} 件（{scale}倍） / DB: {len(db_scenarios)} 件\n")
+    
+    start = time.perf_counter()
+    linear = [find_best_match_linear(t, db_scenarios, 0.5) for t in titles]
+    linear_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    index = ScenarioTitleIndex(db_scenarios)
+    indexed = [find_best_match(t, index, 0.5) for t in titles]
+    indexed_time = time.perf_counter() - start
+    
+    mismatches = [
+        (t, a, b) for t, a, b in zip(titles, linear, indexed)
+        if (a[0] and a[0].get("id"), a[1]) != (b[0] and b[0].get("id"), b[1])
+    ]
+    
+    print(f"線形走査:     {linear_time:8.2f} 秒")
+    print(f"インデックス: {indexed_time:8.2f} 秒（{linear_time / max(indexed_time, 1e-9):.1f}倍）")
+    
+    if workers > 1:
+        start = time.perf_counter()
+        parallel = [
+            _apply_match_threshold(normalize_title(t), index.scenarios[p] if p is not None else None, sc, 0.5)
+            for t, (p, sc) in zip(titles, match_titles(titles, index, workers))
+        ]
+        parallel_time = time.perf_counter() - start
+        print(f"並列（{workers}プロセス）: {parallel_time:8.2f} 秒")
+        mismatches += [
+            (t, a, b) for t, a, b in zip(titles, indexed, parallel)
+            if (a[0] and a[0].get("id"), a[1]) != (b[0] and b[0].get("id"), b[1])
+        ]
+    try:
+        start = time.perf_counter()
+        tfidf = TfidfTitleScorer(index)
+        tfidf_top = tfidf.top_k(titles, 1)
+        tfidf_time = time.perf_counter() - start
+        agree = sum(
+            1 for (match, _), top in zip(indexed, tfidf_top)
+            if match is not None and top and index.scenarios[top[0][0]] is match
+        )
+        matched_count = sum(1 for match, _ in indexed if match is not None)
+        print(f"TF-IDF:       {tfidf_time:8.2f} 秒"
+              f"（最良候補の一致 {agree}/{matched_count} 件、参考値）")
+    except ImportError:
+        pass
+    
+    if mismatches:
+        print(f"\n❌ 結果の不一致: {len(mismatches)} 件")
+        for t, a, b in mismatches[:10]:
+            print(f"  {t}: {a[0] and a[0].get('title')} ({a[1]}) ≠ {b[0] and b[0].get('title')} ({b[1]})")
+    else:
+        print("\n✅ 全件で結果が一致")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="カタログ ↔ DB シナリオマッピング")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="前回のマッピング結果を使ってオフラインでベンチマーク")
+    parser.add_argument("--scale", type=int, default=10, help="ベンチマーク時のカタログ倍率")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="照合に使うプロセス数（0 でCPUコア数）")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="照合キャッシュを使わずに全件を再計算")
+    parser.add_argument("--assignment", choices=["greedy", "optimal"], default="greedy",
+                        help="optimal: DBシナリオを一対一で割り当て（類似度の合計を最大化）")
+    parser.add_argument("--scorer", choices=["sequence", "tfidf"], default="sequence",
+                        help="tfidf: 文字 n-gram TF-IDF のコサイン類似度（NumPy）で照合")
+    parser.add_argument("--readings", action="store_true",
+                        help="表記で一致しないタイトルを読み（カタカナ・ローマ字）で照合")
+    parser.add_argument("--no-aliases", action="store_true",
+                        help="scenario_import_aliases を照合に使わない")
+    parser.add_argument("--learn-aliases", action="store_true",
+                        help=f"手動確認済みの対応（{ALIAS_CONFIRMED_PATH}）を scenario_import_aliases に書き込む（SUPABASE_SERVICE_ROLE_KEY が必要）")
+    parser.add_argument("--alias-threshold", type=float, default=ALIAS_CANDIDATE_THRESHOLD,
+                        help=f"エイリアス候補（{ALIAS_CANDIDATES_PATH}）に載せる類似度の下限（既定 {ALIAS_CANDIDATE_THRESHOLD}）")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    # 一対一割り当ては候補グラフ全体が必要なため最良候補キャッシュは使わない
+    use_cache = not args.no_cache and args.assignment == "greedy" and args.scorer == "sequence"
+    
+    if args.benchmark:
+        print("=== マッチング ベンチマーク ===\n")
+        run_benchmark(args.scale, workers=workers)
+        return
+    
     print("=== カタログ ↔ DB シナリオマッピング ===\n")
     
+    if args.learn_aliases and not os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
+        print("❌ --learn-aliases には SUPABASE_SERVICE_ROLE_KEY が必要です（anon では scenario_import_aliases に書き込めません）")
+        return
+    
     # Supabase接続
     supabase = get_supabase_client()
     if not supabase:
         return
     
-    # DBからシナリオ取得
-    master_scenarios, legacy_scenarios, org_scenarios = fetch_scenarios_from_db(supabase)
+    # DBからシナリオ取得（届いたページから照合インデックスに投入）
+    indexes = {
+        "scenario_masters": ScenarioTitleIndex([]),
+        "scenarios": ScenarioTitleIndex([]),
+    }
+    
+    def on_page(source, rows):
+        index = indexes.get(source)
+        if index is not None:
+            for row in rows:
+                index.add(row)
+    
+    master_scenarios, legacy_scenarios, org_scenarios = fetch_scenarios_from_db(supabase, on_page)
+    
+    # エイリアス（canonical_name は scenario_masters のタイトル）
+    alias_rows = [] if args.no_aliases else fetch_aliases(supabase)
+    if alias_rows is None:
+        # 空のエイリアスで照合を続けると結果が黙って変わるので止める
+        print("❌ エイリアスを読み込めませんでした。SUPABASE_SERVICE_ROLE_KEY を設定するか --no-aliases を付けてください")
+        return
+    
+    # 取得結果をステージングDBに保存（取得に失敗したソースは前回のまま）
+    store = StagingStore()
+    for (name, _, _, key), rows in zip(DB_SOURCES, (master_scenarios, legacy_scenarios, org_scenarios)):
+        if rows:
+            store.replace_db_snapshot(name, rows, key_field=key)
+    if alias_rows:
+        store.replace_aliases(alias_rows)
+    aliases = AliasIndex(alias_rows, indexes["scenario_masters"]) if alias_rows else None
     
     # カタログデータ読み込み
     catalog_scenarios = load_catalog_data()
     print(f"\nカタログシナリオ数: {len(catalog_scenarios)}")
     
+    readings = ReadingStore() if args.readings else None
+    
     # マッピング実行（緩い閾値 0.5）
     print("\n=== マッピング実行（閾値: 0.5）===\n")
     
     # マスタシナリオとマッピング
     if master_scenarios:
         print("【scenario_masters との マッピング】")
+        cache = None if not use_cache else MatchCache(MATCH_CACHE_PATH.format(name="masters"))
         matched, unmatched_cat, unmatched_db = map_scenarios(
-            catalog_scenarios, master_scenarios, threshold=0.5
+            catalog_scenarios, master_scenarios, threshold=0.5, workers=workers, cache=cache,
+            assignment=args.assignment, scorer=args.scorer, readings=readings,
+            index=indexes["scenario_masters"], aliases=aliases
         )
+        if cache:
+            print(f"  {cache.summary()}")
         
         print(f"\n✅ マッチした: {len(matched)} 件")
         print(f"❌ カタログのみ: {len(unmatched_cat)} 件")
         print(f"❓ DBのみ: {len(unmatched_db)} 件")
         
+        # エイリアス学習
+        existing = {row["alias"]: row["canonical_name"] for row in alias_rows}
+        confirmed = load_confirmed_aliases()
+        candidates = alias_candidates(matched, existing, confirmed, args.alias_threshold)
+        write_alias_candidates(candidates)
+        print(f"📝 エイリアス候補: {len(candidates)} 件 → {ALIAS_CANDIDATES_PATH}"
+              f"（確認して {ALIAS_CONFIRMED_PATH} に移したものだけを登録）")
+        new_aliases = learn_aliases(existing, confirmed)
+        if args.learn_aliases:
+            written = write_aliases(supabase, new_aliases)
+            print(f"📝 エイリアス登録: {written}/{len(new_aliases)} 件")
+        elif new_aliases:
+            print(f"📝 確認済みで未登録のエイリアス: {len(new_aliases)} 件（--learn-aliases で登録）")
+        
         # 結果を保存
         result = {
             "matched": matched,
@@ -299,7 +1577,10 @@ def main():
         output_path = "docs/data/scenario-mapping-masters.json"
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
-        print(f"\n保存: {output_path}")
+        written, removed = store.replace_mapping(
+            "masters", matched, unmatched_cat, result["stats"], json_path=output_path
+        )
+        print(f"\n保存: {output_path}（ステージングDB: 更新 {written} 行 / 削除 {removed} 行）")
         
         # マッチ詳細を表示
         print("\n--- マッチ詳細（上位20件）---")
@@ -310,9 +1591,14 @@ def main():
     # レガシーシナリオとマッピング
     if legacy_scenarios:
         print("\n\n【scenarios（レガシー）との マッピング】")
+        cache = None if not use_cache else MatchCache(MATCH_CACHE_PATH.format(name="legacy"))
         matched_legacy, unmatched_cat_legacy, unmatched_db_legacy = map_scenarios(
-            catalog_scenarios, legacy_scenarios, threshold=0.5
+            catalog_scenarios, legacy_scenarios, threshold=0.5, workers=workers, cache=cache,
+            assignment=args.assignment, scorer=args.scorer, readings=readings,
+            index=indexes["scenarios"]
         )
+        if cache:
+            print(f"  {cache.summary()}")
         
         print(f"\n✅ マッチした: {len(matched_legacy)} 件")
         print(f"❌ カタログのみ: {len(unmatched_cat_legacy)} 件")
@@ -334,7 +1620,10 @@ def main():
         output_path_legacy = "docs/data/scenario-mapping-legacy.json"
         with open(output_path_legacy, 'w', encoding='utf-8') as f:
             json.dump(result_legacy, f, ensure_ascii=False, indent=2)
-        print(f"\n保存: {output_path_legacy}")
+        written, removed = store.replace_mapping(
+            "legacy", matched_legacy, unmatched_cat_legacy, result_legacy["stats"], json_path=output_path_legacy
+        )
+        print(f"\n保存: {output_path_legacy}（ステージングDB: 更新 {written} 行 / 削除 {removed} 行）")
         
         # マッチ詳細を表示
         print("\n--- マッチ詳細（上位20件）---")
@@ -348,6 +1637,8 @@ def main():
             for s in unmatched_cat_legacy[:20]:
                 print(f"  - {s['title']}")
     
+    store.close()
+    print(f"\nステージングDB: {store.path}")
     print("\n=== 完了 ===")
 
 
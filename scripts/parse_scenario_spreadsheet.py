@@ -6,6 +6,8 @@
 import json
 import re
 
+from staging_store import StagingStore
+
 # スプレッドシートデータ（タブ区切り）
 raw_data = """	グロリアメモリーズ	10	4~4.5	4500→5,000	あり/オープンの場合なし(※貸切は有のみ）	1	きゅう、れみあ
 	マーダー・オブ・パイレーツ	10	4	準備中	なし	1	えなみ
@@ -299,6 +301,9 @@ print(f"\n合計: {len(unique)} シナリオ")
 with open('docs/data/queens-waltz-scenarios-internal.json', 'w', encoding='utf-8') as f:
     json.dump(unique, f, ensure_ascii=False, indent=2)
 
+with StagingStore() as store:
+    store.replace_internal(unique, json_path='docs/data/queens-waltz-scenarios-internal.json')
+
 # Markdownで保存
 with open('docs/data/queens-waltz-scenarios.md', 'w', encoding='utf-8') as f:
     f.write("# クインズワルツ シナリオリスト\n\n")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+シナリオタイトルの読み（カタカナ・ローマ字）を使った表記ゆれ照合
+
+読みは generate_all_scenario_readings.py が生成したもの
+（database/import_all_scenario_readings.sql）を優先して使い、
+足りないタイトルだけ同じ generate_readings（pykakasi）で1回変換して
+キャッシュに保存する。照合はタイトルごとに事前計算した読みキーの
+ハッシュ引きと、読みキーの文字バイグラム転置インデックスで行うため、
+ペアごとに pykakasi を呼ぶことはない。
+
+例: 'Lost Remembrance' と 'ロスト／リメンブランス' は
+    どちらも音の骨格 'rstrmbrns' になる。
+"""
+
+import json
+import os
+import re
+import sys
+from difflib import SequenceMatcher
+
+READINGS_SQL_PATH = "database/import_all_scenario_readings.sql"
+READINGS_CACHE_PATH = "docs/data/scenario-readings-cache.json"
+
+# 読みの完全一致をどの程度の類似度とみなすか（含有マッチ 0.9 より下）
+READING_EXACT_SCORE = 0.85
+
+# 読みキーのバイグラム候補のうち本計算する件数
+READING_TOP_K = 5
+
+# 音の骨格が完全一致しないときに読みで一致とみなす条件
+# （母音を落とした骨格は短く、ゆるい類似度では別作品同士が一致してしまう）
+READING_FUZZY_MIN_RATIO = 0.9
+READING_FUZZY_MIN_KEY = 8
+
+_READING_UPDATE_RE = re.compile(
+    r"reading_katakana\s*=\s*'((?:[^']|'')*)',\s*"
+    r"reading_alphabet\s*=\s*'((?:[^']|'')*)'\s*"
+    r"WHERE\s+title\s*=\s*'((?:[^']|'')*)'",
+    re.IGNORECASE
+)
+
+_KANA_KEY_RE = re.compile(r'[^0-9a-zA-Zァ-ヴー]')
+
+# 英語の綴りとヘボン式ローマ字の差を吸収する置換（順序に意味がある）
+_PHONETIC_RULES = [
+    (re.compile(r'[^a-z0-9]'), ''),
+    (re.compile(r'tch|ch|ts'), 't'),
+    (re.compile(r'sh|th'), 's'),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ck|qu|q'), 'k'),
+    (re.compile(r'c(?=[eiy])'), 's'),
+    (re.compile(r'c'), 'k'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'l'), 'r'),
+    (re.compile(r'v'), 'b'),
+    (re.compile(r'[zj]'), 's'),
+    (re.compile(r'n(?=[bpm])'), 'm'),
+    (re.compile(r'[aeiouy]'), ''),
+    (re.compile(r'([a-z])\1+'), r'\1'),
+]
+
+
+def phonetic_key(alphabet):
+    """ローマ字読みから母音を落とした音の骨格を作る"""
+    key = (alphabet or "").lower()
+    for pattern, repl in _PHONETIC_RULES:
+        key = pattern.sub(repl, key)
+    return key
+
+
+def kana_key(katakana):
+    """カタカナ読みから記号・空白を除いたキー"""
+    return _KANA_KEY_RE.sub('', katakana or "").lower()
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class ReadingStore:
+    """
+    タイトル → (カタカナ, ローマ字) の読み
+
+    事前生成済みのSQLとキャッシュJSONから読み込み、無いものだけ
+    pykakasi で変換する。変換結果は save() でキャッシュに書き出す。
+    """
+
+    def __init__(self, sql_path=READINGS_SQL_PATH, cache_path=READINGS_CACHE_PATH):
+        self.cache_path = cache_path
+        self.readings = {}
+        self._dirty = False
+        self._kks = None
+        self._warned = False
+
+        try:
+            with open(sql_path, 'r', encoding='utf-8') as f:
+                for katakana, alphabet, title in _READING_UPDATE_RE.findall(f.read()):
+                    self.readings[title.replace("''", "'")] = (
+                        katakana.replace("''", "'"), alphabet.replace("''", "'")
+                    )
+        except FileNotFoundError:
+            pass
+
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                for title, reading in json.load(f).items():
+                    self.readings.setdefault(title, tuple(reading))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def _convert(self, title):
+        if self._kks is None:
+            try:
+                # リポジトリ直下の generate_all_scenario_readings を使う
+                root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                if root not in sys.path:
+                    sys.path.append(root)
+                from generate_all_scenario_readings import generate_readings
+                from pykakasi import kakasi
+            except ImportError:
+                if not self._warned:
+                    print("  ⚠ pykakasi が無いため、事前生成済みの読みだけを使います")
+                    self._warned = True
+                return "", ""
+            self._kks = (kakasi(), generate_readings)
+
+        kks, generate_readings = self._kks
+        return generate_readings(title, kks)
+
+    def get(self, title):
+        """タイトルの (カタカナ, ローマ字) 読み"""
+        title = title or ""
+        reading = self.readings.get(title)
+        if reading is None:
+            reading = self._convert(title)
+            if reading != ("", ""):
+                self.readings[title] = reading
+                self._dirty = True
+        return reading
+
+    def save(self):
+        if not self._dirty:
+            return
+        with open(self.cache_path, 'w', encoding='utf-8') as f:
+            json.dump({t: list(r) for t, r in sorted(self.readings.items())},
+                      f, ensure_ascii=False, indent=2)
+        self._dirty = False
+
+
+class ReadingIndex:
+    """
+    DBシナリオの読みキーのインデックス
+
+    - カタカナキー・音の骨格キーの完全一致ハッシュ（先頭出現位置）
+    - 音の骨格キーの文字バイグラム転置インデックス
+    """
+
+    def __init__(self, titles, store):
+        self.store = store
+        self.kana_first = {}
+        self.phonetic_first = {}
+        self.phonetic_keys = []
+        self.bigrams = {}
+
+        for i, title in enumerate(titles):
+            katakana, alphabet = store.get(title)
+            kana, phonetic = kana_key(katakana), phonetic_key(alphabet)
+            self.phonetic_keys.append(phonetic)
+            if len(kana) >= 3:
+                self.kana_first.setdefault(kana, i)
+            if len(phonetic) >= 3:
+                self.phonetic_first.setdefault(phonetic, i)
+            for bigram in _bigrams(phonetic):
+                self.bigrams.setdefault(bigram, []).append(i)
+
+    def best(self, title, top_k=READING_TOP_K):
+        """
+        読みが最も近いDBシナリオを (位置, 類似度) で返す
+
+        読みの完全一致は READING_EXACT_SCORE。それ以外は音の骨格が
+        READING_FUZZY_MIN_KEY 文字以上で、骨格同士の類似度が
+        READING_FUZZY_MIN_RATIO 以上のときだけ、その類似度に
+        READING_EXACT_SCORE を掛けた値。候補が無ければ (None, 0)。
+        """
+        katakana, alphabet = self.store.get(title)
+        kana, phonetic = kana_key(katakana), phonetic_key(alphabet)
+
+        hits = []
+        if len(kana) >= 3 and kana in self.kana_first:
+            hits.append(self.kana_first[kana])
+        if len(phonetic) >= 3 and phonetic in self.phonetic_first:
+            hits.append(self.phonetic_first[phonetic])
+        if hits:
+            return min(hits), READING_EXACT_SCORE
+
+        if len(phonetic) < READING_FUZZY_MIN_KEY:
+            return None, 0
+
+        shared = {}
+        for bigram in _bigrams(phonetic):
+            for i in self.bigrams.get(bigram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        candidates = sorted(shared, key=lambda i: (-shared[i], i))[:top_k]
+
+        best_position, best_score = None, 0
+        for i in sorted(candidates):
+            if len(self.phonetic_keys[i]) < READING_FUZZY_MIN_KEY:
+                continue
+            score = SequenceMatcher(None, phonetic, self.phonetic_keys[i]).ratio()
+            if score > best_score:
+                best_position, best_score = i, score
+        if best_score < READING_FUZZY_MIN_RATIO:
+            return None, 0
+        return best_position, best_score * READING_EXACT_SCORE
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+クインズワルツのカタログ取得パイプライン（1回の実行・1つのブラウザで完結）
+
+これまでは scrape_queens_waltz_catalog.py / scrape_queens_waltz_with_categories.py /
+scrape_queens_waltz_details.py がそれぞれブラウザを起動して同じページを取り直し、
+別々のJSONを cleanup_catalog_data.py で突き合わせていた。ここでは
+
+  一覧（カタログページ ＋ Coubic の一覧ページ）
+    → カテゴリー（カタログのカードを1回だけ取り出し、両スクレイパーの形式に変換して統合）
+    → クリーンアップ（無効なタイトル・重複を除去）
+    → 詳細（カタログにある作品の Coubic 詳細ページだけ取得）
+
+を順に流し、各ページは1回だけ取得する。カタログページの読み込みと
+Coubic 一覧の巡回は同じブラウザで並行に行う。
+
+出力は cleanup_catalog_data.py と同じ形式の docs/data/queens-waltz-catalog.json / .md。
+Coubic の詳細が取れた作品には "details"（url・公演金額・人数・時間・作者）が付く。
+前回の実行との差分は catalog_changes.py の変更フィードに書き出す。
+"""
+
+import argparse
+import asyncio
+import re
+import time
+import unicodedata
+
+from catalog_changes import update_change_feed
+from cleanup_catalog_data import is_valid_scenario_title, save_to_json, save_to_markdown, save_to_staging
+from scrape_common import FETCH_MODES, PAGE_CACHE_DIR, PageCache, PageFetcher, new_page
+from scrape_queens_waltz_catalog import (
+    CATALOG_IDLE_WINDOW, CATALOG_URL, load_full_catalog, parse_catalog_cards, parse_catalog_text,
+    read_catalog_page
+)
+from scrape_queens_waltz_details import (
+    DETAIL_CONCURRENCY, DETAIL_FIELDS, HOST_MIN_INTERVAL, is_rental_or_other, scrape_all_links,
+    scrape_details
+)
+from scrape_queens_waltz_with_categories import parse_category_cards, parse_category_text
+
+CATALOG_JSON_PATH = "docs/data/queens-waltz-catalog.json"
+CATALOG_MD_PATH = "docs/data/queens-waltz-catalog.md"
+
+_TITLE_KEY_RE = re.compile(r'[\s・:：!！?？「」『』]')
+
+
+def title_key(title):
+    """カタログと Coubic のタイトルを突き合わせるためのキー（全角半角・空白・記号の差を無視）"""
+    return _TITLE_KEY_RE.sub('', unicodedata.normalize('NFKC', title or '')).lower()
+
+
+async def load_catalog(fetcher, idle_window=CATALOG_IDLE_WINDOW):
+    """共有ブラウザでカタログページを開いて全件を読み込み、(cards, body_text) を返す（read_catalog_page）"""
+    browser = await fetcher.get_browser()
+    page = await new_page(browser)
+    try:
+        print(f"アクセス中: {CATALOG_URL}")
+        await load_full_catalog(page, idle_window)
+        return await read_catalog_page(page)
+    finally:
+        await page.context.close()
+
+
+def merge_categories(catalog_scenarios, category_scenarios):
+    """
+    カタログ形式のシナリオに、カテゴリーパーサーの結果を "categories" として付ける
+
+    カタログパーサーは作者名の行もタイトルとして拾うことがあるので、カテゴリーパーサーが
+    作者として読んだ名前は除く。カテゴリーパーサーにしか無い作品はカタログ形式に直して後ろに流す。
+    """
+    by_title = {s['title']: s for s in category_scenarios}
+    authors = {s['author'] for s in category_scenarios if s.get('author')}
+    for s in catalog_scenarios:
+        found = by_title.pop(s['title'], None)
+        if found is None and s['title'] in authors:
+            continue
+        yield {**s, "categories": found['categories'] if found else []}
+
+    for s in by_title.values():
+        yield {
+            "title": s['title'],
+            "author": s.get('author') or "",
+            "player_count": f"{s['players']}人" if s.get('players') else "",
+            "duration": f"{s['duration']}時間" if s.get('duration') else "",
+            "price": f"{s['price']}円" if s.get('price') else "",
+            "tags": [],
+            "categories": s['categories'],
+        }
+
+
+def clean_records(records):
+    """無効なタイトル（作者名・料金・タグなど）と重複を除く（cleanup_catalog_data と同じ判定）"""
+    seen_titles = set()
+    for s in records:
+        title = s.get("title", "")
+        if not is_valid_scenario_title(title) or title in seen_titles:
+            continue
+        seen_titles.add(title)
+        yield s
+
+
+def match_links(scenarios, links):
+    """カタログの作品に対応する Coubic のリンクを選ぶ（戻り値: カタログ位置 → リンク）"""
+    positions = {}
+    for i, s in enumerate(scenarios):
+        positions.setdefault(title_key(s['title']), i)
+
+    matched = {}
+    for link in links:
+        if is_rental_or_other(link['title']):
+            continue
+        i = positions.get(title_key(link['title']))
+        if i is not None and i not in matched:
+            matched[i] = link
+    return matched
+
+
+def attach_details(scenarios, matched):
+    """取得した詳細を "details" として付ける（取得に失敗した作品には付けない）"""
+    for i, s in enumerate(scenarios):
+        link = matched.get(i)
+        if link and any(link.get(field, "不明") != "不明" for field in DETAIL_FIELDS):
+            s["details"] = {"url": link['url'], **{field: link.get(field, "不明") for field in DETAIL_FIELDS}}
+        yield s
+
+
+async def run_pipeline(fetcher, with_details=True, concurrency=DETAIL_CONCURRENCY, interval=HOST_MIN_INTERVAL,
+                       idle_window=CATALOG_IDLE_WINDOW):
+    started = time.perf_counter()
+
+    # ステージ1: 一覧（カタログページと Coubic 一覧を並行に）
+    print("【ステージ1】カタログページと Coubic 一覧を取得中...\n")
+    if with_details:
+        (cards, body_text), links = await asyncio.gather(
+            load_catalog(fetcher, idle_window), scrape_all_links(fetcher)
+        )
+    else:
+        (cards, body_text), links = await load_catalog(fetcher, idle_window), []
+    print(f"\nCoubic リンク: {len(links)} 件\n")
+
+    # ステージ2: カテゴリー統合 → クリーンアップ（同じカードを両方の形式に変換）
+    print("【ステージ2】シナリオ・カテゴリーを抽出中...\n")
+    if cards:
+        catalog_scenarios, _ = parse_catalog_cards(cards)
+        category_scenarios = parse_category_cards(cards)
+    else:
+        catalog_scenarios, _ = parse_catalog_text(body_text)
+        category_scenarios = parse_category_text(body_text)
+    scenarios = list(clean_records(merge_categories(catalog_scenarios, category_scenarios)))
+    print(f"\n抽出: カタログ {len(catalog_scenarios)} 件 / カテゴリー {len(category_scenarios)} 件"
+          f" → クリーンアップ後 {len(scenarios)} 件\n")
+
+    # ステージ3: 詳細（カタログにある作品の詳細ページだけ）
+    matched = {}
+    if with_details and scenarios:
+        matched = match_links(scenarios, links)
+        print(f"【ステージ3】詳細ページを取得中...（対応 {len(matched)} 件 / 対応なし {len(scenarios) - len(matched)} 件）\n")
+        await scrape_details(list(matched.values()), fetcher, concurrency, interval)
+
+    scenarios = list(attach_details(scenarios, matched))
+    all_tags = set()
+    for s in scenarios:
+        all_tags.update(s.get("tags", []))
+
+    elapsed = time.perf_counter() - started
+    print(f"\nパイプライン完了: {len(scenarios)} シナリオ / {elapsed:.1f} 秒")
+    print(fetcher.summary())
+    return scenarios, all_tags
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="クインズワルツ カタログ取得パイプライン")
+    parser.add_argument("--no-details", action="store_true",
+                        help="Coubic の一覧・詳細ページを取得しない（カタログページだけ）")
+    parser.add_argument("--concurrency", type=int, default=DETAIL_CONCURRENCY,
+                        help=f"詳細ページを並行して開くページ数（既定 {DETAIL_CONCURRENCY}）")
+    parser.add_argument("--interval", type=float, default=HOST_MIN_INTERVAL,
+                        help=f"同一ホストへのリクエスト間隔（秒、既定 {HOST_MIN_INTERVAL}）")
+    parser.add_argument("--idle-window", type=int, default=CATALOG_IDLE_WINDOW,
+                        help=f"カタログページの読み込みが止まったとみなすまでの時間（ミリ秒、既定 {CATALOG_IDLE_WINDOW}）")
+    parser.add_argument("--mode", choices=FETCH_MODES, default="auto",
+                        help="Coubic ページの取得方法 auto: HTTP で取得し内容が無ければブラウザ / http / browser")
+    parser.add_argument("--fixtures", metavar="DIR",
+                        help="Coubic ページを保存済みHTMLから取得（カタログページは常にブラウザで開く）")
+    parser.add_argument("--record", metavar="DIR",
+                        help="取得した Coubic ページのHTMLをフィクスチャとして保存")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help=f"ページキャッシュ（{PAGE_CACHE_DIR}）を使わない")
+    args = parser.parse_args()
+
+    print("=== クインズワルツ カタログ取得パイプライン ===\n")
+
+    cache = None if args.no_page_cache else PageCache()
+    async with PageFetcher(args.mode, args.fixtures, args.record, cache=cache) as fetcher:
+        scenarios, all_tags = await run_pipeline(
+            fetcher, not args.no_details, args.concurrency, args.interval, args.idle_window
+        )
+
+    if scenarios:
+        save_to_markdown(scenarios, all_tags, CATALOG_MD_PATH)
+        save_to_json(scenarios, all_tags, CATALOG_JSON_PATH)
+        save_to_staging(scenarios, CATALOG_JSON_PATH)
+        update_change_feed(scenarios)
+    else:
+        print("シナリオが見つかりませんでした")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""
+スクレイパー共通のページ取得
+
+- 画像・フォント・メディアと解析系ホストへのリクエストを遮断
+- networkidle ＋固定待ちではなく、本文のセレクタが現れた時点で読み込み完了とみなす
+- サーバーレンダリングのページはまず HTTP GET で取得し、
+  期待する内容が無いときだけ Playwright で開く（PageFetcher）
+- 保存済みHTML（フィクスチャ）からの取得でネットワーク無しに再現・計測できる
+- 取得したページを条件付きリクエスト用のキャッシュに残し、変化の無いページは取り直さない
+- カタログのシナリオカードは本文テキストの行解析ではなく、DOM から1回の評価で取り出す
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from bs4.element import PreformattedString
+from playwright.async_api import async_playwright
+from requests.adapters import HTTPAdapter
+
+# 遮断するリソース種別（本文のテキスト抽出に不要なもの）
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+# 遮断する解析・広告系のホスト（サブドメインを含む）
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "facebook.com",
+    "clarity.ms",
+    "hotjar.com",
+    "twitter.com",
+)
+
+# サイトごとの「本文が描画された」ことを示すセレクタ
+COUBIC_LISTING_SELECTOR = 'a[href*="/queens-waltz/"]'
+COUBIC_DETAIL_SELECTOR = "text=/円/"
+CATALOG_SELECTOR = "text=参加人数"
+MDMS_SELECTOR = 'a[href*="/works/"]'
+
+# セレクタを待つ時間（ミリ秒）。現れなくてもエラーにはせず、その時点の内容で続行する
+CONTENT_TIMEOUT = 10000
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
+# HTTP の接続プールの大きさ
+HTTP_POOL_SIZE = 8
+
+# html_to_text で前後に改行を入れるブロック要素
+BLOCK_TAGS = [
+    "address", "article", "aside", "blockquote", "dd", "details", "div", "dl", "dt", "figcaption",
+    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main",
+    "nav", "ol", "p", "pre", "section", "summary", "table", "tr", "td", "th", "ul",
+]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# ページキャッシュの保存先
+PAGE_CACHE_DIR = "docs/data/page-cache"
+
+# 取得モード: auto = HTTP → 内容が無ければブラウザ / http = HTTP のみ / browser = ブラウザのみ
+FETCH_MODES = ("auto", "http", "browser")
+
+
+def is_blocked(resource_type, url):
+    """遮断対象のリクエストかどうか"""
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(url).netloc
+    return any(host == h or host.endswith("." + h) for h in BLOCKED_HOSTS)
+
+
+async def _route_handler(route):
+    request = route.request
+    if is_blocked(request.resource_type, request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def setup_context(context):
+    """コンテキストの全ページに遮断ルールを設定"""
+    await context.route("**/*", _route_handler)
+    return context
+
+
+async def new_page(browser, **context_options):
+    """遮断ルール付きのコンテキストを作り、そのページを返す（閉じるときは page.context.close()）"""
+    context = await browser.new_context(**context_options)
+    await setup_context(context)
+    return await context.new_page()
+
+
+async def goto(page, url, selector, timeout=30000, content_timeout=CONTENT_TIMEOUT):
+    """
+    DOM構築まで待って遷移し、selector が現れるまで待つ
+
+    Returns:
+        selector が時間内に現れたかどうか
+    """
+    await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+    try:
+        await page.wait_for_selector(selector, state="attached", timeout=content_timeout)
+        return True
+    except Exception:
+        return False
+
+
+# カタログのシナリオカードを1回の評価でまとめて取り出すスクリプト
+# 「参加人数」ラベルを1つだけ含む最大の祖先要素を1枚のカードとみなし、
+# カード内のテキストを順に並べて「料金」「参加人数」「所用」の直後の値を拾う。
+# タイトル・作者は最初のラベルの2つ前・1つ前（行単位の解析と同じ位置関係）。
+# 人数が数字でないもの（絞り込みメニューの「参加人数」→「5人以下」など）はカードとみなさない。
+CATALOG_CARDS_JS = """() => {
+    const PLAYERS_RE = /^\\d+(?:\\s*[~〜-]\\s*\\d+)?\\s*人?$/;
+    const labels = [...document.querySelectorAll('body *')].filter(
+        el => el.childElementCount === 0 && el.textContent.trim() === '参加人数');
+    const counts = new Map();
+    for (const label of labels) {
+        for (let el = label.parentElement; el && el !== document.body; el = el.parentElement) {
+            counts.set(el, (counts.get(el) || 0) + 1);
+        }
+    }
+    const textsOf = root => {
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        const texts = [];
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            const text = node.textContent.trim();
+            if (text) texts.push(text);
+        }
+        return texts;
+    };
+    const cards = labels.map(label => {
+        let card = label;
+        while (card.parentElement && card.parentElement !== document.body
+               && counts.get(card.parentElement) === 1) {
+            card = card.parentElement;
+        }
+        const texts = textsOf(card);
+        const after = name => {
+            const k = texts.indexOf(name);
+            return k >= 0 && k + 1 < texts.length ? texts[k + 1] : null;
+        };
+        const price = texts.indexOf('料金');
+        const first = price >= 0 ? price : texts.indexOf('参加人数');
+        return {
+            title: first >= 2 ? texts[first - 2] : (texts[0] || null),
+            author: first >= 2 ? texts[first - 1] : null,
+            price: after('料金'),
+            players: after('参加人数'),
+            duration: after('所用'),
+            texts: texts.slice(first + 1),
+        };
+    });
+    return cards.filter(card => card.players !== null && PLAYERS_RE.test(card.players));
+}"""
+
+
+async def extract_catalog_cards(page):
+    """
+    カタログページのシナリオカードを構造化して取り出す（page.evaluate 1回）
+
+    Returns:
+        [{title, author, price, players, duration, texts}]（値は表示どおりの文字列、
+        texts は最初のラベル以降のカード内テキスト）。カードが見つからなければ空リスト
+    """
+    try:
+        return await page.evaluate(CATALOG_CARDS_JS) or []
+    except Exception as e:
+        print(f"  ⚠ カードの構造化抽出に失敗: {e}")
+        return []
+
+
+def html_to_text(html):
+    """
+    HTMLから本文テキストを取り出す（<body> の innerText 相当。<head>・script/style は除く）
+
+    ブラウザの innerText に合わせ、改行はブロック要素と <br> の境目にだけ入れる。
+    インライン要素（<span> など）は前後の文字とつながったまま
+    （"料金 <span>3,000</span>円" → "料金 3,000円"）。
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["head", "script", "style", "noscript", "template"]):
+        tag.decompose()
+    # DOCTYPE・コメント・処理命令などは本文ではない
+    for text in soup.find_all(string=lambda s: isinstance(s, PreformattedString)):
+        text.extract()
+    root = soup.body or soup
+
+    # ソースの改行・インデントは空白1つとして扱う（<pre> の中はそのまま）
+    for text in root.find_all(string=True):
+        if text.find_parent("pre") is None:
+            text.replace_with(_WHITESPACE_RE.sub(" ", text))
+    for br in root.find_all("br"):
+        br.replace_with("\n")
+    for tag in root.find_all(BLOCK_TAGS):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+
+    lines = (line.strip() for line in root.get_text().split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def fixture_path(fixtures_dir, url):
+    """URLに対応するフィクスチャ（保存済みHTML）のパス"""
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(fixtures_dir, f"{name}.html")
+
+
+def body_hash(html):
+    return hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """
+    URLごとの取得結果のキャッシュ
+
+    index.json に URL → ETag / Last-Modified / 本文ハッシュ を持ち、
+    本文は bodies/<sha1>.html に保存する（同じ本文は1ファイルを共有）。
+    http_sha1 は HTTP 応答そのもののハッシュで、ブラウザで描画し直した本文を
+    保存している場合でも、元の応答が変わっていなければ再描画を省ける。
+    """
+
+    def __init__(self, directory=PAGE_CACHE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.bodies_dir = os.path.join(directory, "bodies")
+        self.entries = {}
+        self._dirty = False
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            print(f"  ⚠ ページキャッシュの索引を読み込めないため作り直します: {self.index_path}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def body(self, url):
+        """キャッシュ済みの本文（無ければ None）"""
+        entry = self.entries.get(url)
+        if not entry:
+            return None
+        try:
+            with open(os.path.join(self.bodies_dir, f"{entry['sha1']}.html"), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since ヘッダー（本文が残っている場合のみ）"""
+        entry = self.entries.get(url)
+        if not entry or self.body(url) is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, html, source, etag=None, last_modified=None, http_sha1=None):
+        """本文を保存し、前回から変わったかどうかを返す"""
+        sha1 = body_hash(html)
+        path = os.path.join(self.bodies_dir, f"{sha1}.html")
+        if not os.path.exists(path):
+            os.makedirs(self.bodies_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html)
+
+        previous = self.entries.get(url)
+        self.entries[url] = {
+            "sha1": sha1,
+            "http_sha1": http_sha1,
+            "etag": etag,
+            "last_modified": last_modified,
+            "source": source,
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._dirty = True
+        return not previous or previous.get("sha1") != sha1
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        self._dirty = False
+
+
+class PageFetcher:
+    """
+    HTTP 優先・ブラウザ代替のページ取得
+
+    fetch() は HTML を返す。auto モードでは HTTP GET の結果を expect(テキスト) で確かめ、
+    期待する内容が無いときだけ Playwright で開き直す（ブラウザは必要になるまで起動しない）。
+
+    fixtures_dir を指定するとネットワークに出ず、保存済みHTMLを HTTP の応答として使う
+    （ブラウザ経路では同じHTMLを page.set_content で描画する）。
+    record_dir を指定すると取得したHTMLをフィクスチャとして保存する。
+
+    cache（PageCache）を指定すると条件付きリクエストを送り、304 や応答本文が
+    前回と同じ場合は保存済みの本文を返す（ブラウザでの再描画も行わない）。
+    cache_only では一切取得せずキャッシュの本文だけを返す（抽出処理のやり直し用）。
+
+    fetch() に limiter（wait(url) を持つもの）を渡すと、実際にホストへリクエストを
+    送る直前（条件付きリクエスト・ブラウザでの取得）にだけ待つ。キャッシュのみ・
+    フィクスチャからの取得では待たない。
+
+    get_browser() で同じブラウザを取り出せるので、fetch() で取れないページ
+    （クリック操作が必要なものなど）も同じセッションで開ける。
+
+    ブラウザ経路のページ（コンテキスト）は使い終わっても閉じずに取っておき、次の
+    fetch() で使い回す。並行する fetch() の数（ワーカー数）だけページが作られる。
+    """
+
+    def __init__(self, mode="auto", fixtures_dir=None, record_dir=None, pool_size=HTTP_POOL_SIZE,
+                 cache=None, cache_only=False):
+        if mode not in FETCH_MODES:
+            raise ValueError(f"mode は {FETCH_MODES} のいずれか: {mode}")
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.record_dir = record_dir
+        self.cache = cache
+        self.cache_only = cache_only
+        if cache_only and cache is None:
+            raise ValueError("cache_only には cache が必要です")
+        self.stats = {"http": 0, "browser": 0, "unchanged": 0, "cache": 0}
+
+        self.session = requests.Session()
+        self.session.headers.update(HTTP_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = asyncio.Lock()
+        self._idle_pages = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.cache is not None:
+            self.cache.save()
+        while self._idle_pages:
+            await self._idle_pages.pop().context.close()
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        self.session.close()
+
+    def _read_fixture(self, url):
+        with open(fixture_path(self.fixtures_dir, url), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _http_get(self, url):
+        """
+        HTTP で取得
+
+        Returns:
+            (本文, 変化が無い場合の保存済み本文, キャッシュ用の検証子)
+        """
+        if self.fixtures_dir:
+            html = self._read_fixture(url)
+            validators = {"http_sha1": body_hash(html)}
+        else:
+            headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+            response = self.session.get(url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                return None, self.cache.body(url), None
+            response.raise_for_status()
+            response.encoding = response.apparent_encoding or response.encoding
+            html = response.text
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "http_sha1": body_hash(html),
+            }
+
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry and entry.get("http_sha1") == validators["http_sha1"]:
+            cached = self.cache.body(url)
+            if cached is not None:
+                return None, cached, validators
+        return html, None, validators
+
+    async def get_browser(self):
+        """共有のブラウザ（初回呼び出し時に起動し、close() で閉じる）"""
+        async with self._browser_lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+        return self._browser
+
+    async def _browser_get(self, url, selector, limiter=None):
+        """空いているページを使い回して開く（失敗したページは閉じて捨てる）"""
+        if self._idle_pages:
+            page = self._idle_pages.pop()
+        else:
+            page = await new_page(await self.get_browser())
+        try:
+            if self.fixtures_dir:
+                await page.set_content(self._read_fixture(url), wait_until="domcontentloaded")
+            else:
+                if limiter:
+                    await limiter.wait(url)
+                await goto(page, url, selector)
+            html = await page.content()
+        except Exception:
+            await page.context.close()
+            raise
+        self._idle_pages.append(page)
+        return html
+
+    def _record(self, url, html):
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            with open(fixture_path(self.record_dir, url), "w", encoding="utf-8") as f:
+                f.write(html)
+
+    async def fetch(self, url, selector, expect=None, limiter=None):
+        """
+        URL の HTML を取得
+
+        Args:
+            selector: ブラウザ経路で本文の描画完了を待つセレクタ
+            expect: 本文テキストを受け取り、期待する内容があれば True を返す関数
+            limiter: ホストへのリクエスト間隔を制御するもの（ネットワークに出るときだけ待つ）
+        """
+        if self.cache_only:
+            html = self.cache.body(url)
+            if html is None:
+                raise KeyError(f"キャッシュに無いページ: {url}")
+            self.stats["cache"] += 1
+            return html
+
+        html = None
+        validators = {}
+        if self.mode != "browser":
+            try:
+                if limiter and not self.fixtures_dir:
+                    await limiter.wait(url)
+                html, cached, validators = await asyncio.to_thread(self._http_get, url)
+            except Exception:
+                if self.mode == "http":
+                    raise
+            else:
+                if cached is not None:
+                    self.stats["unchanged"] += 1
+                    return cached
+            if html is not None and (
+                self.mode == "http" or expect is None or expect(html_to_text(html))
+            ):
+                self.stats["http"] += 1
+                self._store(url, html, "http", validators)
+                return html
+
+        html = await self._browser_get(url, selector, limiter)
+        self.stats["browser"] += 1
+        # 元の HTTP 応答の検証子を残し、次回は応答が同じなら再描画しない
+        self._store(url, html, "browser", validators or {})
+        return html
+
+    def _store(self, url, html, source, validators):
+        self._record(url, html)
+        if self.cache is not None:
+            self.cache.put(url, html, source, **validators)
+
+    def summary(self):
+        summary = f"取得経路: HTTP {self.stats['http']} 件 / ブラウザ {self.stats['browser']} 件"
+        if self.cache is not None:
+            summary += f" / 変化なし {self.stats['unchanged']} 件 / キャッシュ {self.stats['cache']} 件"
+        return summary
+
+
+class JsonlCheckpoint:
+    """
+    1件ごとに結果を追記する JSONL のチェックポイント
+
+    key_field の値で結果を識別する。同じキーが複数行あれば最後の行が有効で、
+    "error" を持つ行は未完了扱い（再開時にやり直す）。
+    出力は records() でファイルを読みながら1件ずつ取り出す。
+    """
+
+    def __init__(self, path, key_field):
+        self.path = path
+        self.key_field = key_field
+
+    def reset(self):
+        """空のチェックポイントから始める"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        open(self.path, "w", encoding="utf-8").close()
+
+    def _lines(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で止まった最終行
+                        continue
+        except FileNotFoundError:
+            return
+
+    def _last_lines(self):
+        last = {}
+        for n, record in enumerate(self._lines()):
+            last[record.get(self.key_field)] = (n, "error" not in record)
+        return last
+
+    def completed(self):
+        """完了済み（エラーでない）キーの集合"""
+        return {key for key, (_, ok) in self._last_lines().items() if ok}
+
+    def append(self, record):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+
+    def records(self):
+        """キーごとの最新の結果を書き込み順に返す（メモリに持つのはキーと行番号だけ）"""
+        keep = {n for n, _ in self._last_lines().values()}
+        for n, record in enumerate(self._lines()):
+            if n in keep:
+                yield record
+
+
+def write_json_array(f, records, indent=2, level=0):
+    """json.dump(list, indent=indent) と同じ形式で、records を1件ずつ書き出す。件数を返す"""
+    pad = " " * (indent * (level + 1))
+    count = 0
+    for record in records:
+        f.write("[\n" if count == 0 else ",\n")
+        body = json.dumps(record, ensure_ascii=False, indent=indent)
+        f.write("\n".join(pad + line for line in body.split("\n")))
+        count += 1
+    f.write("\n" + " " * (indent * level) + "]" if count else "[]")
+    return count
+
+
+class AdaptiveRateLimiter:
+    """
+    応答に合わせて速度を変えるトークンバケット
+
+    rate 件/秒でトークンを補充し（最大 burst 個）、acquire() はトークンが取れるまで待つ。
+    record() で結果を伝えると、速い成功が続けば rate を step ずつ上げ、
+    エラーや slow 秒以上かかった応答では rate を半分に下げる（AIMD）。
+    """
+
+    def __init__(self, rate=1.0, min_rate=0.2, max_rate=4.0, burst=2, slow=5.0, step=0.1):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.slow = slow
+        self.step = step
+        self.tokens = 1.0
+        self.updated = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._refill(loop.time())
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill(loop.time())
+            self.tokens -= 1
+
+    def record(self, ok, latency=0.0):
+        if ok and latency < self.slow:
+            self.rate = min(self.max_rate, self.rate + self.step)
+        else:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+async def run_page_pool(browser, items, handle, on_done, workers=3, limiter=None):
+    """
+    items をページごとのワーカーで並行に処理する
+
+    各ワーカーは遮断ルール付きのページを1つ持ち、handle(page, item) を呼ぶ。
+    limiter（AdaptiveRateLimiter）を指定すると呼ぶ前にトークンを取り、
+    所要時間と例外の有無を伝える。on_done(i, item, 結果, 例外) は
+    items の順に呼ばれる（先に終わったものは前の要素が終わるまで待たせる）。
+    """
+    queue = asyncio.Queue()
+    for i, item in enumerate(items):
+        queue.put_nowait((i, item))
+
+    finished = {}
+    next_done = 0
+
+    def complete(i, item, result, error):
+        nonlocal next_done
+        finished[i] = (item, result, error)
+        while next_done in finished:
+            on_done(next_done, *finished.pop(next_done))
+            next_done += 1
+
+    async def worker():
+        page = await new_page(browser)
+        try:
+            while True:
+                try:
+                    i, item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                if limiter:
+                    await limiter.acquire()
+                loop = asyncio.get_running_loop()
+                started = loop.time()
+                try:
+                    result = await handle(page, item)
+                except Exception as e:
+                    if limiter:
+                        limiter.record(False)
+                    complete(i, item, None, e)
+                else:
+                    if limiter:
+                        limiter.record(True, loop.time() - started)
+                    complete(i, item, result, None)
+        finally:
+            await page.context.close()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(items))))))
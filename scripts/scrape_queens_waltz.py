@@ -8,6 +8,8 @@ import re
 import json
 from playwright.async_api import async_playwright
 
+from scrape_common import COUBIC_LISTING_SELECTOR, goto, new_page
+
 
 def clean_title(title):
     """タイトルから【】を除去してシナリオ名を抽出"""
@@ -29,7 +31,7 @@ async def scrape_scenarios():
     
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+        page = await new_page(browser)
         
         base_url = "https://coubic.com/queens-waltz/booking_pages"
         
@@ -41,8 +43,7 @@ async def scrape_scenarios():
             print(f"ページ {page_num}: {url}")
             
             try:
-                await page.goto(url, wait_until="networkidle", timeout=30000)
-                await page.wait_for_timeout(1500)
+                await goto(page, url, COUBIC_LISTING_SELECTOR)
                 
                 body_text = await page.inner_text('body')
                 lines = body_text.split('\n')
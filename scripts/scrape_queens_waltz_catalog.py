@@ -4,170 +4,300 @@
 URL: https://queenswaltz.jp/catalog
 """
 
+import argparse
 import asyncio
 import json
 import re
 from datetime import datetime
 from playwright.async_api import async_playwright
 
+from catalog_changes import update_change_feed
+from cleanup_catalog_data import save_to_staging
+from scrape_common import CATALOG_SELECTOR, extract_catalog_cards, goto, new_page
 
-async def scrape_catalog():
+
+CATALOG_URL = "https://queenswaltz.jp/catalog"
+
+
+# 「もっと見る」・スクロールのあと、読み込み状況を確かめる間隔（ミリ秒）
+CATALOG_POLL_INTERVAL = 250
+
+# シナリオ数・ページの高さがこの時間（ミリ秒）増えなければ全件読み込んだとみなす
+CATALOG_IDLE_WINDOW = 1500
+
+# スクロールの上限回数（読み込みが止まらない場合の保険）
+CATALOG_MAX_ROUNDS = 100
+
+# 読み込み済みのシナリオ数（カードごとに1つある「参加人数」の数）とページの高さ
+_CATALOG_PROGRESS_JS = """() => [
+    (document.body.innerText.match(/参加人数/g) || []).length,
+    document.body.scrollHeight
+]"""
+
+
+# タグ（絵文字付きの表示 → タグ名）
+TAG_PATTERNS = [
+    ('✨ 新作', '新作'),
+    ('🎭 RP重視', 'RP重視'),
+    ('🔍 ミステリー', 'ミステリー重視'),
+    ('📕 ストーリー', 'ストーリー重視'),
+    ('🔰 初心者', '初心者向け'),
+    ('💀デスゲーム', 'デスゲーム'),
+    ('🌀情報量多め', '情報量多め'),
+    ('🎩 経験者限定', '経験者向け'),
+    ('📅 ロングセラー', 'ロングセラー'),
+    ('オススメ', 'オススメ'),
+]
+
+
+# タイトルとみなさない行（メニュー・フッター・ラベルなど）に含まれる語
+SKIP_KEYWORDS = [
+    '読み込み', 'location', 'access', 'アクセス', '営業時間', '予約する',
+    'local_florist', 'マダミスとは', '公演カタログ', '制作', '問い合わせ',
+    'Q&A', 'TITLES', '検索する', '初心者におすすめ', '✨ 新作', '📕', '🔍',
+    '5人以下', '6人用', '7人用', '8人用', '9人以上', 'もっと見る',
+    'keyboard_arrow', 'home', 'クインズワルツ', '東京都', '株式会社',
+    'お問い合せ', '会社概要', 'プライバシー', 'FAQ', 'email', '@queens',
+    '©', 'Queen', 'edit', 'done', 'search', 'マーダーミステリー専門店',
+    '円', '人', '時間', '料金', '参加人数', '所用'
+]
+
+# カードの人数の値（"7" "6~8" "7人" など）
+PLAYERS_VALUE_RE = re.compile(r'\d+(?:\s*[~〜-]\s*\d+)?\s*人?')
+
+
+def is_title_candidate(line):
+    """シナリオタイトルの候補か（2-60文字、数字のみでない、メニュー項目でない）"""
+    return (
+        2 <= len(line) <= 60
+        and not any(kw in line for kw in SKIP_KEYWORDS)
+        and not re.match(r'^[\d,.\s]+$', line)
+    )
+
+
+async def load_full_catalog(page, idle_window=CATALOG_IDLE_WINDOW, max_rounds=CATALOG_MAX_ROUNDS,
+                            poll_interval=CATALOG_POLL_INTERVAL):
+    """
+    カタログページを開き、「もっと見る」で全シナリオを読み込む
+    
+    スクロールと「もっと見る」のクリックを繰り返し、シナリオ数もページの高さも
+    idle_window ミリ秒のあいだ増えなくなった時点で止める。
+    """
+    await goto(page, CATALOG_URL, CATALOG_SELECTOR, timeout=60000)
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    count, height = await page.evaluate(_CATALOG_PROGRESS_JS)
+    last_growth = loop.time()
+    rounds = 0
+    
+    while rounds < max_rounds:
+        rounds += 1
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        
+        # 「もっと見る」ボタンをクリック
+        try:
+            more_button = await page.query_selector("text=もっと見る")
+            if more_button:
+                await more_button.click()
+        except:
+            pass
+        
+        await page.wait_for_timeout(poll_interval)
+        new_count, new_height = await page.evaluate(_CATALOG_PROGRESS_JS)
+        if new_count > count or new_height > height:
+            count, height = max(count, new_count), max(height, new_height)
+            last_growth = loop.time()
+        elif (loop.time() - last_growth) * 1000 >= idle_window:
+            break
+    
+    print(f"スクロール {rounds} 回で読み込み完了（シナリオ {count} 件 / {loop.time() - started:.1f} 秒）")
+    if rounds >= max_rounds:
+        print(f"  ⚠ 上限 {max_rounds} 回に達しました（まだ読み込み途中の可能性があります）")
+    return rounds
+
+
+async def read_catalog_page(page):
+    """
+    読み込み済みのカタログページからシナリオカードを取り出す
+    
+    Returns:
+        (cards, body_text)。DOM からカードを取り出せたときは cards（extract_catalog_cards）、
+        取り出せなかったときは行単位の解析用に本文テキストを返す（もう一方は None）
+    """
+    cards = await extract_catalog_cards(page)
+    if cards:
+        print(f"カード {len(cards)} 件を構造化抽出しました")
+        return cards, None
+    
+    print("⚠ カードを構造化抽出できなかったため、本文テキストを行単位で解析します")
+    body_text = await page.inner_text("body")
+    
+    # デバッグ用に保存
+    with open("catalog_debug.txt", "w", encoding="utf-8") as f:
+        f.write(body_text)
+    print("テキストを catalog_debug.txt に保存しました")
+    return None, body_text
+
+
+def _print_scenario(scenario):
+    print(f"✓ {scenario['title']} | {scenario['author']} | {scenario['player_count']} | {scenario['duration']} | {scenario['price']}")
+    if scenario['tags']:
+        print(f"  タグ: {', '.join(scenario['tags'])}")
+
+
+def parse_catalog_cards(cards):
+    """
+    構造化抽出したカードからシナリオ情報を作る（parse_catalog_text と同じ形式）
+    
+    Returns:
+        (scenarios, all_tags)
+    """
+    scenarios = []
+    all_tags = set()
+    seen_titles = set()
+    
+    for card in cards:
+        title = (card.get('title') or '').strip()
+        players = (card.get('players') or '').strip()
+        # 人数が数字で、タイトルが本文テキストの解析と同じ条件を満たす場合だけシナリオとして追加
+        if not PLAYERS_VALUE_RE.fullmatch(players) or not is_title_candidate(title) or title in seen_titles:
+            continue
+        count_match = re.search(r'(\d+)', players)
+        seen_titles.add(title)
+        
+        price_match = re.search(r'([\d,]+)', card.get('price') or '')
+        time_match = re.search(r'([\d.~]+)', card.get('duration') or '')
+        tags = []
+        for text in card.get('texts', []):
+            for pattern, tag in TAG_PATTERNS:
+                if pattern in text and tag not in tags:
+                    tags.append(tag)
+                    all_tags.add(tag)
+        
+        scenario = {
+            "title": title,
+            "author": card.get('author') or "",
+            "player_count": count_match.group(1) + "人",
+            "duration": time_match.group(1) + "時間" if time_match else "",
+            "price": price_match.group(1) + "円" if price_match else "",
+            "tags": tags
+        }
+        scenarios.append(scenario)
+        _print_scenario(scenario)
+    
+    return scenarios, all_tags
+
+
+def parse_catalog_text(body_text):
+    """
+    カタログページの本文テキストからシナリオ情報を取り出す
+    
+    Returns:
+        (scenarios, all_tags)
+    """
+    scenarios = []
+    all_tags = set()
+    lines = [l.strip() for l in body_text.split('\n') if l.strip()]
+    
+    # シナリオ情報をパース
+    i = 0
+    seen_titles = set()
+
+    while i < len(lines):
+        line = lines[i]
+
+        # シナリオタイトルの候補を検出
+        if is_title_candidate(line):
+            # これがシナリオタイトルの可能性がある
+            potential_title = line
+
+            # 次の行が作者名かどうか確認
+            author = ""
+            price = ""
+            player_count = ""
+            duration = ""
+            tags = []
+
+            # 次の10行を解析
+            for j in range(i+1, min(i+20, len(lines))):
+                next_line = lines[j].strip()
+
+                # 料金
+                if next_line == "料金" and j+1 < len(lines):
+                    # 次の行に金額がある
+                    price_line = lines[j+1].strip()
+                    price_match = re.search(r'([\d,]+)', price_line)
+                    if price_match:
+                        price = price_match.group(1) + "円"
+
+                # 参加人数
+                if next_line == "参加人数" and j+1 < len(lines):
+                    count_line = lines[j+1].strip()
+                    count_match = re.search(r'(\d+)', count_line)
+                    if count_match:
+                        player_count = count_match.group(1) + "人"
+
+                # 所用時間
+                if next_line == "所用" and j+1 < len(lines):
+                    time_line = lines[j+1].strip()
+                    time_match = re.search(r'([\d.~]+)', time_line)
+                    if time_match:
+                        duration = time_match.group(1) + "時間"
+
+                # タグ（絵文字付きのもの）
+                for pattern, tag in TAG_PATTERNS:
+                    if pattern in next_line and tag not in tags:
+                        tags.append(tag)
+                        all_tags.add(tag)
+
+                # 作者名（タイトルの直後の行で、料金などでない場合）
+                if j == i+1 and not any(kw in next_line for kw in ['料金', '参加人数', '所用', '円', '人', '時間', '✨', '🎭', '🔍', '📕', '💀', '🌀', '🎩', '📅', '🔰']):
+                    if len(next_line) < 30 and not re.match(r'^[\d,.\s]+$', next_line):
+                        author = next_line
+
+                # 次のシナリオタイトルが見つかったら終了
+                if j > i + 5:
+                    if is_title_candidate(next_line) and player_count:
+                        break
+
+            # 人数情報がある場合、シナリオとして追加
+            if player_count and potential_title not in seen_titles:
+                seen_titles.add(potential_title)
+                scenario = {
+                    "title": potential_title,
+                    "author": author,
+                    "player_count": player_count,
+                    "duration": duration,
+                    "price": price,
+                    "tags": tags
+                }
+                scenarios.append(scenario)
+                _print_scenario(scenario)
+
+        i += 1
+    
+    return scenarios, all_tags
+
+
+async def scrape_catalog(idle_window=CATALOG_IDLE_WINDOW, max_rounds=CATALOG_MAX_ROUNDS):
     """カタログページからシナリオ情報を取得"""
     scenarios = []
     all_tags = set()
     
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+        page = await new_page(browser)
         
-        url = "https://queenswaltz.jp/catalog"
-        print(f"アクセス中: {url}")
+        print(f"アクセス中: {CATALOG_URL}")
         
         try:
-            await page.goto(url, wait_until="networkidle", timeout=60000)
-            await page.wait_for_timeout(5000)
-            
-            # ページ全体をスクロールして「もっと見る」をクリック
-            for _ in range(20):
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(500)
-                
-                # 「もっと見る」ボタンをクリック
-                try:
-                    more_button = await page.query_selector("text=もっと見る")
-                    if more_button:
-                        await more_button.click()
-                        await page.wait_for_timeout(1000)
-                except:
-                    pass
-            
-            await page.evaluate("window.scrollTo(0, 0)")
-            await page.wait_for_timeout(1000)
-            
-            # ページのテキストを取得
-            body_text = await page.inner_text("body")
-            
-            # デバッグ用に保存
-            with open("catalog_debug.txt", "w", encoding="utf-8") as f:
-                f.write(body_text)
-            print("テキストを catalog_debug.txt に保存しました")
-            
-            lines = [l.strip() for l in body_text.split('\n') if l.strip()]
-            
-            # シナリオ情報をパース
-            i = 0
-            seen_titles = set()
-            
-            while i < len(lines):
-                line = lines[i]
-                
-                # シナリオタイトルの候補を検出
-                # 条件: 2-60文字、数字のみでない、メニュー項目でない
-                skip_keywords = [
-                    '読み込み', 'location', 'access', 'アクセス', '営業時間', '予約する',
-                    'local_florist', 'マダミスとは', '公演カタログ', '制作', '問い合わせ',
-                    'Q&A', 'TITLES', '検索する', '初心者におすすめ', '✨ 新作', '📕', '🔍',
-                    '5人以下', '6人用', '7人用', '8人用', '9人以上', 'もっと見る',
-                    'keyboard_arrow', 'home', 'クインズワルツ', '東京都', '株式会社',
-                    'お問い合せ', '会社概要', 'プライバシー', 'FAQ', 'email', '@queens',
-                    '©', 'Queen', 'edit', 'done', 'search', 'マーダーミステリー専門店',
-                    '円', '人', '時間', '料金', '参加人数', '所用'
-                ]
-                
-                is_menu_item = any(kw in line for kw in skip_keywords)
-                is_too_short = len(line) < 2
-                is_too_long = len(line) > 60
-                is_number_only = re.match(r'^[\d,.\s]+$', line)
-                
-                if not is_menu_item and not is_too_short and not is_too_long and not is_number_only:
-                    # これがシナリオタイトルの可能性がある
-                    potential_title = line
-                    
-                    # 次の行が作者名かどうか確認
-                    author = ""
-                    price = ""
-                    player_count = ""
-                    duration = ""
-                    tags = []
-                    
-                    # 次の10行を解析
-                    for j in range(i+1, min(i+20, len(lines))):
-                        next_line = lines[j].strip()
-                        
-                        # 料金
-                        if next_line == "料金" and j+1 < len(lines):
-                            # 次の行に金額がある
-                            price_line = lines[j+1].strip()
-                            price_match = re.search(r'([\d,]+)', price_line)
-                            if price_match:
-                                price = price_match.group(1) + "円"
-                        
-                        # 参加人数
-                        if next_line == "参加人数" and j+1 < len(lines):
-                            count_line = lines[j+1].strip()
-                            count_match = re.search(r'(\d+)', count_line)
-                            if count_match:
-                                player_count = count_match.group(1) + "人"
-                        
-                        # 所用時間
-                        if next_line == "所用" and j+1 < len(lines):
-                            time_line = lines[j+1].strip()
-                            time_match = re.search(r'([\d.~]+)', time_line)
-                            if time_match:
-                                duration = time_match.group(1) + "時間"
-                        
-                        # タグ（絵文字付きのもの）
-                        tag_patterns = [
-                            ('✨ 新作', '新作'),
-                            ('🎭 RP重視', 'RP重視'),
-                            ('🔍 ミステリー', 'ミステリー重視'),
-                            ('📕 ストーリー', 'ストーリー重視'),
-                            ('🔰 初心者', '初心者向け'),
-                            ('💀デスゲーム', 'デスゲーム'),
-                            ('🌀情報量多め', '情報量多め'),
-                            ('🎩 経験者限定', '経験者向け'),
-                            ('📅 ロングセラー', 'ロングセラー'),
-                            ('オススメ', 'オススメ'),
-                        ]
-                        
-                        for pattern, tag in tag_patterns:
-                            if pattern in next_line and tag not in tags:
-                                tags.append(tag)
-                                all_tags.add(tag)
-                        
-                        # 作者名（タイトルの直後の行で、料金などでない場合）
-                        if j == i+1 and not any(kw in next_line for kw in ['料金', '参加人数', '所用', '円', '人', '時間', '✨', '🎭', '🔍', '📕', '💀', '🌀', '🎩', '📅', '🔰']):
-                            if len(next_line) < 30 and not re.match(r'^[\d,.\s]+$', next_line):
-                                author = next_line
-                        
-                        # 次のシナリオタイトルが見つかったら終了
-                        if j > i + 5:
-                            is_next_scenario = (
-                                len(next_line) >= 2 and 
-                                len(next_line) <= 60 and
-                                not any(kw in next_line for kw in skip_keywords) and
-                                not re.match(r'^[\d,.\s]+$', next_line)
-                            )
-                            if is_next_scenario and player_count:
-                                break
-                    
-                    # 人数情報がある場合、シナリオとして追加
-                    if player_count and potential_title not in seen_titles:
-                        seen_titles.add(potential_title)
-                        scenario = {
-                            "title": potential_title,
-                            "author": author,
-                            "player_count": player_count,
-                            "duration": duration,
-                            "price": price,
-                            "tags": tags
-                        }
-                        scenarios.append(scenario)
-                        print(f"✓ {potential_title} | {author} | {player_count} | {duration} | {price}")
-                        if tags:
-                            print(f"  タグ: {', '.join(tags)}")
-                
-                i += 1
+            await load_full_catalog(page, idle_window, max_rounds)
+            cards, body_text = await read_catalog_page(page)
+            if cards:
+                scenarios, all_tags = parse_catalog_cards(cards)
+            else:
+                scenarios, all_tags = parse_catalog_text(body_text)
             
             await browser.close()
             
@@ -226,9 +356,16 @@ def save_to_json(scenarios, all_tags, filepath):
 
 
 async def main():
+    parser = argparse.ArgumentParser(description="クインズワルツ カタログ スクレイピング")
+    parser.add_argument("--idle-window", type=int, default=CATALOG_IDLE_WINDOW,
+                        help=f"シナリオ数・ページの高さが増えなくなってから止めるまでの時間（ミリ秒、既定 {CATALOG_IDLE_WINDOW}）")
+    parser.add_argument("--max-rounds", type=int, default=CATALOG_MAX_ROUNDS,
+                        help=f"スクロールの上限回数（既定 {CATALOG_MAX_ROUNDS}）")
+    args = parser.parse_args()
+    
     print("=== クインズワルツ カタログ スクレイピング ===\n")
     
-    scenarios, all_tags = await scrape_catalog()
+    scenarios, all_tags = await scrape_catalog(args.idle_window, args.max_rounds)
     
     print(f"\n=============================")
     print(f"取得したシナリオ数: {len(scenarios)}")
@@ -238,6 +375,8 @@ async def main():
     if scenarios:
         save_to_markdown(scenarios, all_tags, "docs/data/queens-waltz-catalog.md")
         save_to_json(scenarios, all_tags, "docs/data/queens-waltz-catalog.json")
+        save_to_staging(scenarios)
+        update_change_feed(scenarios)
     else:
         print("シナリオが取得できませんでした")
 
@@ -3,10 +3,18 @@
 クインズワルツのCoubic予約ページからシナリオ詳細情報をスクレイピング
 """
 
+import argparse
 import asyncio
 import re
 import json
-from playwright.async_api import async_playwright
+import time
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup
+
+from scrape_common import (
+    COUBIC_DETAIL_SELECTOR, COUBIC_LISTING_SELECTOR, FETCH_MODES, PAGE_CACHE_DIR,
+    JsonlCheckpoint, PageCache, PageFetcher, html_to_text, write_json_array
+)
 
 
 def clean_title(title):
@@ -21,179 +29,287 @@ def is_rental_or_other(title):
     return any(kw in title for kw in skip_keywords)
 
 
-async def scrape_all_links():
-    """全シナリオのリンクを取得"""
-    scenario_links = []
-    seen_titles = set()
+def _is_last_page(text):
+    return '【' not in text
+
+
+def extract_links(html):
+    """一覧ページのHTMLから (href, リンクテキスト) を取り出す"""
+    soup = BeautifulSoup(html, 'html.parser')
+    return [
+        (a.get('href'), a.get_text(strip=True))
+        for a in soup.select('a[href*="/queens-waltz/"]')
+    ]
+
+
+# 最終出力のJSON
+SCENARIOS_JSON_PATH = "docs/data/queens-waltz-scenarios.json"
+
+# 詳細取得のチェックポイント（1行1シナリオ、URLで識別）
+CHECKPOINT_PATH = "docs/data/queens-waltz-scenarios.checkpoint.jsonl"
+
+# 詳細ページを並行して開くページ数
+DETAIL_CONCURRENCY = 4
+
+# 同一ホストへのリクエスト開始間隔（秒）
+HOST_MIN_INTERVAL = 0.5
+
+# 一覧ページを並行して取得する枚数とリクエスト間隔（秒）
+LISTING_CONCURRENCY = 8
+LISTING_MIN_INTERVAL = 0.1
+
+
+class HostRateLimiter:
+    """ホストごとにリクエスト開始の間隔を min_interval 秒以上空ける"""
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+    def __init__(self, min_interval=HOST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self.locks = {}
+        self.next_at = {}
+    
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            delay = self.next_at.get(host, 0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_at[host] = loop.time() + self.min_interval
+
+
+def parse_listing(html):
+    """一覧ページ1枚分のシナリオリンク（ページ内の出現順、重複除去前）"""
+    candidates = []
+    for href, text in extract_links(html):
+        if not href or "booking_pages" in href or "legal" in href or "services" in href:
+            continue
         
-        base_url = "https://coubic.com/queens-waltz/booking_pages"
-        page_num = 1
-        max_pages = 70
+        if not text.startswith('【'):
+            continue
+            
+        if is_rental_or_other(text):
+            continue
         
-        while page_num <= max_pages:
+        clean = clean_title(text)
+        if clean and len(clean) > 1:
+            if href.startswith("/"):
+                href = f"https://coubic.com{href}"
+            candidates.append({
+                "title": clean,
+                "raw_title": text,
+                "url": href
+            })
+    return candidates
+
+
+async def scrape_all_links(fetcher, concurrency=LISTING_CONCURRENCY, min_interval=LISTING_MIN_INTERVAL,
+                           max_pages=70):
+    """
+    全シナリオのリンクを取得
+    
+    一覧ページを concurrency 枚ずつ並行に取得する。'【' の無いページ（最終ページの次）を
+    見つけたら、それより後のページは新たに取得しない。結果はページ順に並べ、
+    タイトルの集合で重複を除く。
+    """
+    base_url = "https://coubic.com/queens-waltz/booking_pages"
+    limiter = HostRateLimiter(min_interval)
+    pages = {}
+    next_page = 1
+    end_page = max_pages + 1
+    started = time.perf_counter()
+    
+    async def worker():
+        nonlocal next_page, end_page
+        while next_page < end_page:
+            page_num = next_page
+            next_page += 1
             url = f"{base_url}?page={page_num}"
-            print(f"リンク収集 ページ {page_num}: {url}")
             
             try:
-                await page.goto(url, wait_until="networkidle", timeout=30000)
-                await page.wait_for_timeout(1500)
-                
-                # リンクを取得
-                links = await page.query_selector_all('a[href*="/queens-waltz/"]')
-                found = 0
-                
-                for link in links:
-                    try:
-                        href = await link.get_attribute("href")
-                        text = await link.inner_text()
-                        
-                        if not href or "booking_pages" in href or "legal" in href or "services" in href:
-                            continue
-                        
-                        if not text.startswith('【'):
-                            continue
-                            
-                        if is_rental_or_other(text):
-                            continue
-                        
-                        clean = clean_title(text)
-                        if clean and len(clean) > 1 and clean not in seen_titles:
-                            seen_titles.add(clean)
-                            
-                            if href.startswith("/"):
-                                href = f"https://coubic.com{href}"
-                            
-                            scenario_links.append({
-                                "title": clean,
-                                "raw_title": text,
-                                "url": href
-                            })
-                            found += 1
-                    except:
-                        continue
-                
-                print(f"  → {found} 件のリンクを発見")
-                
-                if found == 0:
-                    # ページに新しいシナリオがなければ終了
-                    body_text = await page.inner_text('body')
-                    if '【' not in body_text:
-                        print(f"最終ページ: {page_num}")
-                        break
-                
-                page_num += 1
-                
+                html = await fetcher.fetch(url, COUBIC_LISTING_SELECTOR, lambda text: not _is_last_page(text),
+                                           limiter=limiter)
             except Exception as e:
-                print(f"  ✗ エラー: {e}")
-                break
-        
-        await browser.close()
+                print(f"  ✗ ページ {page_num} エラー: {e}")
+                end_page = min(end_page, page_num)
+                continue
+            
+            pages[page_num] = parse_listing(html)
+            print(f"リンク収集 ページ {page_num}: {len(pages[page_num])} 件")
+            if not pages[page_num] and _is_last_page(html_to_text(html)):
+                # ページにシナリオがなければ、これより後は取得しない
+                end_page = min(end_page, page_num)
+    
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    
+    scenario_links = []
+    seen_titles = set()
+    for page_num in sorted(n for n in pages if n < end_page):
+        for link in pages[page_num]:
+            if link["title"] not in seen_titles:
+                seen_titles.add(link["title"])
+                scenario_links.append(link)
     
+    elapsed = time.perf_counter() - started
+    print(f"最終ページ: {end_page - 1}（{len(pages)} ページ取得 / {elapsed:.1f} 秒）")
     return scenario_links
 
 
-async def scrape_details(scenario_links):
-    """各シナリオの詳細情報を取得"""
+# 価格（税込表記を優先）
+_PRICE_TAX_RE = re.compile(r'([\d,]+)円\s*\(税込\)')
+_PRICE_RE = re.compile(r'([\d,]+)円')
+
+# 人数 "5人" "5〜6人" "5-6人" "5名"（上から順に試す）
+_PLAYERS_RES = [re.compile(p) for p in (
+    r'プレイ人数[：:]\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*[人名]',
+    r'参加人数[：:]\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*[人名]',
+    r'(\d+)\s*[-~〜]\s*(\d+)\s*[人名]',
+    r'(\d+)\s*[人名]用',
+    r'(\d+)\s*[人名]プレイ',
+)]
+
+# 時間（上から順に試す）
+_DURATION_RES = [re.compile(p) for p in (
+    r'プレイ時間[：:]\s*約?\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*時間',
+    r'所要時間[：:]\s*約?\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*時間',
+    r'(\d+)\s*時間\s*半',
+    r'(\d+)\s*[-~〜]\s*(\d+)\s*時間',
+    r'約\s*(\d+)\s*時間',
+    r'(\d+)\s*時間程度',
+    r'(\d+)\s*時間',
+)]
+
+# 作者（上から順に試す）
+_AUTHOR_RES = [re.compile(p) for p in (
+    r'(?:シナリオ)?制作[：:／/]\s*([^\n\r【】（）\(\)]+)',
+    r'作者[：:／/]\s*([^\n\r【】（）\(\)]+)',
+    r'著者[：:／/]\s*([^\n\r【】（）\(\)]+)',
+    r'(?:by|By)[：:\s]+([^\n\r【】（）\(\)]+)',
+)]
+
+DETAIL_FIELDS = ('price', 'players', 'duration', 'author')
+
+
+def _first_match(patterns, text):
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
+
+def extract_price(body_text):
+    match = _PRICE_TAX_RE.search(body_text) or _PRICE_RE.search(body_text)
+    return match.group(0) if match else "不明"
+
+
+def extract_players(body_text):
+    match = _first_match(_PLAYERS_RES, body_text)
+    if not match:
+        return "不明"
+    if len(match.groups()) == 2:
+        return f"{match.group(1)}〜{match.group(2)}人"
+    return f"{match.group(1)}人"
+
+
+def extract_duration(body_text):
+    match = _first_match(_DURATION_RES, body_text)
+    if not match:
+        return "不明"
+    if '半' in body_text[max(0, match.start() - 10):match.end() + 10]:
+        return f"{match.group(1)}時間半"
+    if len(match.groups()) >= 2 and match.group(2):
+        return f"{match.group(1)}〜{match.group(2)}時間"
+    return f"{match.group(1)}時間"
+
+
+def extract_author(body_text):
+    match = _first_match(_AUTHOR_RES, body_text)
+    return match.group(1).strip()[:50] if match else "不明"
+
+
+def extract_details(body_text):
+    """詳細ページの本文から 価格・人数・時間・作者 を抽出"""
+    return {
+        'price': extract_price(body_text),
+        'players': extract_players(body_text),
+        'duration': extract_duration(body_text),
+        'author': extract_author(body_text),
+    }
+
+
+async def scrape_details(scenario_links, fetcher, concurrency=DETAIL_CONCURRENCY, min_interval=HOST_MIN_INTERVAL,
+                         checkpoint=None):
+    """
+    各シナリオの詳細情報を取得
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        
-        total = len(scenario_links)
-        
-        for i, scenario in enumerate(scenario_links):
+    concurrency 個のワーカーが共有キューからURLを取り出して並行に処理する。
+    同一ホストへのアクセスは min_interval 秒間隔に制限し（キャッシュ・フィクスチャからの取得は除く）、
+    結果は scenario_links の各要素に書き込むので元の順序のまま返る。
+    checkpoint（JsonlCheckpoint）を指定すると、結果を元の順序で1件ずつ追記する
+    （エラーになったものは "error" 付きで書き、再開時にやり直す）。
+    """
+    total = len(scenario_links)
+    queue = asyncio.Queue()
+    for i, scenario in enumerate(scenario_links):
+        queue.put_nowait((i, scenario))
+    
+    limiter = HostRateLimiter(min_interval)
+    done = 0
+    started = time.perf_counter()
+    finished = {}
+    next_commit = 0
+    
+    def commit(i, record):
+        # 先行する結果が揃ったところまで順に追記
+        nonlocal next_commit
+        finished[i] = record
+        while next_commit in finished:
+            checkpoint.append(finished.pop(next_commit))
+            next_commit += 1
+    
+    async def worker():
+        nonlocal done
+        while True:
+            try:
+                i, scenario = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            
             try:
-                print(f"[{i+1}/{total}] {scenario['title']}")
-                
-                await page.goto(scenario['url'], wait_until="networkidle", timeout=30000)
-                await page.wait_for_timeout(1000)
-                
-                body_text = await page.inner_text('body')
-                
-                # 価格を抽出
-                price_match = re.search(r'([\d,]+)円\s*\(税込\)', body_text)
-                if not price_match:
-                    price_match = re.search(r'([\d,]+)円', body_text)
-                scenario['price'] = price_match.group(0) if price_match else "不明"
-                
-                # 人数を抽出 - より詳細なパターン
-                players = "不明"
-                # "5人" "5〜6人" "5-6人" "5名"
-                players_patterns = [
-                    r'プレイ人数[：:]\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*[人名]',
-                    r'参加人数[：:]\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*[人名]',
-                    r'(\d+)\s*[-~〜]\s*(\d+)\s*[人名]',
-                    r'(\d+)\s*[人名]用',
-                    r'(\d+)\s*[人名]プレイ',
-                ]
-                for pattern in players_patterns:
-                    match = re.search(pattern, body_text)
-                    if match:
-                        if len(match.groups()) == 2:
-                            players = f"{match.group(1)}〜{match.group(2)}人"
-                        else:
-                            players = f"{match.group(1)}人"
-                        break
-                scenario['players'] = players
-                
-                # 時間を抽出
-                duration = "不明"
-                time_patterns = [
-                    r'プレイ時間[：:]\s*約?\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*時間',
-                    r'所要時間[：:]\s*約?\s*(\d+(?:\s*[-~〜]\s*\d+)?)\s*時間',
-                    r'(\d+)\s*時間\s*半',
-                    r'(\d+)\s*[-~〜]\s*(\d+)\s*時間',
-                    r'約\s*(\d+)\s*時間',
-                    r'(\d+)\s*時間程度',
-                    r'(\d+)\s*時間',
-                ]
-                for pattern in time_patterns:
-                    match = re.search(pattern, body_text)
-                    if match:
-                        if '半' in body_text[max(0,match.start()-10):match.end()+10]:
-                            duration = f"{match.group(1)}時間半"
-                        elif len(match.groups()) >= 2 and match.group(2):
-                            duration = f"{match.group(1)}〜{match.group(2)}時間"
-                        else:
-                            duration = f"{match.group(1)}時間"
-                        break
-                scenario['duration'] = duration
-                
-                # 作者を抽出
-                author = "不明"
-                author_patterns = [
-                    r'(?:シナリオ)?制作[：:／/]\s*([^\n\r【】（）\(\)]+)',
-                    r'作者[：:／/]\s*([^\n\r【】（）\(\)]+)',
-                    r'著者[：:／/]\s*([^\n\r【】（）\(\)]+)',
-                    r'(?:by|By)[：:\s]+([^\n\r【】（）\(\)]+)',
-                ]
-                for pattern in author_patterns:
-                    match = re.search(pattern, body_text)
-                    if match:
-                        author = match.group(1).strip()[:50]
-                        break
-                scenario['author'] = author
-                
-                print(f"  ✓ {scenario['price']} | {scenario['players']} | {scenario['duration']} | {scenario['author']}")
-                
+                html = await fetcher.fetch(scenario['url'], COUBIC_DETAIL_SELECTOR, lambda text: '円' in text,
+                                           limiter=limiter)
+                scenario.update(extract_details(html_to_text(html)))
+                result = f"✓ {scenario['price']} | {scenario['players']} | {scenario['duration']} | {scenario['author']}"
+                record = scenario
             except Exception as e:
                 scenario['price'] = scenario.get('price', '不明')
                 scenario['players'] = '不明'
                 scenario['duration'] = '不明'
                 scenario['author'] = '不明'
-                print(f"  ✗ エラー: {e}")
-        
-        await browser.close()
+                result = f"✗ エラー: {e}"
+                record = {**scenario, "error": str(e)}
+            
+            if checkpoint is not None:
+                commit(i, record)
+            
+            done += 1
+            rate = done / max(time.perf_counter() - started, 1e-9)
+            print(f"[{done}/{total}] ({rate:.1f} 件/秒) {scenario['title']}")
+            print(f"  {result}")
+    
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+    
+    elapsed = time.perf_counter() - started
+    print(f"\n詳細取得: {total} 件 / {elapsed:.1f} 秒（{total / max(elapsed, 1e-9):.2f} 件/秒, 並列 {concurrency}）")
+    print(fetcher.summary())
     
     return scenario_links
 
 
 def save_to_markdown(scenarios, filepath):
-    """Markdownファイルに保存"""
+    """Markdownファイルに保存（scenarios は1件ずつ読み進める）"""
+    count = 0
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write("# クインズワルツ シナリオリスト\n\n")
         f.write("出典: https://coubic.com/queens-waltz/booking_pages\n\n")
@@ -204,45 +320,157 @@ def save_to_markdown(scenarios, filepath):
         for s in scenarios:
             title = s.get('title', '').replace('|', '｜')
             f.write(f"| {title} | {s.get('price', '不明')} | {s.get('players', '不明')} | {s.get('duration', '不明')} | {s.get('author', '不明')} |\n")
+            count += 1
         
-        f.write(f"\n---\n\n*合計: {len(scenarios)}シナリオ*\n")
+        f.write(f"\n---\n\n*合計: {count}シナリオ*\n")
         f.write("*スクレイピング日: 2026-01-08*\n")
     
     print(f"\n保存完了: {filepath}")
 
 
 def save_to_json(scenarios, filepath):
-    """JSONファイルに保存"""
-    # raw_titleを除去
-    clean_scenarios = []
-    for s in scenarios:
-        clean_s = {k: v for k, v in s.items() if k != 'raw_title'}
-        clean_scenarios.append(clean_s)
+    """JSONファイルに保存（scenarios は1件ずつ読み進める）。件数を返す"""
+    # raw_title・チェックポイント用の error を除去
+    clean_scenarios = (
+        {k: v for k, v in s.items() if k not in ('raw_title', 'error')}
+        for s in scenarios
+    )
     
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(clean_scenarios, f, ensure_ascii=False, indent=2)
+        count = write_json_array(f, clean_scenarios)
     print(f"保存完了: {filepath}")
+    return count
+
+
+def load_detail_corpus(cache):
+    """ページキャッシュから詳細ページの (URL, 本文テキスト) を読み込む"""
+    corpus = []
+    for url in sorted(cache.entries):
+        if "coubic.com/queens-waltz/" not in url or "booking_pages" in url:
+            continue
+        html = cache.body(url)
+        if html is not None:
+            corpus.append((url, html_to_text(html)))
+    return corpus
+
+
+def replay_extractors(cache_dir=PAGE_CACHE_DIR, baseline_path=SCENARIOS_JSON_PATH, repeat=3, show=10):
+    """
+    保存済みの詳細ページに抽出処理だけを流し直す（ブラウザ・ネットワーク不要）
+    
+    抽出の速度（ページ/秒）と、基準のJSON（既定は前回の出力）との項目ごとの差分を表示する。
+    基準とは URL で、URL の無い古い出力はタイトルで突き合わせる。
+    """
+    cache = PageCache(cache_dir)
+    started = time.perf_counter()
+    corpus = load_detail_corpus(cache)
+    load_time = time.perf_counter() - started
+    if not corpus:
+        print(f"❌ {cache_dir} に詳細ページがありません（先に通常のスクレイピングを実行してください）")
+        return
+    
+    best = float('inf')
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        extracted = [(url, extract_details(text)) for url, text in corpus]
+        best = min(best, time.perf_counter() - started)
+    
+    print(f"コーパス: {len(corpus)} ページ（HTML→テキスト {load_time:.2f} 秒）")
+    print(f"抽出:     {best:.3f} 秒（{len(corpus) / max(best, 1e-9):,.0f} ページ/秒, {repeat} 回中の最速）")
+    
+    try:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\n基準ファイルが無いため差分は省略: {baseline_path}")
+        return
+    
+    by_url = {s['url']: s for s in baseline if s.get('url')}
+    by_title = {s['title']: s for s in baseline if s.get('title')}
+    
+    # 本文からタイトルは取れないので、タイトルでの突き合わせは前回出力の URL から
+    titles = {r['url']: r.get('title') for r in JsonlCheckpoint(CHECKPOINT_PATH, "url").records()}
+    
+    diffs = {field: [] for field in DETAIL_FIELDS}
+    compared = 0
+    for url, fields in extracted:
+        reference = by_url.get(url) or by_title.get(titles.get(url))
+        if reference is None:
+            continue
+        compared += 1
+        for field in DETAIL_FIELDS:
+            if reference.get(field, '不明') != fields[field]:
+                diffs[field].append((url, reference.get(field, '不明'), fields[field]))
+    
+    print(f"\n基準との比較: {compared} ページ（{baseline_path}）")
+    for field in DETAIL_FIELDS:
+        mark = "✅" if not diffs[field] else "⚠"
+        print(f"  {mark} {field}: 差分 {len(diffs[field])} 件")
+        for url, before, after in diffs[field][:show]:
+            print(f"      {url}")
+            print(f"        {before!r} → {after!r}")
 
 
 async def main():
+    parser = argparse.ArgumentParser(description="クインズワルツ シナリオ詳細スクレイピング")
+    parser.add_argument("--concurrency", type=int, default=DETAIL_CONCURRENCY,
+                        help=f"詳細ページを並行して開くページ数（既定 {DETAIL_CONCURRENCY}）")
+    parser.add_argument("--interval", type=float, default=HOST_MIN_INTERVAL,
+                        help=f"同一ホストへのリクエスト間隔（秒、既定 {HOST_MIN_INTERVAL}）")
+    parser.add_argument("--mode", choices=FETCH_MODES, default="auto",
+                        help="auto: HTTP で取得し内容が無ければブラウザ / http / browser")
+    parser.add_argument("--fixtures", metavar="DIR",
+                        help="ネットワークに出ず、保存済みHTMLから取得（オフライン再現・計測用）")
+    parser.add_argument("--record", metavar="DIR",
+                        help="取得したHTMLをフィクスチャとして保存")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help=f"ページキャッシュ（{PAGE_CACHE_DIR}）を使わない")
+    parser.add_argument("--from-cache", action="store_true",
+                        help="取得せずページキャッシュの本文だけで抽出をやり直す")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"チェックポイント（{CHECKPOINT_PATH}）で完了済みのシナリオを飛ばして再開")
+    parser.add_argument("--replay", action="store_true",
+                        help="ページキャッシュの詳細ページで抽出処理だけを計測し、前回の出力との差分を表示")
+    parser.add_argument("--baseline", default=SCENARIOS_JSON_PATH,
+                        help=f"--replay で比較する基準のJSON（既定 {SCENARIOS_JSON_PATH}）")
+    args = parser.parse_args()
+    
+    if args.replay:
+        print("=== 抽出処理のリプレイ ===\n")
+        replay_extractors(baseline_path=args.baseline)
+        return
+    
+    cache = None if args.no_page_cache else PageCache()
+    
     print("=== クインズワルツ シナリオ詳細スクレイピング ===\n")
     
     # ステップ1: 全リンクを収集
     print("【ステップ1】全シナリオのリンクを収集中...\n")
-    scenario_links = await scrape_all_links()
-    print(f"\n収集完了: {len(scenario_links)} シナリオ\n")
-    
-    # ステップ2: 各シナリオの詳細を取得
-    print("【ステップ2】各シナリオの詳細情報を取得中...\n")
-    scenarios = await scrape_details(scenario_links)
-    
-    print(f"\n\n=============================")
-    print(f"取得完了: {len(scenarios)} シナリオ")
-    print(f"=============================")
+    async with PageFetcher(args.mode, args.fixtures, args.record,
+                           cache=cache, cache_only=args.from_cache) as fetcher:
+        scenario_links = await scrape_all_links(fetcher)
+        print(f"\n収集完了: {len(scenario_links)} シナリオ\n")
+        
+        checkpoint = JsonlCheckpoint(CHECKPOINT_PATH, "url")
+        if args.resume:
+            completed = checkpoint.completed()
+            scenario_links = [s for s in scenario_links if s['url'] not in completed]
+            print(f"再開: 完了済み {len(completed)} 件をスキップ、残り {len(scenario_links)} 件\n")
+        else:
+            checkpoint.reset()
+        
+        # ステップ2: 各シナリオの詳細を取得
+        print("【ステップ2】各シナリオの詳細情報を取得中...\n")
+        await scrape_details(scenario_links, fetcher, args.concurrency, args.interval, checkpoint)
     
-    if scenarios:
-        save_to_markdown(scenarios, "docs/data/queens-waltz-scenarios.md")
-        save_to_json(scenarios, "docs/data/queens-waltz-scenarios.json")
+    # 最終出力はチェックポイントから1件ずつ読みながら書き出す
+    if next(checkpoint.records(), None) is not None:
+        count = save_to_json(checkpoint.records(), SCENARIOS_JSON_PATH)
+        save_to_markdown(checkpoint.records(), "docs/data/queens-waltz-scenarios.md")
+        
+        print(f"\n\n=============================")
+        print(f"取得完了: {count} シナリオ")
+        print(f"=============================")
     else:
         print("シナリオが取得できませんでした")
 
@@ -9,6 +9,10 @@ import re
 import json
 from playwright.async_api import async_playwright
 
+from catalog_changes import update_change_feed
+from cleanup_catalog_data import save_to_staging
+from scrape_common import CATALOG_SELECTOR, extract_catalog_cards, goto, new_page
+
 
 # 既知のカテゴリータグ（人数フィルターは除外）
 CATEGORY_TAGS = [
@@ -33,18 +37,55 @@ SKIP_TEXTS = [
     'もっと見る', '料金', '円', '参加人数', '人', '所用', '時間',
 ]
 
+# カテゴリーの絵文字リスト（HPから確認した全種類）
+CATEGORY_EMOJIS = [
+    '✨',  # 新作
+    '🎭',  # RP重視
+    '🔍',  # ミステリー
+    '🌀',  # 情報量多め
+    '📕',  # ストーリープレイング, 事前読み込み必須
+    '📖',  # 文章量多め
+    '📘',  # 事前読み込み可能
+    '💀',  # デスゲーム
+    '🎩',  # 経験者限定
+    '🔰',  # 初心者にオススメ
+    '🎲',  # ボードゲーム
+    '🎓',  # アオハルミステリー
+    '⚡',  # センシティブ
+    '🏆',  # ロングセラー
+    '📅',  # ロングセラー, 期間限定
+    '💻',  # オンライン
+    '🤝',  # 協力型
+    '💥',  # 駆け引き重視
+    '🇯🇵', # 和風
+    '🗓️', # 期間限定
+    '🗓',  # 期間限定（絵文字バリエーション）
+    '⭐',  # オススメ
+]
+
+
+def normalize_category(text):
+    """カテゴリータグの表示を正規化（絵文字と空白を除去）。タグでなければ None"""
+    if any(text.startswith(e) for e in CATEGORY_EMOJIS):
+        normalized = text
+        for e in CATEGORY_EMOJIS:
+            normalized = normalized.replace(e, '')
+        return normalized.strip() or None
+    if text == 'オススメ' or text == 'おすすめ':
+        return 'オススメ'
+    return None
+
 
 async def scrape_catalog():
     """カタログページから全シナリオ情報を取得（カテゴリータグ含む）"""
     
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+        page = await new_page(browser)
         
         url = "https://queenswaltz.jp/catalog"
         print(f"アクセス中: {url}")
-        await page.goto(url, wait_until="networkidle")
-        await page.wait_for_timeout(3000)
+        await goto(page, url, CATALOG_SELECTOR)
         
         # 「もっと見る」ボタンを全てクリック
         print("全データを読み込み中...")
@@ -74,14 +115,63 @@ async def scrape_catalog():
         print(f"合計 {click_count} 回クリック完了")
         await page.wait_for_timeout(2000)
         
-        # テキストを取得
-        text = await page.inner_text('body')
-        lines = [l.strip() for l in text.split('\n') if l.strip()]
-        
-        print(f"取得行数: {len(lines)}")
+        # シナリオカードを構造化して取得（取れなければ本文テキストを行単位で解析）
+        cards = await extract_catalog_cards(page)
+        if not cards:
+            print("⚠ カードを構造化抽出できなかったため、本文テキストを行単位で解析します")
+            text = await page.inner_text('body')
         
         await browser.close()
     
+    if cards:
+        return parse_category_cards(cards)
+    return parse_category_text(text)
+
+
+def _to_int(value):
+    value = (value or '').replace(',', '')
+    return int(value) if value.isdigit() else None
+
+
+def parse_category_cards(cards):
+    """構造化抽出したカードからシナリオ情報（カテゴリータグ含む）を作る（parse_category_text と同じ形式）"""
+    print(f"取得カード数: {len(cards)}")
+    
+    unique = []
+    seen = set()
+    for card in cards:
+        title = card.get('title')
+        if not title or any(skip in title for skip in SKIP_TEXTS) or len(title) <= 1 or title in seen:
+            continue
+        # 人数が数字でないもの（絞り込みメニューなど）はシナリオではない
+        if _to_int(card.get('players')) is None:
+            continue
+        seen.add(title)
+        
+        categories = []
+        for text in card.get('texts', []):
+            normalized = normalize_category(text)
+            if normalized and normalized not in categories:
+                categories.append(normalized)
+        
+        author = card.get('author')
+        unique.append({
+            'title': title,
+            'author': author if author and not any(skip in author for skip in SKIP_TEXTS) else None,
+            'price': _to_int(card.get('price')),
+            'players': _to_int(card.get('players')),
+            'duration': _to_int(card.get('duration')),
+            'categories': categories
+        })
+    
+    return unique
+
+
+def parse_category_text(text):
+    """カタログページの本文テキストからシナリオ情報（カテゴリータグ含む）を取り出す"""
+    lines = [l.strip() for l in text.split('\n') if l.strip()]
+    print(f"取得行数: {len(lines)}")
+    
     # シナリオを解析
     scenarios = []
     i = 0
@@ -119,32 +209,6 @@ async def scrape_catalog():
                 # カテゴリータグを取得（シナリオ情報の後を探す）
                 categories = []
                 
-                # カテゴリーの絵文字リスト（HPから確認した全種類）
-                category_emojis = [
-                    '✨',  # 新作
-                    '🎭',  # RP重視
-                    '🔍',  # ミステリー
-                    '🌀',  # 情報量多め
-                    '📕',  # ストーリープレイング, 事前読み込み必須
-                    '📖',  # 文章量多め
-                    '📘',  # 事前読み込み可能
-                    '💀',  # デスゲーム
-                    '🎩',  # 経験者限定
-                    '🔰',  # 初心者にオススメ
-                    '🎲',  # ボードゲーム
-                    '🎓',  # アオハルミステリー
-                    '⚡',  # センシティブ
-                    '🏆',  # ロングセラー
-                    '📅',  # ロングセラー, 期間限定
-                    '💻',  # オンライン
-                    '🤝',  # 協力型
-                    '💥',  # 駆け引き重視
-                    '🇯🇵', # 和風
-                    '🗓️', # 期間限定
-                    '🗓',  # 期間限定（絵文字バリエーション）
-                    '⭐',  # オススメ
-                ]
-                
                 # 時間の後の行をチェック（カテゴリーがある）
                 end_idx = min(i + 25, len(lines))
                 for j in range(i + 8, end_idx):
@@ -153,17 +217,9 @@ async def scrape_catalog():
                     if check_line == '料金':
                         break
                     # 絵文字で始まるカテゴリータグを検出
-                    if any(check_line.startswith(e) for e in category_emojis):
-                        # 正規化（絵文字と空白を除去）
-                        normalized = check_line
-                        for e in category_emojis:
-                            normalized = normalized.replace(e, '')
-                        normalized = normalized.strip()
-                        if normalized and normalized not in categories:
-                            categories.append(normalized)
-                    elif check_line == 'オススメ' or check_line == 'おすすめ':
-                        if 'オススメ' not in categories:
-                            categories.append('オススメ')
+                    normalized = normalize_category(check_line)
+                    if normalized and normalized not in categories:
+                        categories.append(normalized)
                 
                 scenarios.append({
                     'title': title,
@@ -234,6 +290,8 @@ async def main():
     
     if scenarios:
         save_to_json(scenarios, "docs/data/queens-waltz-catalog.json")
+        save_to_staging(scenarios)
+        update_change_feed(scenarios)
         save_to_markdown(scenarios, "docs/data/queens-waltz-catalog.md")
 
 
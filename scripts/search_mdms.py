@@ -4,13 +4,17 @@ mdms.jp (マダミス.jp) でシナリオを検索
 DBにあってカタログにないシナリオの情報を取得
 """
 
+import argparse
 import json
 import asyncio
 import re
+import time
 from urllib.parse import quote
 from playwright.async_api import async_playwright
 from datetime import datetime
 
+from scrape_common import MDMS_SELECTOR, AdaptiveRateLimiter, goto, new_page, run_page_pool
+
 
 def load_unmatched_scenarios():
     """DBのみのシナリオを読み込み"""
@@ -25,11 +29,10 @@ async def search_mdms(title):
     
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+        page = await new_page(browser)
         
         try:
-            await page.goto(search_url, wait_until="networkidle", timeout=30000)
-            await page.wait_for_timeout(2000)
+            await goto(page, search_url, MDMS_SELECTOR)
             
             # 検索結果を取得
             results = []
@@ -60,84 +63,93 @@ async def search_mdms(title):
             return {"error": str(e)}
 
 
-async def search_all_scenarios(scenarios):
-    """全シナリオを検索"""
+# 並行して検索するページ数
+SEARCH_WORKERS = 3
+
+
+async def fetch_search(page, title):
+    """検索結果の先頭3件の作品カード (href, テキスト)"""
+    search_url = f"https://mdms.jp/works?keyword={quote(title)}"
+    await goto(page, search_url, MDMS_SELECTOR)
+    
+    # 作品リンクを探す
+    cards = []
+    for card in (await page.query_selector_all('a[href^="/works/"]'))[:3]:
+        try:
+            cards.append((await card.get_attribute('href'), await card.inner_text()))
+        except:
+            pass
+    return cards
+
+
+def judge_search(title, cards):
+    """作品カードにタイトルが含まれていれば (mdms URL, カード情報)、無ければ (None, None)"""
+    for href, card_text in cards:
+        # タイトルが含まれているかチェック
+        if href and '/works/' in href:
+            # タイトルの一部がカードテキストに含まれるか
+            title_check = title.replace(" ", "").replace("　", "")[:5]
+            card_check = card_text.replace(" ", "").replace("　", "")
+            
+            if title_check in card_check or card_check[:10] in title:
+                return f"https://mdms.jp{href}", card_text.strip()[:200]
+    return None, None
+
+
+async def search_all_scenarios(scenarios, workers=SEARCH_WORKERS):
+    """
+    全シナリオを検索
+    
+    同じタイトルはまとめて1回だけ検索し、workers 個のページで並行に、
+    応答に合わせて速度を変えながら検索する（結果は元の順序）。
+    """
     results = []
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+    # テストデータはスキップし、同じタイトルをまとめる
+    groups = {}
+    for scenario in scenarios:
+        title = scenario.get("title", "")
+        if "テスト" in title or title.startswith("00") or title.startswith("02"):
+            continue
+        groups.setdefault(title, []).append(scenario)
+    titles = list(groups)
+    
+    limiter = AdaptiveRateLimiter()
+    started = time.perf_counter()
+    
+    def on_done(i, title, cards, error):
+        rate = (i + 1) / max(time.perf_counter() - started, 1e-9)
+        print(f"[{i+1}/{len(titles)}] 検索中: {title}  ({rate:.1f} 件/秒, 上限 {limiter.rate:.1f} 件/秒)")
         
-        for i, scenario in enumerate(scenarios):
-            title = scenario.get("title", "")
-            
-            # テストデータはスキップ
-            if "テスト" in title or title.startswith("00") or title.startswith("02"):
-                continue
-            
-            print(f"[{i+1}/{len(scenarios)}] 検索中: {title}")
-            
-            search_url = f"https://mdms.jp/works?keyword={quote(title)}"
-            
-            try:
-                await page.goto(search_url, wait_until="networkidle", timeout=30000)
-                await page.wait_for_timeout(1500)
-                
-                # 検索結果の件数を取得
-                body_text = await page.inner_text('body')
-                
-                # 作品が見つかったかチェック
-                found = False
-                work_url = None
-                work_info = None
-                
-                # 作品リンクを探す
-                cards = await page.query_selector_all('a[href^="/works/"]')
-                
-                for card in cards[:3]:
-                    try:
-                        href = await card.get_attribute('href')
-                        card_text = await card.inner_text()
-                        
-                        # タイトルが含まれているかチェック
-                        if href and '/works/' in href:
-                            # タイトルの一部がカードテキストに含まれるか
-                            title_check = title.replace(" ", "").replace("　", "")[:5]
-                            card_check = card_text.replace(" ", "").replace("　", "")
-                            
-                            if title_check in card_check or card_check[:10] in title:
-                                found = True
-                                work_url = f"https://mdms.jp{href}"
-                                work_info = card_text.strip()[:200]
-                                break
-                    except:
-                        pass
-                
-                results.append({
-                    "db_title": title,
-                    "db_author": scenario.get("author", ""),
-                    "found_on_mdms": found,
-                    "mdms_url": work_url,
-                    "mdms_info": work_info
-                })
-                
-                if found:
-                    print(f"  ✓ 発見: {work_url}")
-                else:
-                    print(f"  - 見つからず")
-                
-            except Exception as e:
-                print(f"  ✗ エラー: {e}")
+        if error is not None:
+            print(f"  ✗ エラー: {error}")
+            for scenario in groups[title]:
                 results.append({
                     "db_title": title,
                     "db_author": scenario.get("author", ""),
                     "found_on_mdms": False,
-                    "error": str(e)
+                    "error": str(error)
                 })
-            
-            # レート制限対策
-            await asyncio.sleep(1)
+            return
         
+        work_url, work_info = judge_search(title, cards)
+        for scenario in groups[title]:
+            results.append({
+                "db_title": title,
+                "db_author": scenario.get("author", ""),
+                "found_on_mdms": work_url is not None,
+                "mdms_url": work_url,
+                "mdms_info": work_info
+            })
+        
+        if work_url:
+            print(f"  ✓ 発見: {work_url}")
+        else:
+            print(f"  - 見つからず")
+    
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        await run_page_pool(browser, titles, fetch_search, on_done, workers, limiter)
         await browser.close()
     
     return results
@@ -190,6 +202,11 @@ def save_results(results):
 
 
 async def main():
+    parser = argparse.ArgumentParser(description="mdms.jp シナリオ検索")
+    parser.add_argument("--workers", type=int, default=SEARCH_WORKERS,
+                        help=f"並行して検索するページ数（既定 {SEARCH_WORKERS}）")
+    args = parser.parse_args()
+    
     print("=== mdms.jp シナリオ検索 ===\n")
     
     # DBのみのシナリオを読み込み
@@ -197,7 +214,7 @@ async def main():
     print(f"検索対象: {len(scenarios)}件\n")
     
     # 検索実行
-    results = await search_all_scenarios(scenarios)
+    results = await search_all_scenarios(scenarios, args.workers)
     
     # 結果を保存
     save_results(results)
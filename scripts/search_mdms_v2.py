@@ -3,13 +3,22 @@
 mdms.jp (マダミス.jp) でシナリオを検索 - 改良版
 """
 
+import argparse
 import json
 import asyncio
 import re
+import time
 from urllib.parse import quote
 from playwright.async_api import async_playwright
 from datetime import datetime
 
+from scrape_common import (
+    MDMS_SELECTOR, AdaptiveRateLimiter, JsonlCheckpoint, goto, new_page, run_page_pool, write_json_array
+)
+
+# 検索結果のチェックポイント（1行1シナリオ、db_id で識別）
+CHECKPOINT_PATH = "docs/data/mdms-search-results.checkpoint.jsonl"
+
 
 def load_unmatched_scenarios():
     """DBのみのシナリオを読み込み"""
@@ -29,13 +38,76 @@ def simplify_title(title):
     return title.strip()[:15]  # 最初の15文字のみ
 
 
-async def search_all_scenarios(scenarios):
-    """全シナリオを検索"""
+# 並行して検索するページ数
+SEARCH_WORKERS = 3
+
+
+async def fetch_search(page, query):
+    """検索結果ページの本文テキストと、先頭10件の作品リンク (href, テキスト)"""
+    search_url = f"https://mdms.jp/works?keyword={quote(query)}"
+    await goto(page, search_url, MDMS_SELECTOR)
+    
+    body_text = await page.inner_text('body')
+    links = []
+    for link in (await page.query_selector_all('a[href*="/works/"]'))[:10]:
+        try:
+            links.append((await link.get_attribute('href'), await link.inner_text()))
+        except:
+            pass
+    return body_text, links
+
+
+def judge_search(scenario, simple_title, body_text, links):
+    """検索結果ページにシナリオがあるかを判定した結果"""
+    title = scenario.get("title", "")
+    
+    # シナリオタイトルが含まれているかチェック
+    found = False
+    mdms_url = None
+    
+    # タイトルの一部でチェック
+    title_parts = [title[:5], simple_title[:5]]
+    for part in title_parts:
+        if part and len(part) >= 3 and part in body_text:
+            found = True
+            break
+    
+    # 発見した場合、URLを取得
+    if found:
+        for href, link_text in links:
+            if href and any(p in link_text for p in title_parts if p and len(p) >= 3):
+                mdms_url = f"https://mdms.jp{href}" if not href.startswith('http') else href
+                break
+    
+    return {
+        "db_title": title,
+        "db_author": scenario.get("author", ""),
+        "db_id": scenario.get("id", ""),
+        "found_on_mdms": found,
+        "mdms_url": mdms_url,
+        "search_query": simple_title
+    }
+
+
+async def search_all_scenarios(scenarios, checkpoint=None, completed=frozenset(), workers=SEARCH_WORKERS):
+    """
+    全シナリオを検索
+    
+    simplify_title が同じになるシナリオはまとめて1回だけ検索し、
+    workers 個のページで並行に、応答に合わせて速度を変えながら検索する。
+    checkpoint（JsonlCheckpoint）を指定すると結果を1件ずつ追記する。
+    completed に含まれる db_id のシナリオは検索しない（再開用）。
+    """
     results = []
     
+    def add_result(result):
+        results.append(result)
+        if checkpoint is not None:
+            checkpoint.append(result)
+    
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+        page = await new_page(browser)
         
         # まず1件検索してサイト構造を確認
         test_title = "機巧人形の心臓"
@@ -43,8 +115,7 @@ async def search_all_scenarios(scenarios):
         
         try:
             search_url = f"https://mdms.jp/works?keyword={quote(test_title)}"
-            await page.goto(search_url, wait_until="networkidle", timeout=30000)
-            await page.wait_for_timeout(3000)
+            await goto(page, search_url, MDMS_SELECTOR)
             
             # HTML構造を確認
             html = await page.content()
@@ -58,95 +129,84 @@ async def search_all_scenarios(scenarios):
             
         except Exception as e:
             print(f"テスト検索エラー: {e}")
+        await page.context.close()
         
         # テストデータをスキップしてスキャン
         valid_scenarios = [s for s in scenarios 
                          if "テスト" not in s.get("title", "") 
                          and not s.get("title", "").startswith("00")
                          and not s.get("title", "").startswith("02")]
+        if completed:
+            skipped = len(valid_scenarios)
+            valid_scenarios = [s for s in valid_scenarios if s.get("id", "") not in completed]
+            print(f"\n再開: 完了済み {skipped - len(valid_scenarios)} 件をスキップ")
         
-        print(f"\n検索対象: {len(valid_scenarios)}件\n")
+        # 同じ検索語になるシナリオをまとめる（最初に出てきた順）
+        groups = {}
+        for scenario in valid_scenarios:
+            groups.setdefault(simplify_title(scenario.get("title", "")), []).append(scenario)
+        queries = list(groups)
         
-        for i, scenario in enumerate(valid_scenarios):
-            title = scenario.get("title", "")
-            simple_title = simplify_title(title)
+        print(f"\n検索対象: {len(valid_scenarios)}件（検索語 {len(queries)} 件）\n")
+        
+        limiter = AdaptiveRateLimiter()
+        started = time.perf_counter()
+        
+        def on_done(i, query, page_result, error):
+            rate = (i + 1) / max(time.perf_counter() - started, 1e-9)
+            titles = " / ".join(s.get("title", "") for s in groups[query])
+            print(f"[{i+1}/{len(queries)}] {titles} → 検索: {query}  ({rate:.1f} 件/秒, 上限 {limiter.rate:.1f} 件/秒)")
             
-            print(f"[{i+1}/{len(valid_scenarios)}] {title} → 検索: {simple_title}")
+            if error is not None:
+                print(f"  ✗ エラー: {error}")
             
-            try:
-                search_url = f"https://mdms.jp/works?keyword={quote(simple_title)}"
-                await page.goto(search_url, wait_until="networkidle", timeout=30000)
-                await page.wait_for_timeout(2000)
-                
-                # 検索結果ページのテキストを取得
-                body_text = await page.inner_text('body')
-                
-                # シナリオタイトルが含まれているかチェック
-                found = False
-                mdms_url = None
+            for scenario in groups[query]:
+                if error is not None:
+                    add_result({
+                        "db_title": scenario.get("title", ""),
+                        "db_author": scenario.get("author", ""),
+                        "db_id": scenario.get("id", ""),
+                        "found_on_mdms": False,
+                        "error": str(error)
+                    })
+                    continue
                 
-                # タイトルの一部でチェック
-                title_parts = [title[:5], simple_title[:5]]
-                for part in title_parts:
-                    if part and len(part) >= 3 and part in body_text:
-                        found = True
-                        break
-                
-                # 発見した場合、URLを取得
-                if found:
-                    links = await page.query_selector_all('a[href*="/works/"]')
-                    for link in links[:10]:
-                        try:
-                            href = await link.get_attribute('href')
-                            link_text = await link.inner_text()
-                            
-                            if any(p in link_text for p in title_parts if p and len(p) >= 3):
-                                mdms_url = f"https://mdms.jp{href}" if not href.startswith('http') else href
-                                break
-                        except:
-                            pass
-                
-                results.append({
-                    "db_title": title,
-                    "db_author": scenario.get("author", ""),
-                    "db_id": scenario.get("id", ""),
-                    "found_on_mdms": found,
-                    "mdms_url": mdms_url,
-                    "search_query": simple_title
-                })
-                
-                if found:
-                    print(f"  ✓ 発見! {mdms_url or ''}")
+                result = judge_search(scenario, query, *page_result)
+                add_result(result)
+                if result["found_on_mdms"]:
+                    print(f"  ✓ 発見! {result['mdms_url'] or ''}")
                 else:
                     print(f"  - 見つからず")
-                
-            except Exception as e:
-                print(f"  ✗ エラー: {e}")
-                results.append({
-                    "db_title": title,
-                    "db_author": scenario.get("author", ""),
-                    "db_id": scenario.get("id", ""),
-                    "found_on_mdms": False,
-                    "error": str(e)
-                })
-            
-            await asyncio.sleep(0.8)
+        
+        await run_page_pool(browser, queries, fetch_search, on_done, workers, limiter)
         
         await browser.close()
     
     return results
 
 
-def save_results(results):
-    """結果を保存"""
+def save_results(records):
+    """
+    結果を保存
+    
+    records は呼ぶたびに結果を先頭から1件ずつ返す関数
+    （件数の集計・JSON・Markdown の各パスで読み直す）
+    """
+    total = found = 0
+    for r in records():
+        total += 1
+        found += bool(r.get("found_on_mdms"))
+    
     output_json = "docs/data/mdms-search-results.json"
     with open(output_json, "w", encoding="utf-8") as f:
-        json.dump({
+        header = json.dumps({
             "searched_at": datetime.now().isoformat(),
-            "total": len(results),
-            "found": sum(1 for r in results if r.get("found_on_mdms")),
-            "results": results
-        }, f, ensure_ascii=False, indent=2)
+            "total": total,
+            "found": found,
+        }, ensure_ascii=False, indent=2)
+        f.write(header[:-2] + ',\n  "results": ')
+        write_json_array(f, records(), level=1)
+        f.write("\n}")
     print(f"\n保存: {output_json}")
     
     output_md = "docs/data/mdms-search-results.md"
@@ -154,18 +214,17 @@ def save_results(results):
         f.write("# mdms.jp 検索結果\n\n")
         f.write(f"検索日時: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n")
         
-        found_results = [r for r in results if r.get("found_on_mdms")]
-        not_found = [r for r in results if not r.get("found_on_mdms")]
+        f.write(f"- 検索対象: {total}件\n")
+        f.write(f"- 発見: {found}件\n")
+        f.write(f"- 未発見: {total - found}件\n\n")
         
-        f.write(f"- 検索対象: {len(results)}件\n")
-        f.write(f"- 発見: {len(found_results)}件\n")
-        f.write(f"- 未発見: {len(not_found)}件\n\n")
-        
-        if found_results:
+        if found:
             f.write("## mdms.jpで発見されたシナリオ\n\n")
             f.write("| タイトル | 作者 | mdms.jp |\n")
             f.write("|---------|------|--------|\n")
-            for r in found_results:
+            for r in records():
+                if not r.get("found_on_mdms"):
+                    continue
                 title = r.get("db_title", "")
                 author = r.get("db_author", "") or "不明"
                 url = r.get("mdms_url", "")
@@ -177,26 +236,44 @@ def save_results(results):
         f.write("\n## mdms.jpで見つからなかったシナリオ\n\n")
         f.write("| タイトル | 作者 |\n")
         f.write("|---------|------|\n")
-        for r in not_found:
+        for r in records():
+            if r.get("found_on_mdms"):
+                continue
             title = r.get("db_title", "")
             author = r.get("db_author", "") or "不明"
             f.write(f"| {title} | {author} |\n")
     
     print(f"保存: {output_md}")
+    return total, found
 
 
 async def main():
+    parser = argparse.ArgumentParser(description="mdms.jp シナリオ検索 v2")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"チェックポイント（{CHECKPOINT_PATH}）で完了済みのシナリオを飛ばして再開")
+    parser.add_argument("--workers", type=int, default=SEARCH_WORKERS,
+                        help=f"並行して検索するページ数（既定 {SEARCH_WORKERS}）")
+    args = parser.parse_args()
+    
     print("=== mdms.jp シナリオ検索 v2 ===\n")
     
     scenarios = load_unmatched_scenarios()
     print(f"全シナリオ: {len(scenarios)}件\n")
     
-    results = await search_all_scenarios(scenarios)
-    save_results(results)
+    checkpoint = JsonlCheckpoint(CHECKPOINT_PATH, "db_id")
+    if args.resume:
+        completed = checkpoint.completed()
+    else:
+        completed = frozenset()
+        checkpoint.reset()
+    
+    await search_all_scenarios(scenarios, checkpoint, completed, args.workers)
+    
+    # 最終出力はチェックポイントから1件ずつ読みながら書き出す
+    total, found = save_results(checkpoint.records)
     
-    found = sum(1 for r in results if r.get("found_on_mdms"))
     print(f"\n=== 完了 ===")
-    print(f"発見: {found}/{len(results)} 件")
+    print(f"発見: {found}/{total} 件")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+カタログ取り込みのステージングDB（SQLite）
+
+スクレイピング → マッピング → SQL生成・DB更新・レポートの各ステップが受け渡す
+データを1つの SQLite ファイルに置く。これまでの大きなJSON
+（queens-waltz-catalog.json / queens-waltz-scenarios-internal.json /
+scenario-mapping-legacy.json / scenario-mapping-masters.json）を毎回全件読み直す
+代わりに、インデックス付きのテーブルを引く。
+
+- catalog_items      カタログのシナリオ（タイトルで一意）
+- internal_scenarios 内部スプレッドシートのシナリオ
+- db_scenarios       DBから取得したシナリオのスナップショット（取得元テーブルごと）
+- matches            マッピング結果（マッピング名ごと。DBに無いカタログは db_id が NULL）
+- mapping_runs       マッピングの実行記録（照合先と統計）
+- aliases            scenario_import_aliases のスナップショット
+- mapping_counters   マッピングごとの類似度の区分ごとの件数（matches のトリガーで増減）
+- report_revisions   レポートの節ごとの版（節の内容に関わる行が変わるとトリガーで進む）
+- report_sections    描画済みのレポートの節（版が進んでいなければ再利用する）
+- json_sources       ストアと同時に書いたJSONファイルの更新時刻・サイズ・ハッシュ
+
+書き込みは前回との差分だけを反映するので、一部のステップだけをやり直すのも安い。
+JSONファイルは従来どおり出力するので、ストアが無い環境や、JSONがストアと一緒に
+書いたときから変わっている（ストアを経由せずに書き換えられた）場合はJSONから読む。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+STAGING_DB_PATH = "docs/data/staging.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_items (
+    title TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    author TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_position ON catalog_items (position);
+
+CREATE TABLE IF NOT EXISTS internal_scenarios (
+    position INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_internal_scenarios_title ON internal_scenarios (title);
+
+CREATE TABLE IF NOT EXISTS db_scenarios (
+    source TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT,
+    author TEXT,
+    data TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (source, id)
+);
+CREATE INDEX IF NOT EXISTS idx_db_scenarios_position ON db_scenarios (source, position);
+CREATE INDEX IF NOT EXISTS idx_db_scenarios_title ON db_scenarios (source, title);
+
+CREATE TABLE IF NOT EXISTS matches (
+    mapping TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    catalog_title TEXT NOT NULL,
+    db_id TEXT,
+    db_title TEXT,
+    db_author TEXT,
+    similarity REAL,
+    catalog_data TEXT NOT NULL,
+    PRIMARY KEY (mapping, position)
+);
+CREATE INDEX IF NOT EXISTS idx_matches_title ON matches (mapping, catalog_title);
+CREATE INDEX IF NOT EXISTS idx_matches_db_id ON matches (mapping, db_id);
+CREATE INDEX IF NOT EXISTS idx_matches_similarity ON matches (mapping, similarity);
+
+CREATE TABLE IF NOT EXISTS mapping_runs (
+    mapping TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    canonical_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_aliases_canonical ON aliases (canonical_name);
+
+CREATE TABLE IF NOT EXISTS mapping_counters (
+    mapping TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (mapping, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS report_revisions (
+    mapping TEXT NOT NULL,
+    section TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    PRIMARY KEY (mapping, section)
+);
+
+CREATE TABLE IF NOT EXISTS report_sections (
+    mapping TEXT NOT NULL,
+    section TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (mapping, section)
+);
+
+CREATE TABLE IF NOT EXISTS json_sources (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL
+);
+"""
+
+# マッピング名 → 照合先のDBテーブル
+MAPPING_SOURCES = {
+    "masters": "scenario_masters",
+    "legacy": "scenarios",
+}
+
+# 類似度の区分（下限の高い順。どれにも当たらなければ "low"）
+SIMILARITY_BUCKETS = [("perfect", 1.0), ("high", 0.9), ("medium", 0.7)]
+
+# この類似度未満のマッチはレポートの「要確認」に載せる
+REVIEW_THRESHOLD = 0.9
+
+
+def similarity_bucket(similarity):
+    for bucket, lower in SIMILARITY_BUCKETS:
+        if similarity >= lower:
+            return bucket
+    return "low"
+
+
+def _bucket_sql(row):
+    """行 row（NEW / OLD）の区分を返すSQL式（DBに無いカタログは "unmatched_catalog"）"""
+    cases = " ".join(f"WHEN {row}.similarity >= {lower} THEN '{bucket}'" for bucket, lower in SIMILARITY_BUCKETS)
+    return f"CASE WHEN {row}.db_id IS NULL THEN 'unmatched_catalog' {cases} ELSE 'low' END"
+
+
+def _match_trigger_body(row, delta):
+    """matches の行 row が増えた（delta=1）・減った（delta=-1）ときに件数と節の版を更新する"""
+    return f"""
+    INSERT INTO mapping_counters (mapping, bucket, count) VALUES ({row}.mapping, {_bucket_sql(row)}, {delta})
+        ON CONFLICT (mapping, bucket) DO UPDATE SET count = count + excluded.count;
+    INSERT INTO report_revisions (mapping, section, revision)
+        SELECT {row}.mapping, section, 1 FROM (
+            SELECT 'unmatched_catalog' AS section WHERE {row}.db_id IS NULL
+            UNION ALL SELECT 'matched' WHERE {row}.db_id IS NOT NULL
+            UNION ALL SELECT 'unmatched_db' WHERE {row}.db_id IS NOT NULL
+            UNION ALL SELECT 'low_matches' WHERE {row}.db_id IS NOT NULL AND {row}.similarity < {REVIEW_THRESHOLD}
+        ) WHERE 1
+        ON CONFLICT (mapping, section) DO UPDATE SET revision = revision + 1;"""
+
+
+def _db_scenario_trigger_body(row):
+    """DBスナップショットの行が変わったら、その取得元を照合先にするマッピングの「DBのみ」の版を進める"""
+    return f"""
+    INSERT INTO report_revisions (mapping, section, revision)
+        SELECT mapping, 'unmatched_db', 1 FROM mapping_runs WHERE source = {row}.source
+        ON CONFLICT (mapping, section) DO UPDATE SET revision = revision + 1;"""
+
+
+TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS matches_insert AFTER INSERT ON matches BEGIN{_match_trigger_body("NEW", 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS matches_delete AFTER DELETE ON matches BEGIN{_match_trigger_body("OLD", -1)}
+END;
+CREATE TRIGGER IF NOT EXISTS matches_update AFTER UPDATE ON matches BEGIN{_match_trigger_body("OLD", -1)}{_match_trigger_body("NEW", 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS db_scenarios_insert AFTER INSERT ON db_scenarios BEGIN{_db_scenario_trigger_body("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS db_scenarios_delete AFTER DELETE ON db_scenarios BEGIN{_db_scenario_trigger_body("OLD")}
+END;
+CREATE TRIGGER IF NOT EXISTS db_scenarios_update AFTER UPDATE ON db_scenarios BEGIN{_db_scenario_trigger_body("OLD")}
+END;
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class StagingStore:
+    """
+    ステージングDB
+
+    with StagingStore() as store: の形で使う（抜けるときにコミットして閉じる）。
+    """
+
+    def __init__(self, path=STAGING_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # INSERT OR REPLACE で置き換えられる行にも削除トリガーを発火させる（件数を正しく保つため）
+        self.conn.execute("PRAGMA recursive_triggers = ON")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(TRIGGERS)
+        # 件数テーブルより前に作られたストアは一度だけ集計し直す
+        if (self.conn.execute("SELECT 1 FROM mapping_counters LIMIT 1").fetchone() is None
+                and self.conn.execute("SELECT 1 FROM matches LIMIT 1").fetchone() is not None):
+            self.rebuild_counters()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def exists(path=STAGING_DB_PATH):
+        return os.path.exists(path)
+
+    def _replace_rows(self, table, key_columns, rows, scope=None):
+        """
+        table の内容を rows に揃える（変わった行だけ書き、無くなった行は消す）
+
+        Args:
+            key_columns: 行を特定する列
+            rows: 列名 → 値 の辞書のリスト
+            scope: (列名, 値)。指定するとその値の行だけを対象にする
+        Returns:
+            (書き込んだ行数, 消した行数)
+        """
+        where, params = ("", [])
+        if scope:
+            where, params = (f" WHERE {scope[0]} = ?", [scope[1]])
+        columns = list(rows[0].keys()) if rows else []
+
+        existing = {}
+        for row in self.conn.execute(f"SELECT * FROM {table}{where}", params):
+            existing[tuple(row[k] for k in key_columns)] = tuple(row[c] for c in columns) if columns else ()
+
+        changed = []
+        keys = set()
+        for row in rows:
+            key = tuple(row[k] for k in key_columns)
+            keys.add(key)
+            values = tuple(row[c] for c in columns)
+            if existing.get(key) != values:
+                changed.append(values)
+
+        removed = [key for key in existing if key not in keys]
+        with self.conn:
+            if changed:
+                placeholders = ", ".join("?" for _ in columns)
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", changed
+                )
+            if removed:
+                condition = " AND ".join(f"{k} = ?" for k in key_columns)
+                self.conn.executemany(f"DELETE FROM {table} WHERE {condition}", removed)
+        return len(changed), len(removed)
+
+    # --- カタログ ---
+
+    def replace_catalog(self, scenarios, json_path=None):
+        """
+        カタログ全体を置き換える（タイトルが重複する場合は先のものを使う）
+
+        json_path: 同じ内容を書き出したJSON（指定すると record_source() する）
+        """
+        now = datetime.now().isoformat()
+        rows, seen = [], set()
+        for s in scenarios:
+            title = s.get("title")
+            if not title or title in seen:
+                continue
+            seen.add(title)
+            rows.append({
+                "title": title, "position": len(rows), "author": s.get("author"),
+                "data": _dumps(s), "updated_at": now,
+            })
+        # updated_at だけの違いでは書き換えない
+        existing = {r["title"]: (r["position"], r["data"], r["updated_at"])
+                    for r in self.conn.execute("SELECT title, position, data, updated_at FROM catalog_items")}
+        for row in rows:
+            old = existing.get(row["title"])
+            if old and old[:2] == (row["position"], row["data"]):
+                row["updated_at"] = old[2]
+        result = self._replace_rows("catalog_items", ["title"], rows)
+        if json_path:
+            self.record_source(json_path)
+        return result
+
+    def catalog(self):
+        return [json.loads(r["data"]) for r in
+                self.conn.execute("SELECT data FROM catalog_items ORDER BY position")]
+
+    def catalog_item(self, title):
+        row = self.conn.execute("SELECT data FROM catalog_items WHERE title = ?", (title,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def replace_internal(self, scenarios, json_path=None):
+        rows = [{"position": i, "title": s.get("title") or "", "data": _dumps(s)} for i, s in enumerate(scenarios)]
+        result = self._replace_rows("internal_scenarios", ["position"], rows)
+        if json_path:
+            self.record_source(json_path)
+        return result
+
+    def internal(self):
+        return [json.loads(r["data"]) for r in
+                self.conn.execute("SELECT data FROM internal_scenarios ORDER BY position")]
+
+    # --- DBスナップショット ---
+
+    def replace_db_snapshot(self, source, scenarios, key_field="id"):
+        """取得元テーブルごとのスナップショットを置き換える（key_field の値で行を特定）"""
+        now = datetime.now().isoformat()
+        rows, seen = [], set()
+        for s in scenarios:
+            key = str(s.get(key_field))
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append({
+                "source": source, "id": key, "position": len(rows), "title": s.get("title"),
+                "author": s.get("author"), "data": _dumps(s), "fetched_at": now,
+            })
+        # 内容が同じ行は fetched_at を書き換えない
+        existing = {r["id"]: (r["position"], r["data"], r["fetched_at"]) for r in self.conn.execute(
+            "SELECT id, position, data, fetched_at FROM db_scenarios WHERE source = ?", (source,)
+        )}
+        for row in rows:
+            old = existing.get(row["id"])
+            if old and old[:2] == (row["position"], row["data"]):
+                row["fetched_at"] = old[2]
+        return self._replace_rows("db_scenarios", ["source", "id"], rows, scope=("source", source))
+
+    def db_snapshot(self, source):
+        return [json.loads(r["data"]) for r in self.conn.execute(
+            "SELECT data FROM db_scenarios WHERE source = ? ORDER BY position", (source,)
+        )]
+
+    # --- マッピング ---
+
+    def replace_mapping(self, mapping, matched, unmatched_catalog, stats, json_path=None):
+        """
+        マッピング結果を置き換える
+
+        DBのみのシナリオは保存せず、db_scenarios との差で求める（mapping()）。
+        json_path: 同じ結果を書き出したJSON（指定すると record_source() する）
+        """
+        rows = []
+        for m in matched:
+            rows.append({
+                "mapping": mapping, "position": len(rows), "catalog_title": m["catalog_title"],
+                "db_id": m.get("db_id"), "db_title": m.get("db_title"), "db_author": m.get("db_author"),
+                "similarity": m.get("similarity"), "catalog_data": _dumps(m.get("catalog_data", {})),
+            })
+        for s in unmatched_catalog:
+            rows.append({
+                "mapping": mapping, "position": len(rows), "catalog_title": s.get("title", ""),
+                "db_id": None, "db_title": None, "db_author": None,
+                "similarity": None, "catalog_data": _dumps(s),
+            })
+        result = self._replace_rows("matches", ["mapping", "position"], rows, scope=("mapping", mapping))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mapping_runs (mapping, source, stats, created_at) VALUES (?, ?, ?, ?)",
+                (mapping, MAPPING_SOURCES.get(mapping, mapping), _dumps(stats), datetime.now().isoformat()),
+            )
+        if json_path:
+            self.record_source(json_path)
+        return result
+
+    def has_mapping(self, mapping):
+        return self.conn.execute(
+            "SELECT 1 FROM mapping_runs WHERE mapping = ?", (mapping,)
+        ).fetchone() is not None
+
+    @staticmethod
+    def _match(row):
+        return {
+            "catalog_title": row["catalog_title"],
+            "db_id": row["db_id"],
+            "db_title": row["db_title"],
+            "db_author": row["db_author"],
+            "similarity": row["similarity"],
+            "catalog_data": json.loads(row["catalog_data"]),
+        }
+
+    def matches(self, mapping, below=None):
+        """マッチしたものを保存順に（below を指定すると類似度がそれ未満のものを類似度の昇順で）"""
+        if below is None:
+            rows = self.conn.execute(
+                "SELECT * FROM matches WHERE mapping = ? AND db_id IS NOT NULL ORDER BY position", (mapping,)
+            )
+        else:
+            rows = self.conn.execute(
+                "SELECT * FROM matches WHERE mapping = ? AND db_id IS NOT NULL AND similarity < ? "
+                "ORDER BY similarity, position", (mapping, below)
+            )
+        return [self._match(r) for r in rows]
+
+    def unmatched_catalog(self, mapping):
+        return [json.loads(r["catalog_data"]) for r in self.conn.execute(
+            "SELECT catalog_data FROM matches WHERE mapping = ? AND db_id IS NULL ORDER BY position", (mapping,)
+        )]
+
+    def unmatched_db(self, mapping):
+        source = MAPPING_SOURCES.get(mapping, mapping)
+        return [json.loads(r["data"]) for r in self.conn.execute(
+            "SELECT d.data FROM db_scenarios d WHERE d.source = ? AND NOT EXISTS ("
+            "  SELECT 1 FROM matches m WHERE m.mapping = ? AND m.db_id = d.id"
+            ") ORDER BY d.position", (source, mapping)
+        )]
+
+    def stats(self, mapping):
+        row = self.conn.execute("SELECT stats FROM mapping_runs WHERE mapping = ?", (mapping,)).fetchone()
+        return json.loads(row["stats"]) if row else {}
+
+    def mapping(self, mapping):
+        """マッピング結果を従来のJSONと同じ形で返す"""
+        return {
+            "matched": self.matches(mapping),
+            "unmatched_catalog": self.unmatched_catalog(mapping),
+            "unmatched_db": self.unmatched_db(mapping),
+            "stats": self.stats(mapping),
+        }
+
+    def counters(self, mapping):
+        """区分 → 件数（perfect / high / medium / low / unmatched_catalog）"""
+        return {r["bucket"]: r["count"] for r in self.conn.execute(
+            "SELECT bucket, count FROM mapping_counters WHERE mapping = ?", (mapping,)
+        )}
+
+    def rebuild_counters(self):
+        """matches から件数を集計し直す（描画済みの節も捨てる）"""
+        with self.conn:
+            self.conn.execute("DELETE FROM mapping_counters")
+            self.conn.execute(
+                "INSERT INTO mapping_counters (mapping, bucket, count) "
+                f"SELECT mapping, {_bucket_sql('matches')}, COUNT(*) FROM matches GROUP BY 1, 2"
+            )
+            self.conn.execute("DELETE FROM report_sections")
+
+    # --- レポート ---
+
+    def report_section(self, mapping, section, render):
+        """
+        レポートの節を返す（版が進んでいなければ保存済みのものを、進んでいれば render() で描き直す）
+
+        Returns:
+            (本文, 描き直したか)
+        """
+        row = self.conn.execute(
+            "SELECT revision FROM report_revisions WHERE mapping = ? AND section = ?", (mapping, section)
+        ).fetchone()
+        revision = row["revision"] if row else 0
+        cached = self.conn.execute(
+            "SELECT revision, body FROM report_sections WHERE mapping = ? AND section = ?", (mapping, section)
+        ).fetchone()
+        if cached and cached["revision"] == revision:
+            return cached["body"], False
+
+        body = render()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO report_sections (mapping, section, revision, body) VALUES (?, ?, ?, ?)",
+                (mapping, section, revision, body),
+            )
+        return body, True
+
+    # --- JSONとの対応 ---
+
+    def record_source(self, json_path):
+        """ストアと同じ内容を書き出した直後の json_path を記録する"""
+        stat = os.stat(json_path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO json_sources (path, mtime, size, sha1) VALUES (?, ?, ?, ?)",
+                (os.path.normpath(json_path), stat.st_mtime, stat.st_size, _file_sha1(json_path)),
+            )
+
+    def source_is_current(self, json_path):
+        """
+        json_path が記録したときのままか（ストアの内容をそのまま使えるか）
+
+        更新時刻とサイズが記録どおりならそのまま、違えばハッシュで比べる
+        （中身が同じなら記録した更新時刻を進める）。記録が無ければ False。
+        """
+        path = os.path.normpath(json_path)
+        row = self.conn.execute("SELECT mtime, size, sha1 FROM json_sources WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return False
+        stat = os.stat(json_path)
+        if (stat.st_mtime, stat.st_size) == (row["mtime"], row["size"]):
+            return True
+        if stat.st_size != row["size"] or _file_sha1(json_path) != row["sha1"]:
+            return False
+        with self.conn:
+            self.conn.execute("UPDATE json_sources SET mtime = ? WHERE path = ?", (stat.st_mtime, path))
+        return True
+
+    # --- エイリアス ---
+
+    def replace_aliases(self, rows):
+        rows = [{"alias": r["alias"], "canonical_name": r["canonical_name"]} for r in rows]
+        return self._replace_rows("aliases", ["alias"], rows)
+
+    def aliases(self):
+        return [dict(r) for r in self.conn.execute("SELECT alias, canonical_name FROM aliases ORDER BY alias")]
+
+
+def use_store(store, json_path):
+    """
+    ステージングDBから読むか
+
+    JSON がストアと一緒に書いたときから変わっていれば（古い手順・手作業での書き換え）、
+    ストアではなく JSON を使う。JSON が無ければストアを使う。
+    """
+    if not os.path.exists(json_path) or store.source_is_current(json_path):
+        return True
+    print(f"  ⚠ {json_path} がステージングDBと一致しないため JSON から読みます")
+    return False
+
+
+def load_mapping(mapping, json_path):
+    """ステージングDBにマッピング結果があればそこから、無ければJSONから読む"""
+    if StagingStore.exists():
+        with StagingStore() as store:
+            if store.has_mapping(mapping) and use_store(store, json_path):
+                return store.mapping(mapping)
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_catalog(json_path="docs/data/queens-waltz-catalog.json"):
+    """ステージングDBにカタログがあればそこから、無ければJSONから読む（シナリオのリスト）"""
+    if StagingStore.exists():
+        with StagingStore() as store:
+            scenarios = store.catalog() if use_store(store, json_path) else []
+        if scenarios:
+            return scenarios
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("scenarios", []) if isinstance(data, dict) else data
+
+
+def load_internal(json_path="docs/data/queens-waltz-scenarios-internal.json"):
+    """ステージングDBに内部スプレッドシートのシナリオがあればそこから、無ければJSONから読む"""
+    if StagingStore.exists():
+        with StagingStore() as store:
+            scenarios = store.internal() if use_store(store, json_path) else []
+        if scenarios:
+            return scenarios
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
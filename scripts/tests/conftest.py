@@ -0,0 +1,20 @@
+"""
+scripts/ のユニットテスト
+
+スクリプトは python scripts/xxx.py（リポジトリ直下のものは python xxx.py）として
+実行する前提で、互いを同じディレクトリから import している。テストでも scripts/ と
+リポジトリ直下を import パスに加える。
+
+    python -m pytest scripts/tests
+"""
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+for path in (ROOT_DIR, SCRIPTS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from conftest import FIXTURES_DIR
+from scrape_common import extract_catalog_cards, html_to_text
+from scrape_queens_waltz_catalog import parse_catalog_cards
+from scrape_queens_waltz_with_categories import parse_category_cards, parse_category_text
+
+CATALOG_FIXTURE = os.path.join(FIXTURES_DIR, "queens_waltz_catalog.html")
+FIXTURE_TITLES = ["白衣", "OVER KILL", "グロリアメモリーズ"]
+
+
+def card(title, author, price, players, duration, texts=()):
+    return {"title": title, "author": author, "price": price, "players": players,
+            "duration": duration, "texts": list(texts)}
+
+
+# 絞り込みメニューの「参加人数」と、ナビゲーションの見出しがカードとして紛れ込んだ場合
+CARDS = [
+    card("TITLES", "カテゴリー", None, "5人以下", None, ["6人用", "7人用"]),
+    card("公演カタログ", "問い合わせ", "4500", "7", "4"),
+    card("白衣", "ドニパン", "4500", "7", "4", ["✨ 新作", "🌀情報量多め"]),
+    card("OVER KILL", "WorLd Holic", "6,000", "10", "3~3.5", ["💀デスゲーム"]),
+    card("白衣", "ドニパン", "4500", "7", "4"),
+]
+
+
+def test_parse_catalog_cards_skips_menus_and_non_titles():
+    scenarios, tags = parse_catalog_cards(CARDS)
+    assert scenarios == [
+        {"title": "白衣", "author": "ドニパン", "player_count": "7人", "duration": "4時間",
+         "price": "4500円", "tags": ["新作", "情報量多め"]},
+        {"title": "OVER KILL", "author": "WorLd Holic", "player_count": "10人", "duration": "3~3.5時間",
+         "price": "6,000円", "tags": ["デスゲーム"]},
+    ]
+    assert tags == {"新作", "情報量多め", "デスゲーム"}
+
+
+def test_parse_category_cards_requires_numeric_players():
+    scenarios = parse_category_cards(CARDS)
+    assert [s["title"] for s in scenarios] == ["白衣", "OVER KILL"]
+    assert scenarios[1]["price"] == 6000
+    assert scenarios[1]["players"] == 10
+
+
+def test_catalog_fixture_text_path():
+    with open(CATALOG_FIXTURE, "r", encoding="utf-8") as f:
+        scenarios = parse_category_text(html_to_text(f.read()))
+    assert [s["title"] for s in scenarios] == FIXTURE_TITLES
+    assert [s["players"] for s in scenarios] == [7, 10, 10]
+
+
+def test_catalog_fixture_card_extraction():
+    """保存済みのカタログHTMLを実際のブラウザで描画してカードを取り出す（Chromium が無ければスキップ）"""
+    from playwright.async_api import async_playwright
+
+    with open(CATALOG_FIXTURE, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    async def extract():
+        async with async_playwright() as p:
+            try:
+                browser = await p.chromium.launch(headless=True)
+            except Exception as e:
+                pytest.skip(f"Chromium を起動できません: {e}")
+            page = await browser.new_page()
+            await page.set_content(html)
+            cards = await extract_catalog_cards(page)
+            await browser.close()
+            return cards
+
+    cards = asyncio.run(extract())
+    assert [c["title"] for c in cards] == FIXTURE_TITLES
+    assert [c["players"] for c in cards] == ["7", "10", "10"]
+    scenarios, _ = parse_catalog_cards(cards)
+    assert [s["title"] for s in scenarios] == FIXTURE_TITLES
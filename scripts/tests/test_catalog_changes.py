@@ -0,0 +1,75 @@
+import json
+
+from catalog_changes import (
+    advance_snapshot, build_snapshot, diff_catalog, fields_touched, load_changed_fields, update_change_feed
+)
+
+BEFORE = [
+    {"title": "白衣", "author": "ドニパン", "player_count": "7人", "duration": "4時間", "tags": ["新作"]},
+    {"title": "OVER KILL", "author": "WorLd Holic", "player_count": "10人", "duration": "3時間", "tags": []},
+    {"title": "星", "author": "りえぞー", "player_count": "9人", "duration": "4.5時間", "tags": []},
+]
+
+
+def test_first_run_reports_everything_as_added():
+    feed = diff_catalog(None, BEFORE)
+    assert [s["title"] for s in feed["added"]] == ["白衣", "OVER KILL", "星"]
+    assert feed["modified"] == [] and feed["removed"] == [] and feed["unchanged"] == 0
+    assert feed["previous_at"] is None
+
+
+def test_diff_reports_changed_fields_added_and_removed():
+    after = [
+        {**BEFORE[0], "tags": ["新作", "RP重視"]},
+        {**BEFORE[1], "duration": "3~3.5時間", "author": "WorLd Holic"},
+        {"title": "BBA", "author": "みずき", "player_count": "8人", "duration": "5時間", "tags": []},
+        BEFORE[0],  # 同じタイトルの2件目は無視
+    ]
+    feed = diff_catalog(build_snapshot(BEFORE), after)
+    assert [s["title"] for s in feed["added"]] == ["BBA"]
+    assert feed["removed"] == ["星"]
+    assert [(m["title"], m["fields"]) for m in feed["modified"]] == [
+        ("白衣", ["tags"]),
+        ("OVER KILL", ["duration"]),
+    ]
+    assert feed["unchanged"] == 0
+
+
+def test_new_and_dropped_fields_count_as_modified():
+    after = [{**BEFORE[0], "price": "4500円"}, {k: v for k, v in BEFORE[1].items() if k != "tags"}, BEFORE[2]]
+    feed = diff_catalog(build_snapshot(BEFORE), after)
+    assert [(m["title"], m["fields"]) for m in feed["modified"]] == [("白衣", ["price"]), ("OVER KILL", ["tags"])]
+    assert feed["unchanged"] == 1
+
+
+def test_update_change_feed_round_trip(tmp_path):
+    snapshot, feed_path = tmp_path / "snapshot.json", tmp_path / "changes.json"
+    update_change_feed(BEFORE, str(snapshot), str(feed_path))
+    assert len(json.loads(feed_path.read_text(encoding="utf-8"))["added"]) == 3
+    assert advance_snapshot(str(feed_path), str(snapshot))
+    assert load_changed_fields(str(feed_path)) == {}
+
+    after = [{**BEFORE[0], "duration": "4.5時間"}, BEFORE[1], BEFORE[2],
+             {"title": "BBA", "author": "みずき", "player_count": "8人", "duration": "5時間", "tags": []}]
+    update_change_feed(after, str(snapshot), str(feed_path))
+    assert load_changed_fields(str(feed_path)) == {"BBA": None, "白衣": {"duration"}}
+
+    # SQLを生成するまでに取り直しても、それまでの変更はフィードに残る
+    again = [after[0], {**BEFORE[1], "tags": ["RP重視"]}, BEFORE[2], after[3]]
+    update_change_feed(again, str(snapshot), str(feed_path))
+    assert load_changed_fields(str(feed_path)) == {"BBA": None, "白衣": {"duration"}, "OVER KILL": {"tags"}}
+
+    # SQLを生成したら（スナップショットを進めたら）フィードは空になる
+    assert advance_snapshot(str(feed_path), str(snapshot))
+    assert load_changed_fields(str(feed_path)) == {}
+    feed = update_change_feed(again, str(snapshot), str(feed_path))
+    assert feed["added"] == [] and feed["modified"] == [] and feed["unchanged"] == 4
+
+
+def test_fields_touched():
+    fields = ("author", "duration", "tags")
+    changed = {"BBA": None, "白衣": {"duration", "price"}}
+    assert fields_touched(None, "星", fields) == set(fields)
+    assert fields_touched(changed, "BBA", fields) == set(fields)
+    assert fields_touched(changed, "白衣", fields) == {"duration"}
+    assert fields_touched(changed, "星", fields) == set()
@@ -0,0 +1,107 @@
+from generate_update_sql import BATCH_COLUMNS, batched_update_sql
+
+ROWS = [
+    ("'00000000-0000-0000-0000-000000000001'", "'ドニパン'", "7", "7", "4", "ARRAY['新作']"),
+    ("'00000000-0000-0000-0000-000000000002'", None, "5", "6", None, "'{}'::text[]"),
+    ("'00000000-0000-0000-0000-000000000003'", "'きゅう'", None, None, "4", None),
+]
+
+
+def test_single_statement_layout():
+    [sql] = batched_update_sql("scenarios", BATCH_COLUMNS, ROWS[:1])
+    assert sql == (
+        "UPDATE scenarios s SET\n"
+        "  author = COALESCE(v.author, s.author),\n"
+        "  player_count_min = COALESCE(v.player_count_min, s.player_count_min),\n"
+        "  player_count_max = COALESCE(v.player_count_max, s.player_count_max),\n"
+        "  duration = COALESCE(v.duration, s.duration),\n"
+        "  genre = COALESCE(v.genre, s.genre),\n"
+        "  updated_at = NOW()\n"
+        "FROM (VALUES\n"
+        "  ('00000000-0000-0000-0000-000000000001'::uuid, 'ドニパン'::text, 7::integer, 7::integer, "
+        "4::integer, ARRAY['新作']::text[])\n"
+        ") AS v(id, author, player_count_min, player_count_max, duration, genre)\n"
+        "WHERE s.id = v.id;"
+    )
+
+
+def test_nulls_are_typed_and_casts_are_not_doubled():
+    [sql] = batched_update_sql("scenarios", BATCH_COLUMNS, ROWS)
+    assert "NULL::text, 5::integer, 6::integer, NULL::integer, '{}'::text[])" in sql
+    assert "::text[]::text[]" not in sql
+    assert "NULL::integer, NULL::integer, 4::integer, NULL::text[])" in sql
+
+
+def test_rows_are_split_into_batches():
+    rows = [(f"'{i}'", f"'a{i}'", None, None, None, None) for i in range(5)]
+    statements = batched_update_sql("scenarios", BATCH_COLUMNS, rows, batch_size=2)
+    assert len(statements) == 3
+    assert [s.count("::uuid") for s in statements] == [2, 2, 1]
+    assert "'4'::uuid" in statements[-1]
+    assert batched_update_sql("scenarios", BATCH_COLUMNS, []) == []
+
+
+def test_duplicate_ids_merge_like_sequential_updates():
+    rows = [
+        ("'1'", "'先'", "5", None, None, None),
+        ("'2'", "'別'", None, None, None, None),
+        ("'1'", None, "6", "7", None, None),
+    ]
+    [sql] = batched_update_sql("scenarios", BATCH_COLUMNS, rows)
+    assert sql.count("'1'::uuid") == 1
+    assert "('2'::uuid, '別'::text, NULL::integer, NULL::integer, NULL::integer, NULL::text[]),\n" \
+           "  ('1'::uuid, '先'::text, 6::integer, 7::integer, NULL::integer, NULL::text[])" in sql
+
+
+def test_match_picks_one_values_row_per_target():
+    columns = [("title", "text"), ("duration", "integer")]
+    rows = [("'ロスト'", "180"), ("'ロスト～春～'", "240"), ("'白衣'", None)]
+    statements = batched_update_sql("scenarios", columns, rows, match="t.title ILIKE '%' || v.title || '%'",
+                                    touch_updated_at=False, batch_size=2)
+    assert statements[0] == (
+        "UPDATE scenarios s SET\n"
+        "  duration = COALESCE(v.duration, s.duration)\n"
+        "FROM (\n"
+        "  SELECT DISTINCT ON (t.id) t.id AS target_id, v.*\n"
+        "  FROM (VALUES\n"
+        "  (0, 'ロスト'::text, 180::integer),\n"
+        "  (1, 'ロスト～春～'::text, 240::integer)\n"
+        "  ) AS v(ordinal, title, duration)\n"
+        "  JOIN scenarios t ON t.title ILIKE '%' || v.title || '%'\n"
+        "  ORDER BY t.id, v.ordinal DESC\n"
+        ") AS v\n"
+        "WHERE s.id = v.target_id;"
+    )
+    # 行番号は文をまたいで通しで振る（後の文ほど後の行）
+    assert "  (2, '白衣'::text, NULL::integer)\n" in statements[1]
+
+
+def test_set_map_and_updated_at_options():
+    columns = [("id", "uuid"), ("duration", "integer")]
+    [sql] = batched_update_sql(
+        "scenario_masters", columns, [("'1'", "4")],
+        set_map={"official_duration": "duration"}, touch_updated_at=False,
+    )
+    assert "  official_duration = COALESCE(v.duration, s.official_duration)\nFROM" in sql
+    assert "updated_at" not in sql
+    assert sql.endswith("WHERE s.id = v.id;")
+
+
+def test_scenario_sql_runs_exact_titles_after_partial_ones(tmp_path, monkeypatch):
+    import generate_scenario_update_sql as gen
+
+    catalog = [
+        {"title": "ロスト～春～", "categories": ["新作"], "duration": "4時間"},
+        {"title": "ロスト", "categories": [], "duration": "3時間"},
+    ]
+    monkeypatch.setattr(gen, "load_catalog", lambda: catalog)
+    monkeypatch.setattr(gen, "load_internal", lambda: [])
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "database").mkdir()
+    gen.generate_sql(batch=True)
+
+    sql = (tmp_path / "database" / "update_scenario_genres.sql").read_text(encoding="utf-8")
+    partial = sql.index("JOIN scenarios t ON t.title <> v.title AND t.title ILIKE")
+    exact = sql.index("JOIN scenarios t ON t.title = v.title\n")
+    assert partial < exact
+    assert sql.count("(0, 'ロスト～春～'::text, ARRAY['新作']::text[]") == 2
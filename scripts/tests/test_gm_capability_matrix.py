@@ -0,0 +1,53 @@
+import os
+
+from conftest import ROOT_DIR
+from gm_capability_matrix import CAN_MAIN_GM, CAN_SUB_GM, IS_EXPERIENCED, CapabilityMatrix
+from parse_gm_data import parse_gm_data_file
+
+GM_DATA = os.path.join(ROOT_DIR, "gm_data.txt")
+
+
+def test_gm_data_round_trips_through_bytes(tmp_path):
+    matrix = CapabilityMatrix.from_gm_data(GM_DATA)
+    path = str(tmp_path / "matrix.bin")
+    matrix.save(path)
+    loaded = CapabilityMatrix.load(path)
+
+    assert loaded.scenarios == matrix.scenarios and loaded.staff == matrix.staff
+    assert loaded.nnz == matrix.nnz
+    for title in matrix.scenarios:
+        assert loaded.staff_for_scenario(title, mask=0xFF) == matrix.staff_for_scenario(title, mask=0xFF)
+    for person in matrix.staff:
+        assert loaded.scenarios_for_staff(person, mask=0xFF) == matrix.scenarios_for_staff(person, mask=0xFF)
+    assert loaded.coverage_counts() == matrix.coverage_counts()
+
+
+def test_gm_data_lookups_match_the_parsed_file():
+    parsed = parse_gm_data_file(GM_DATA)
+    matrix = CapabilityMatrix.from_bytes(CapabilityMatrix.from_gm_data(GM_DATA).to_bytes())
+    for title, (main_gms, experienced) in parsed.items():
+        for name in main_gms:
+            assert matrix.flags(title, name) & CAN_MAIN_GM
+            assert title in matrix.scenarios_for_staff(name, mask=CAN_MAIN_GM)
+        for name in experienced:
+            assert matrix.flags(title, name) & IS_EXPERIENCED
+        assert sorted(matrix.staff_for_scenario(title, mask=CAN_MAIN_GM)) == sorted(set(main_gms))
+
+
+def test_assignments_keep_same_named_rows_apart():
+    rows = [
+        {"staff_id": "s1", "scenario_id": "m1", "can_main_gm": True},
+        {"staff_id": "s2", "scenario_id": "m2", "can_sub_gm": True},
+        {"staff_id": "s2", "scenario_id": "m1", "is_experienced": True},
+    ]
+    matrix = CapabilityMatrix.from_assignments(
+        rows, scenario_names={"m1": "白衣", "m2": "白衣"}, staff_names={"s1": "きゅう", "s2": "きゅう"},
+    )
+    loaded = CapabilityMatrix.from_bytes(matrix.to_bytes())
+
+    assert loaded.find_scenarios("白衣") == ["m1", "m2"]
+    assert loaded.find_staff("きゅう") == ["s1", "s2"]
+    assert loaded.flags("m1", "s1") == CAN_MAIN_GM
+    assert loaded.flags("m2", "s1") == 0
+    assert loaded.flags("m2", "s2") == CAN_SUB_GM
+    assert loaded.staff_labels == ["きゅう", "きゅう"]
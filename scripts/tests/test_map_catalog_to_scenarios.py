@@ -0,0 +1,282 @@
+import random
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("supabase")
+
+from map_catalog_to_scenarios import (
+    ScenarioTitleIndex, TfidfTitleScorer, alias_candidates, assign_one_to_one, catalog_title_keys,
+    fetch_table_paged, find_best_match, find_best_match_linear, learn_aliases, max_weight_matching,
+    normalize_title, _char_ngrams
+)
+
+DB_SCENARIOS = [
+    {"id": str(i), "title": title} for i, title in enumerate([
+        "グロリアメモリーズ",
+        "マーダー・オブ・パイレーツ",
+        "BrightChoice",
+        "裁くもの、裁かれるもの",
+        "奪うもの、奪われるもの",
+        "超特急の呪いの館で撮れ高足りてますか？",
+        "曙光のエテルナ",
+        "清流館の秘宝",
+        "星",
+        "BBA",
+        "リメンブランス",
+        "ロスト～春～",
+        "ロスト～夏～",
+        "白衣",
+        "OVER KILL",
+    ])
+]
+
+CATALOG_TITLES = [
+    "グロリアメモリーズ",              # 完全一致
+    "【新作】曙光のエテルナ",          # 装飾つき
+    "ＢｒｉｇｈｔＣｈｏｉｃｅ",        # 全角
+    "Bright Choice",                   # 空白の違い
+    "裁くもの裁かれるもの",            # 記号の違い
+    "超特急の呪いの館で撮れ高足りてますか",
+    "奪うもの、奪われるもの（再演）",
+    "ロスト～秋～",                    # 季節シリーズ
+    "Remembrance",                     # 英語表記
+    "清流館の秘密",                    # 一文字違い
+    "over kill 2nd",
+    "マーダー・オブ・パイレーツ完全版",
+    "星の王子",                        # 短いタイトル
+    "まったく別のシナリオ",            # 該当なし
+    "",
+]
+
+
+def match_key(result):
+    match, score = result
+    return (match["title"] if match else None, round(score, 6))
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.5, 0.6, 0.8])
+def test_indexed_matcher_agrees_with_linear_scan(threshold):
+    index = ScenarioTitleIndex(DB_SCENARIOS)
+    for title in CATALOG_TITLES:
+        indexed = find_best_match(title, index, threshold=threshold)
+        linear = find_best_match_linear(title, DB_SCENARIOS, threshold=threshold)
+        assert match_key(indexed) == match_key(linear), title
+
+
+def test_index_built_incrementally_matches_bulk_index():
+    bulk = ScenarioTitleIndex(DB_SCENARIOS)
+    incremental = ScenarioTitleIndex([])
+    for scenario in DB_SCENARIOS:
+        incremental.add(scenario)
+    for title in CATALOG_TITLES:
+        assert match_key(find_best_match(title, incremental)) == match_key(find_best_match(title, bulk)), title
+
+
+def test_exact_and_decorated_titles():
+    index = ScenarioTitleIndex(DB_SCENARIOS)
+    assert match_key(find_best_match("グロリアメモリーズ", index)) == ("グロリアメモリーズ", 1.0)
+    match, score = find_best_match("【新作】曙光のエテルナ", index)
+    assert match["title"] == "曙光のエテルナ" and score >= 0.9
+    assert find_best_match("まったく別のシナリオ", index) == (None, 0)
+
+
+def test_normalize_title_folds_width_and_symbols():
+    assert normalize_title("ＢｒｉｇｈｔＣｈｏｉｃｅ") == normalize_title("Bright Choice")
+
+
+def brute_force_max_weight(n_left, edges):
+    """全てのマッチングを試して重みの合計の最大値を求める（小さいグラフ用）"""
+    by_left = {}
+    for u, v, w in edges:
+        by_left.setdefault(u, []).append((v, w))
+
+    def best(u, used):
+        if u == n_left:
+            return 0
+        result = best(u + 1, used)
+        for v, w in by_left.get(u, []):
+            if v not in used:
+                result = max(result, w + best(u + 1, used | {v}))
+        return result
+
+    return best(0, frozenset())
+
+
+def check_matching(n_left, n_right, edges, matching):
+    weights = {(u, v): w for u, v, w in edges}
+    assert len(set(matching.values())) == len(matching)
+    assert all((u, v) in weights for u, v in matching.items())
+    assert all(0 <= u < n_left and 0 <= v < n_right for u, v in matching.items())
+    return sum(weights[(u, v)] for u, v in matching.items())
+
+
+def test_max_weight_matching_prefers_total_weight_over_greedy():
+    # 貪欲に 0→0（重み 9）を取ると 1 が余る。最適は 0→1, 1→0（合計 16）
+    edges = [(0, 0, 9), (0, 1, 8), (1, 0, 8)]
+    matching = max_weight_matching(2, 2, edges)
+    assert matching == {0: 1, 1: 0}
+
+
+def test_max_weight_matching_does_not_force_a_perfect_matching():
+    # 1 を割り当てると 0 の重い辺を失うので、1 は割り当てない
+    edges = [(0, 0, 10), (1, 0, 1)]
+    assert max_weight_matching(2, 1, edges) == {0: 0}
+    assert max_weight_matching(0, 0, []) == {}
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_max_weight_matching_is_optimal_on_random_graphs(seed):
+    rng = random.Random(seed)
+    n_left, n_right = rng.randint(1, 6), rng.randint(1, 6)
+    edges = [
+        (u, v, rng.randint(5000, 10000))
+        for u in range(n_left) for v in range(n_right) if rng.random() < 0.5
+    ]
+    matching = max_weight_matching(n_left, n_right, edges)
+    assert check_matching(n_left, n_right, edges, matching) == brute_force_max_weight(n_left, edges)
+
+
+def test_assign_one_to_one_splits_components_and_keeps_scores():
+    edge_lists = [
+        [(0, 0.9), (1, 0.8)],
+        [(0, 0.8)],
+        [(5, 0.7)],
+        [],
+    ]
+    assert assign_one_to_one(edge_lists) == {0: (1, 0.8), 1: (0, 0.8), 2: (5, 0.7)}
+
+
+
+
+def test_alias_candidates_skip_exact_and_known_titles():
+    matched = [
+        {"catalog_title": "ＢｒｉｇｈｔＣｈｏｉｃｅ", "db_title": "BrightChoice", "similarity": 1.0},
+        {"catalog_title": "【新作】曙光のエテルナ", "db_title": "曙光のエテルナ", "similarity": 0.95},
+        {"catalog_title": "清流館の秘密", "db_title": "清流館の秘宝", "similarity": 0.83},
+        {"catalog_title": "Remembrance", "db_title": "リメンブランス", "similarity": 0.6},
+        {"catalog_title": "ロスト～秋～", "db_title": "ロスト～春～", "similarity": 0.8},
+        {"catalog_title": "OVER KILL 2nd", "db_title": "OVER KILL", "similarity": 0.9},
+    ]
+    candidates = alias_candidates(matched, existing={"OVER KILL 2nd": "OVER KILL"},
+                                  confirmed={"ロスト～秋～": "ロスト～春～"})
+    assert candidates == {
+        "【新作】曙光のエテルナ": {"db_title": "曙光のエテルナ", "similarity": 0.95},
+        "清流館の秘密": {"db_title": "清流館の秘宝", "similarity": 0.83},
+    }
+
+
+def test_learn_aliases_registers_only_confirmed_pairs():
+    existing = {"Lost Remembrance": "ロスト／リメンブランス", "旧題": "古い正式名"}
+    confirmed = {"Lost Remembrance": "ロスト／リメンブランス", "旧題": "新しい正式名", "同じ": "同じ"}
+    assert learn_aliases(existing, confirmed) == [{"alias": "旧題", "canonical_name": "新しい正式名"}]
+
+def _dense_tfidf_top_k(index, titles, k):
+    """密行列で全ペアを計算する TF-IDF（TfidfTitleScorer の参照実装）"""
+    np = pytest.importorskip("numpy")
+    docs = [_char_ngrams(t, (1, 3)) for t in index.norms + index.cores]
+    vocab = sorted({g for d in docs for g in d})
+    col = {g: i for i, g in enumerate(vocab)}
+    idf = np.array([np.log((1 + len(docs)) / (1 + sum(g in d for d in docs))) + 1 for g in vocab])
+    oov_idf = np.log(1 + len(docs)) + 1
+
+    def vectors(texts):
+        matrix = np.zeros((len(texts), len(vocab)))
+        oov = np.zeros(len(texts))
+        for row, text in enumerate(texts):
+            for gram, count in _char_ngrams(text, (1, 3)).items():
+                if gram in col:
+                    matrix[row, col[gram]] = count * idf[col[gram]]
+                else:
+                    oov[row] += (count * oov_idf) ** 2
+        norms = np.sqrt((matrix ** 2).sum(axis=1) + oov)
+        return matrix / np.where(norms == 0, 1, norms)[:, None]
+
+    keys = [catalog_title_keys(t) for t in titles]
+    sims = np.maximum(vectors([n for n, _ in keys]) @ vectors(index.norms).T,
+                      vectors([c for _, c in keys]) @ vectors(index.cores).T).clip(0, 1)
+    results = []
+    for row, (norm, core) in enumerate(keys):
+        for position in index.exact_matches(norm, core):
+            sims[row, position] = 1.0
+        order = sorted(range(len(index)), key=lambda i: (-sims[row, i], i))[:k]
+        results.append([(i, sims[row, i]) for i in order if sims[row, i] > 0])
+    return results
+
+
+def test_sparse_tfidf_matches_dense_reference():
+    index = ScenarioTitleIndex(DB_SCENARIOS)
+    expected = _dense_tfidf_top_k(index, CATALOG_TITLES, 3)
+    actual = TfidfTitleScorer(index).top_k(CATALOG_TITLES, 3)
+    assert [[p for p, _ in row] for row in actual] == [[p for p, _ in row] for row in expected]
+    for got, want in zip(actual, expected):
+        assert [s for _, s in got] == pytest.approx([s for _, s in want], abs=1e-5)
+    assert actual[0][0] == (0, 1.0)
+
+class FakeQuery:
+    """PostgREST の eq / order / limit / gt / or_ だけを真似るクエリ"""
+
+    def __init__(self, rows, log):
+        self.rows, self.log, self.conditions, self.keys, self.count = rows, log, [], [], None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.conditions.append(lambda r: r[column] == value)
+        return self
+
+    def gt(self, column, value):
+        self.conditions.append(lambda r: r[column] > value)
+        return self
+
+    def or_(self, terms):
+        def parse(term):
+            if term.startswith("and("):
+                parts = [parse(t) for t in term[4:-1].split(",")]
+                return lambda r: all(p(r) for p in parts)
+            column, op, value = term.split(".", 2)
+            return (lambda r: r[column] == value) if op == "eq" else (lambda r: r[column] > value)
+        alternatives, depth, start = [], 0, 0
+        for i, ch in enumerate(terms + ","):
+            depth += ch == "("
+            depth -= ch == ")"
+            if ch == "," and depth == 0:
+                alternatives.append(parse(terms[start:i]))
+                start = i + 1
+        self.conditions.append(lambda r: any(a(r) for a in alternatives))
+        return self
+
+    def order(self, key):
+        self.keys.append(key)
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def execute(self):
+        rows = sorted((r for r in self.rows if all(c(r) for c in self.conditions)),
+                      key=lambda r: tuple(r[k] for k in self.keys))
+        self.log.append(len(rows[:self.count]))
+        return type("Response", (), {"data": rows[:self.count]})()
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows, self.log = rows, []
+
+    def table(self, name):
+        return FakeQuery(self.rows, self.log)
+
+
+def test_fetch_table_paged_walks_composite_keys_within_a_filter():
+    rows = [{"staff_id": f"s{s}", "scenario_id": f"m{m:02d}", "organization_id": org}
+            for s in range(3) for m in range(7) for org in ("a", "b")]
+    client = FakeClient(rows)
+    fetched = fetch_table_paged(client, "staff_scenario_assignments", "*", ("staff_id", "scenario_id"),
+                                page_size=4, filters={"organization_id": "a"})
+    expected = sorted((r for r in rows if r["organization_id"] == "a"),
+                      key=lambda r: (r["staff_id"], r["scenario_id"]))
+    assert fetched == expected
+    assert client.log == [4, 4, 4, 4, 4, 1, 0]
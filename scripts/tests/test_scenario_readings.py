@@ -0,0 +1,41 @@
+from scenario_readings import ReadingIndex, ReadingStore, READING_EXACT_SCORE, phonetic_key
+
+READINGS = {
+    "ダークナイト": ("ダークナイト", "daakunaito"),
+    "サイレントシー": ("サイレントシー", "sairentoshii"),
+    "さくらの森": ("サクラノモリ", "sakuranomori"),
+    "ひかりの国": ("ヒカリノクニ", "hikarinokuni"),
+    "Lost Remembrance": ("Lost Remembrance", "lostremembrance"),
+    "Lost Remembrancer": ("", "lostremembrancer"),
+    "曙光のエテルナ": ("ショコウノエテルナ", "shokounoeteruna"),
+    "ブラックナイトスレイヴ": ("ブラックナイトスレイヴ", "burakkunaitosureivu"),
+    "星空のマリス": ("ホシゾラノマリス", "hoshizoranomarisu"),
+    "霧に眠るは幾つの罪": ("キリニネムルハイクツノツミ", "kirininemuruhaikutsunotsumi"),
+    "ロスト／リメンブランス": ("ロスト／リメンブランス", "rosutorimenburansu"),
+}
+DB_TITLES = ["曙光のエテルナ", "ブラックナイトスレイヴ", "星空のマリス", "霧に眠るは幾つの罪", "ロスト／リメンブランス"]
+
+
+def _index(tmp_path):
+    store = ReadingStore(sql_path=str(tmp_path / "none.sql"), cache_path=str(tmp_path / "cache.json"))
+    store.readings.update(READINGS)
+    return ReadingIndex(DB_TITLES, store)
+
+
+def test_phonetic_key_bridges_english_and_katakana():
+    assert phonetic_key("lostremembrance") == phonetic_key("rosutorimenburansu") == "rstrmbrns"
+
+
+def test_exact_reading_matches(tmp_path):
+    assert _index(tmp_path).best("Lost Remembrance") == (4, READING_EXACT_SCORE)
+
+
+def test_near_skeleton_of_a_long_key_matches(tmp_path):
+    position, score = _index(tmp_path).best("Lost Remembrancer")
+    assert position == 4 and READING_EXACT_SCORE * 0.9 <= score < READING_EXACT_SCORE
+
+
+def test_loose_skeleton_similarity_does_not_match(tmp_path):
+    index = _index(tmp_path)
+    for title in ["ダークナイト", "サイレントシー", "さくらの森", "ひかりの国"]:
+        assert index.best(title) == (None, 0), title
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from conftest import FIXTURES_DIR
+from scrape_common import html_to_text
+from scrape_queens_waltz_details import extract_details
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_html_to_text_keeps_inline_elements_on_one_line():
+    text = html_to_text("<p>料金 <span>3,000</span>円(税込)</p><div>プレイ人数：<b>5</b>人</div>")
+    assert text.split("\n") == ["料金 3,000円(税込)", "プレイ人数：5人"]
+
+
+def test_html_to_text_breaks_at_br_and_drops_scripts():
+    text = html_to_text("<p>一行目<br>二行目</p><script>var price = '100円';</script><style>p{}</style>")
+    assert text == "一行目\n二行目"
+
+
+def test_html_to_text_collapses_source_whitespace():
+    text = html_to_text("<div>\n  料金\n  <span>5,000</span>円\n</div>")
+    assert text == "料金 5,000円"
+
+
+def test_saved_detail_page_extracts_all_fields():
+    details = extract_details(html_to_text(read_fixture("coubic_detail.html")))
+    assert details == {
+        "price": "5,000円(税込)",
+        "players": "10人",
+        "duration": "4時間",
+        "author": "きゅう、れみあ",
+    }
+
+
+def test_html_to_text_reads_only_the_body():
+    html = ("<!DOCTYPE html><html><head><title>T</title><meta charset='utf-8'></head>"
+            "<body><!-- nav --><p>料金 3,000円</p></body></html>")
+    assert html_to_text(html) == "料金 3,000円"
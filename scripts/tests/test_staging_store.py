@@ -0,0 +1,139 @@
+import json
+import os
+
+import pytest
+
+import staging_store
+from staging_store import StagingStore
+
+
+def _match(title, db_id, similarity):
+    return {"catalog_title": title, "db_id": db_id, "db_title": title, "db_author": None,
+            "similarity": similarity, "catalog_data": {"title": title}}
+
+
+MATCHED = [_match("白衣", "1", 1.0), _match("黒衣", "2", 0.95), _match("灰衣", "3", 0.8)]
+UNMATCHED = [{"title": "新作"}]
+DB_ROWS = [{"id": str(i), "title": t} for i, t in enumerate(["白衣", "黒衣", "灰衣", "DBのみ"], start=1)]
+
+
+def _nonzero(counters):
+    return {bucket: count for bucket, count in counters.items() if count}
+
+
+@pytest.fixture
+def store(tmp_path):
+    with StagingStore(str(tmp_path / "staging.sqlite3")) as s:
+        s.replace_db_snapshot("scenarios", DB_ROWS)
+        s.replace_mapping("legacy", MATCHED, UNMATCHED, {"total": 4})
+        yield s
+
+
+def test_mapping_round_trip_derives_unmatched_db(store):
+    data = store.mapping("legacy")
+    assert [m["catalog_title"] for m in data["matched"]] == ["白衣", "黒衣", "灰衣"]
+    assert data["unmatched_catalog"] == UNMATCHED
+    assert data["unmatched_db"] == [{"id": "4", "title": "DBのみ"}]
+    assert data["stats"] == {"total": 4}
+    assert [m["catalog_title"] for m in store.matches("legacy", below=0.9)] == ["灰衣"]
+
+
+def test_identical_rewrite_touches_nothing(store):
+    assert store.replace_mapping("legacy", MATCHED, UNMATCHED, {"total": 4}) == (0, 0)
+    assert store.replace_db_snapshot("scenarios", DB_ROWS) == (0, 0)
+    assert store.replace_mapping("legacy", MATCHED[:2], [], {}) == (0, 2)
+
+
+def test_triggers_keep_counters_in_step(store):
+    assert _nonzero(store.counters("legacy")) == {"perfect": 1, "high": 1, "medium": 1, "unmatched_catalog": 1}
+
+    # 類似度の変更と、マッチがカタログのみへ移る変更
+    changed = [MATCHED[0], _match("黒衣", "2", 0.5)]
+    store.replace_mapping("legacy", changed, [{"title": "灰衣"}] + UNMATCHED, {})
+    assert _nonzero(store.counters("legacy")) == {"perfect": 1, "low": 1, "unmatched_catalog": 2}
+
+    expected = store.counters("legacy")
+    store.rebuild_counters()
+    assert _nonzero(store.counters("legacy")) == _nonzero(expected)
+
+
+def test_counters_are_backfilled_for_old_stores(tmp_path):
+    path = str(tmp_path / "staging.sqlite3")
+    with StagingStore(path) as s:
+        s.replace_mapping("legacy", MATCHED, UNMATCHED, {})
+        s.conn.execute("DELETE FROM mapping_counters")
+    with StagingStore(path) as s:
+        assert _nonzero(s.counters("legacy")) == {"perfect": 1, "high": 1, "medium": 1, "unmatched_catalog": 1}
+
+
+def test_report_sections_rerender_only_when_affected(store):
+    sections = ["matched", "unmatched_catalog", "unmatched_db", "low_matches"]
+    calls = []
+
+    def render_all():
+        rerendered = []
+        for section in sections:
+            body, fresh = store.report_section("legacy", section, lambda: calls.append(section) or section)
+            assert body == section
+            if fresh:
+                rerendered.append(section)
+        return rerendered
+
+    assert render_all() == sections
+    assert render_all() == []
+
+    # カタログのみの行を1件増やしても、マッチの節は描き直さない
+    store.replace_mapping("legacy", MATCHED, UNMATCHED + [{"title": "別の新作"}], {})
+    assert render_all() == ["unmatched_catalog"]
+
+    # DBスナップショットが変われば「DBのみ」だけ描き直す
+    store.replace_db_snapshot("scenarios", DB_ROWS + [{"id": "5", "title": "追加"}])
+    assert render_all() == ["unmatched_db"]
+
+    # 要確認のマッチが変われば、マッチ・DBのみ・要確認を描き直す
+    store.replace_mapping("legacy", MATCHED[:2] + [_match("灰衣", "3", 0.75)], UNMATCHED + [{"title": "別の新作"}], {})
+    assert render_all() == ["matched", "unmatched_db", "low_matches"]
+    assert calls.count("unmatched_catalog") == 2
+
+
+def _write_json(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def test_load_mapping_uses_store_until_json_is_edited(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    json_path = tmp_path / "mapping.json"
+    json_data = {"matched": [], "unmatched_catalog": [], "unmatched_db": [], "stats": {"from": "json"}}
+    _write_json(json_path, json_data)
+    with StagingStore() as s:
+        s.replace_mapping("legacy", MATCHED, UNMATCHED, {"from": "store"}, json_path=str(json_path))
+    assert staging_store.load_mapping("legacy", str(json_path))["stats"] == {"from": "store"}
+
+    # 変更の無い再実行: JSON は書き直されるがストアのファイルは変わらない
+    store_mtime = os.path.getmtime(staging_store.STAGING_DB_PATH)
+    _write_json(json_path, json_data)
+    os.utime(json_path, (store_mtime + 10, store_mtime + 10))
+    with StagingStore() as s:
+        assert s.replace_mapping("legacy", MATCHED, UNMATCHED, {"from": "store"}, json_path=str(json_path)) == (0, 0)
+    assert staging_store.load_mapping("legacy", str(json_path))["stats"] == {"from": "store"}
+
+    # 中身の同じ書き直し（更新時刻だけ進む）もストアを使う
+    os.utime(json_path, (store_mtime + 20, store_mtime + 20))
+    assert staging_store.load_mapping("legacy", str(json_path))["stats"] == {"from": "store"}
+
+    # ストアを経由しない書き換えは JSON を使う
+    _write_json(json_path, dict(json_data, stats={"from": "edited"}))
+    assert staging_store.load_mapping("legacy", str(json_path))["stats"] == {"from": "edited"}
+
+
+def test_load_catalog_ignores_json_never_written_with_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    json_path = tmp_path / "catalog.json"
+    _write_json(json_path, {"scenarios": [{"title": "JSON"}]})
+    with StagingStore() as s:
+        s.replace_catalog([{"title": "ストア"}])
+    assert staging_store.load_catalog(str(json_path)) == [{"title": "JSON"}]
+
+    with StagingStore() as s:
+        s.replace_catalog([{"title": "ストア"}], json_path=str(json_path))
+    assert staging_store.load_catalog(str(json_path)) == [{"title": "ストア"}]
@@ -5,14 +5,20 @@
 - 人数（min/max両方に同じ値）
 - 時間（分に変換）
 - タグ（genreに追加）
+
+scenarios と scenario_masters へはチャンクごとに RPC 1回でまとめて書き込み、
+チャンクは並行に送る（RPC が未作成なら1行ずつの更新に切り替える）。
 """
 
+import argparse
 import os
-import json
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from staging_store import load_mapping
+
 # 環境変数の読み込み
 load_dotenv('.env.local')
 load_dotenv()
@@ -101,13 +107,136 @@ def map_tags_to_genre(tags):
     return genres
 
 
+# 1回の書き込みで送る行数と、並行して送るチャンク数
+WRITE_CHUNK_SIZE = 100
+WRITE_WORKERS = 4
+
+# 1チャンクを scenarios / scenario_masters の両方へ反映するRPC
+# （supabase/migrations/20260823090000_bulk_update_scenarios_from_catalog.sql）
+BULK_UPDATE_RPC = "bulk_update_scenarios_from_catalog"
+
+WRITE_TABLES = ("scenarios", "scenario_masters")
+
+
+def to_masters_data(update_data):
+    """scenario_masters 用にカラム名を調整（マスタの時間は official_duration）"""
+    masters_data = {k: v for k, v in update_data.items() if k not in ("id", "duration")}
+    if "duration" in update_data:
+        masters_data["official_duration"] = update_data["duration"]
+    return masters_data
+
+
+def write_chunk_rpc(supabase, rows):
+    """1チャンクを RPC 1回で両テーブルに反映。戻り値: {テーブル: 更新行数}"""
+    result = supabase.rpc(BULK_UPDATE_RPC, {"p_rows": rows}).execute()
+    counts = result.data[0] if result.data else {}
+    return {
+        "scenarios": counts.get("scenarios_updated", 0),
+        "scenario_masters": counts.get("masters_updated", 0),
+    }
+
+
+def write_chunk_rows(supabase, rows):
+    """RPC が無い環境用: 1行ずつ両テーブルを更新。戻り値: ({テーブル: 更新行数}, [エラー])"""
+    counts = {table: 0 for table in WRITE_TABLES}
+    errors = []
+    for row in rows:
+        data = {k: v for k, v in row.items() if k != "id"}
+        for table, table_data in (("scenarios", data), ("scenario_masters", to_masters_data(row))):
+            try:
+                result = supabase.table(table).update(table_data).eq('id', row["id"]).execute()
+                if result.data:
+                    counts[table] += 1
+            except Exception as e:
+                errors.append(f"[{table}] {row['id']}: {e}")
+    return counts, errors
+
+
+def is_missing_rpc(error):
+    """RPC が未作成（マイグレーション未適用）のエラーかどうか"""
+    text = str(error)
+    return "PGRST202" in text or "Could not find the function" in text
+
+
+def is_rpc_denied(error):
+    """RPC を実行する権限が無い（service_role 以外で呼んだ）エラーかどうか"""
+    text = str(error)
+    return "42501" in text or "permission denied" in text
+
+
+def write_updates(supabase, updates, chunk_size=WRITE_CHUNK_SIZE, workers=WRITE_WORKERS, use_rpc=True):
+    """
+    更新をチャンクに分けて並行に書き込む
+    
+    各チャンクは RPC 1回で scenarios / scenario_masters の両方に反映する。
+    RPC が未作成・実行権限が無い（use_rpc=False も同じ）なら、同じチャンク単位で
+    1行ずつの更新（RLS で許された行だけが更新される）に切り替える。
+    
+    Returns:
+        {"updated": {テーブル: 行数}, "errors": [エラー], "mode": "rpc" or "rows"}
+    """
+    rows = [u['update_data'] for u in updates]
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    summary = {"updated": {table: 0 for table in WRITE_TABLES}, "errors": [], "mode": "rpc"}
+    if not chunks:
+        return summary
+    
+    def add(counts):
+        for table, count in counts.items():
+            summary["updated"][table] += count
+    
+    # 最初のチャンクで RPC が使えるか確かめる
+    remaining = chunks[1:]
+    try:
+        if not use_rpc:
+            summary["mode"] = "rows"
+            remaining = chunks
+        else:
+            add(write_chunk_rpc(supabase, chunks[0]))
+            print(f"  チャンク 1/{len(chunks)} 完了")
+    except Exception as e:
+        if is_missing_rpc(e) or is_rpc_denied(e):
+            reason = "マイグレーション未適用" if is_missing_rpc(e) else "実行権限なし"
+            print(f"⚠ {BULK_UPDATE_RPC} を使えないため、1行ずつの更新に切り替えます（{reason}）")
+            summary["mode"] = "rows"
+            remaining = chunks
+        else:
+            summary["errors"].append(f"チャンク（{chunks[0][0]['id']} ほか {len(chunks[0])} 行）: {e}")
+            print(f"  ✗ チャンク 1/{len(chunks)} エラー: {e}")
+    
+    write = write_chunk_rpc if summary["mode"] == "rpc" else write_chunk_rows
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(write, supabase, chunk): chunk for chunk in remaining}
+        for done, future in enumerate(as_completed(futures), len(chunks) - len(remaining) + 1):
+            chunk = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                summary["errors"].append(f"チャンク（{chunk[0]['id']} ほか {len(chunk)} 行）: {e}")
+                print(f"  ✗ チャンク {done}/{len(chunks)} エラー: {e}")
+                continue
+            if summary["mode"] == "rows":
+                result, errors = result
+                summary["errors"].extend(errors)
+            add(result)
+            print(f"  チャンク {done}/{len(chunks)} 完了")
+    
+    return summary
+
+
 def load_mapping_data():
-    """マッピングデータを読み込み（レガシーテーブル用）"""
-    with open("docs/data/scenario-mapping-legacy.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+    """マッピングデータを読み込み（レガシーテーブル用、ステージングDBにあればそこから）"""
+    return load_mapping("legacy", "docs/data/scenario-mapping-legacy.json")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="カタログ情報でDBのシナリオマスタを更新")
+    parser.add_argument("--chunk-size", type=int, default=WRITE_CHUNK_SIZE,
+                        help=f"1回の書き込みで送る行数（既定 {WRITE_CHUNK_SIZE}）")
+    parser.add_argument("--workers", type=int, default=WRITE_WORKERS,
+                        help=f"並行して書き込むチャンク数（既定 {WRITE_WORKERS}）")
+    args = parser.parse_args()
+    
     print("=== カタログ情報でDBを更新 ===\n")
     
     # Supabase接続
@@ -198,57 +327,20 @@ def main():
     # 更新実行
     print("\n=== 更新実行 ===\n")
     
-    success_scenarios = 0
-    success_masters = 0
-    error_count = 0
-    
-    for u in updates:
-        title = u['title']
-        update_data = u['update_data'].copy()
-        scenario_id = update_data.pop('id')  # idを取り出す
-        
-        # scenarios テーブル用データ
-        scenarios_data = update_data.copy()
-        
-        # scenario_masters テーブル用データ（カラム名の調整）
-        masters_data = {}
-        if 'author' in update_data:
-            masters_data['author'] = update_data['author']
-        if 'player_count_min' in update_data:
-            masters_data['player_count_min'] = update_data['player_count_min']
-        if 'player_count_max' in update_data:
-            masters_data['player_count_max'] = update_data['player_count_max']
-        if 'duration' in update_data:
-            masters_data['official_duration'] = update_data['duration']  # マスタはofficial_duration
-        if 'genre' in update_data:
-            masters_data['genre'] = update_data['genre']
-        
-        # scenarios テーブルを更新
-        try:
-            result = supabase.table('scenarios').update(scenarios_data).eq('id', scenario_id).execute()
-            if result.data:
-                success_scenarios += 1
-                print(f"✓ [scenarios] {title}")
-            else:
-                print(f"- [scenarios] {title} (データなし/RLS)")
-        except Exception as e:
-            print(f"✗ [scenarios] {title} エラー: {e}")
-        
-        # scenario_masters テーブルを更新
-        if masters_data:
-            try:
-                result = supabase.table('scenario_masters').update(masters_data).eq('id', scenario_id).execute()
-                if result.data:
-                    success_masters += 1
-                    print(f"✓ [masters] {title}")
-                else:
-                    print(f"- [masters] {title} (データなし/RLS)")
-            except Exception as e:
-                print(f"✗ [masters] {title} エラー: {e}")
+    # RPC は service_role にだけ許可している（anon キーでは1行ずつ、RLS の範囲で更新）
+    use_rpc = bool(os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    summary = write_updates(supabase, updates, args.chunk_size, args.workers, use_rpc)
     
     print(f"\n=== 完了 ===")
-    print(f"scenarios 更新: {success_scenarios} 件")
-    print(f"scenario_masters 更新: {success_masters} 件")
+    print(f"書き込み方式: {'RPC（チャンクごとに両テーブル）' if summary['mode'] == 'rpc' else '1行ずつ'}")
+    print(f"{'テーブル':<18} {'対象':>6} {'更新':>6} {'未更新':>6}")
+    for table in WRITE_TABLES:
+        updated = summary['updated'][table]
+        print(f"{table:<18} {len(updates):>6} {updated:>6} {len(updates) - updated:>6}")
+    if summary['errors']:
+        print(f"\n❌ エラー: {len(summary['errors'])} 件")
+        for error in summary['errors'][:10]:
+            print(f"  {error}")
 
 
 if __name__ == "__main__":
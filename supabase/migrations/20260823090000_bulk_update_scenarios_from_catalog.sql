@@ -0,0 +1,58 @@
+-- カタログ取り込み（scripts/update_scenarios_from_catalog.py）用の一括更新RPC
+-- 1チャンク分の行を1回の呼び出しで scenarios と scenario_masters の両方に反映する。
+-- 行に無い項目・null の項目は元の値のまま（COALESCE）。scenario_masters の時間は official_duration。
+-- updated_at は従来の1行ずつの更新と同じく明示的には書かない
+-- （scenarios は update_scenarios_updated_at トリガーが更新する）。
+-- 破壊的変更なし。service_role からのみ実行可能（スクリプトは SERVICE_ROLE_KEY で呼ぶ）。
+--
+-- ロールバック:
+--   DROP FUNCTION IF EXISTS public.bulk_update_scenarios_from_catalog(JSONB);
+
+CREATE OR REPLACE FUNCTION public.bulk_update_scenarios_from_catalog(p_rows JSONB)
+RETURNS TABLE (scenarios_updated INTEGER, masters_updated INTEGER)
+LANGUAGE sql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+  WITH v AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_rows) AS r(
+      id UUID,
+      author TEXT,
+      player_count_min INTEGER,
+      player_count_max INTEGER,
+      duration INTEGER,
+      genre TEXT[]
+    )
+  ),
+  updated_scenarios AS (
+    UPDATE public.scenarios s SET
+      author = COALESCE(v.author, s.author),
+      player_count_min = COALESCE(v.player_count_min, s.player_count_min),
+      player_count_max = COALESCE(v.player_count_max, s.player_count_max),
+      duration = COALESCE(v.duration, s.duration),
+      genre = COALESCE(v.genre, s.genre)
+    FROM v
+    WHERE s.id = v.id
+    RETURNING s.id
+  ),
+  updated_masters AS (
+    UPDATE public.scenario_masters m SET
+      author = COALESCE(v.author, m.author),
+      player_count_min = COALESCE(v.player_count_min, m.player_count_min),
+      player_count_max = COALESCE(v.player_count_max, m.player_count_max),
+      official_duration = COALESCE(v.duration, m.official_duration),
+      genre = COALESCE(v.genre, m.genre)
+    FROM v
+    WHERE m.id = v.id
+    RETURNING m.id
+  )
+  SELECT
+    (SELECT count(*) FROM updated_scenarios)::INTEGER,
+    (SELECT count(*) FROM updated_masters)::INTEGER;
+$$;
+
+REVOKE ALL ON FUNCTION public.bulk_update_scenarios_from_catalog(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bulk_update_scenarios_from_catalog(JSONB) TO service_role;
+
+NOTIFY pgrst, 'reload schema';